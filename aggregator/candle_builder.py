@@ -1,6 +1,8 @@
 import datetime
 from collections import deque
 
+from aggregator.records import Candle, Tick
+
 class CandleBuilder:
     def __init__(self, interval_seconds):
         self.interval = datetime.timedelta(seconds=interval_seconds)
@@ -9,45 +11,147 @@ class CandleBuilder:
         self.volume = 0.0
 
     def add_tick(self, tick):
-        ts = datetime.datetime.fromisoformat(tick['timestamp'])
-        mid = (tick['bid'] + tick['ask']) / 2.0
+        if type(tick) is not Tick:
+            tick = Tick.from_dict(tick)
+        ts = tick.time
+        mid = (tick.bid + tick.ask) / 2.0
         if self.current_start is None:
             self.current_start = ts.replace(second=0, microsecond=0)
             self.open = self.high = self.low = self.close = mid
-            self.volume = tick['volume']
+            self.volume = tick.volume
             return None
 
         if ts >= self.current_start + self.interval:
-            candle = {
-                'timestamp': self.current_start.isoformat(),
-                'open': self.open,
-                'high': self.high,
-                'low': self.low,
-                'close': self.close,
-                'volume': self.volume
-            }
+            candle = self._candle()
             # start new
             periods = int((ts - self.current_start).total_seconds() // self.interval.total_seconds())
             self.current_start += self.interval * periods
             self.open = self.high = self.low = self.close = mid
-            self.volume = tick['volume']
+            self.volume = tick.volume
             return candle
 
         # within interval
-        self.high = max(self.high, mid)
-        self.low = min(self.low, mid)
+        if mid > self.high:
+            self.high = mid
+        elif mid < self.low:
+            self.low = mid
         self.close = mid
-        self.volume += tick['volume']
+        self.volume += tick.volume
         return None
 
+    def add_candle(self, candle):
+        """Fold a completed finer-grained candle into the in-progress bar."""
+        if type(candle) is not Candle:
+            candle = Candle.from_dict(candle)
+        if self.open is None:
+            self.open = candle.open
+            self.high = candle.high
+            self.low = candle.low
+            self.volume = candle.volume
+        else:
+            self.high = max(self.high, candle.high)
+            self.low = min(self.low, candle.low)
+            self.volume += candle.volume
+        self.close = candle.close
+
+    def roll(self, ts):
+        """
+        Close the in-progress bar if `ts` lies beyond it (used in cascading
+        mode, where the bar is fed with candles rather than ticks).
+        Returns the completed candle or None; the new bar starts empty.
+        """
+        if ts < self.current_start + self.interval:
+            return None
+        candle = self._candle()
+        periods = int((ts - self.current_start).total_seconds() // self.interval.total_seconds())
+        self.current_start += self.interval * periods
+        self.open = self.high = self.low = self.close = None
+        self.volume = 0.0
+        return candle
+
+    def current_candle(self):
+        """Snapshot of the in-progress bar, or None before the first tick."""
+        if self.current_start is None or self.open is None:
+            return None
+        return self._candle()
+
+    def _candle(self):
+        return Candle(self.current_start.isoformat(), self.open, self.high,
+                      self.low, self.close, self.volume)
+
 class MultiIntervalCandleBuilder:
-    def __init__(self, intervals):
+    """
+    Builds candles for several intervals from one tick stream.
+
+    By default every interval has its own CandleBuilder fed with every tick.
+    With cascade=True only the finest interval consumes ticks; coarser bars
+    are composed from the finer candles as they complete, so the per-tick
+    cost no longer grows with the number of intervals. Results are identical
+    as long as every interval is a multiple of the finest one (enforced).
+    """
+    def __init__(self, intervals, cascade=False):
+        self.cascade = cascade
         self.builders = {i: CandleBuilder(i) for i in intervals}
+        if cascade:
+            ordered = sorted(self.builders)
+            self.finest = ordered[0]
+            self.coarser = [self.builders[i] for i in ordered[1:]]
+            bad = [i for i in ordered[1:] if i % self.finest]
+            if bad:
+                raise ValueError(
+                    f"cascading requires intervals that are multiples of {self.finest}s, got {bad}"
+                )
 
     def add_tick(self, tick):
+        if type(tick) is not Tick:
+            tick = Tick.from_dict(tick)    # parse the timestamp once, not per interval
+        if self.cascade:
+            return self._add_tick_cascading(tick)
         completed = {}
         for interval, builder in self.builders.items():
             c = builder.add_tick(tick)
             if c:
                 completed[interval] = c
         return completed
+
+    def _add_tick_cascading(self, tick):
+        fine = self.builders[self.finest]
+        c = fine.add_tick(tick)
+        if c is None:
+            if self.coarser and self.coarser[0].current_start is None:
+                # first tick: coarser grids share the finest builder's origin
+                for builder in self.coarser:
+                    builder.current_start = fine.current_start
+            return {}
+
+        # Coarse boundaries are always fine boundaries, so coarser bars only
+        # need attention when a fine bar closes.
+        completed = {self.finest: c}
+        for builder in self.coarser:
+            builder.add_candle(c)
+            coarse = builder.roll(fine.current_start)
+            if coarse:
+                completed[int(builder.interval.total_seconds())] = coarse
+        return completed
+
+    def current(self, interval):
+        """
+        In-progress candle for `interval`. In cascading mode this merges the
+        completed finer bars with the live finest bar.
+        """
+        builder = self.builders[interval]
+        if not self.cascade or interval == self.finest:
+            return builder.current_candle()
+        live = self.builders[self.finest].current_candle()
+        partial = builder.current_candle()
+        if partial is None:
+            if live is None:
+                return None
+            live.timestamp = builder.current_start.isoformat()
+            return live
+        if live is not None:
+            partial.high = max(partial.high, live.high)
+            partial.low = min(partial.low, live.low)
+            partial.close = live.close
+            partial.volume += live.volume
+        return partial
@@ -6,6 +6,7 @@ and detecting standard candle patterns on those aggregated bars.
 """
 
 from datetime import timedelta
+from aggregator.records import Candle
 from strategy.indicators import (
     detect_candle_pattern,
     detect_multi_candle_pattern,
@@ -26,20 +27,20 @@ def truncate_timestamp(timestamp, interval_minutes):
 def build_candle_series(recent_candles, current_candle_state):
     """
     Build a list of up to 5 candles: the last 4 completed + the current in-progress candle.
-    recent_candles: list of completed candle dicts
+    recent_candles: list of completed candles (Candle or dict)
     current_candle_state: dict with keys 'bucket','o','h','l','c','v'
     """
     # Keep at most 4 completed candles
     last_completed = recent_candles[-4:] if len(recent_candles) >= 4 else recent_candles[:]
     # Build the current candle dict
-    current = {
-        'timestamp': current_candle_state['bucket'],
-        'open': current_candle_state['o'],
-        'high': current_candle_state['h'],
-        'low': current_candle_state['l'],
-        'close': current_candle_state['c'],
-        'volume': current_candle_state['v'],
-    }
+    current = Candle(
+        current_candle_state['bucket'],
+        current_candle_state['o'],
+        current_candle_state['h'],
+        current_candle_state['l'],
+        current_candle_state['c'],
+        current_candle_state['v'],
+    )
     return last_completed + [current]
 
 
@@ -64,14 +65,14 @@ def process_tick(
         # If we've moved into a new bucket, archive the old candle
         if previous_bucket is not None and bucket_start != previous_bucket:
             completed_state = last_candle_state_by_interval[interval]
-            archived_candle = {
-                'timestamp': completed_state['bucket'],
-                'open': completed_state['o'],
-                'high': completed_state['h'],
-                'low': completed_state['l'],
-                'close': completed_state['c'],
-                'volume': completed_state['v'],
-            }
+            archived_candle = Candle(
+                completed_state['bucket'],
+                completed_state['o'],
+                completed_state['h'],
+                completed_state['l'],
+                completed_state['c'],
+                completed_state['v'],
+            )
             # Append and trim to last 5
             if interval == 1:
                 recent_candles_1m.append(archived_candle)
@@ -0,0 +1,329 @@
+# aggregator/materialize.py
+
+"""
+Incremental materialization of candle tables (candles_m1, candles_m5, ...)
+from the raw pricesandvolume ticks.
+
+The job keeps a high-water mark (timestamp of the last tick it processed)
+in a small state table. Each run restarts from the start of the coarsest
+bucket containing that mark minus `lateness`, so the trailing, still-filling
+bar of every interval is rebuilt from all of its ticks and replaced, and
+then walks forward over the remaining ticks in bucket-aligned time chunks.
+Each chunk is streamed from the cursor, resampled with aggregator.resample
+and written with one delete + bulk insert per table, committed together
+with the new high-water mark.
+
+The mark is a tick timestamp, not an insertion position, so ticks that are
+committed after newer ones were materialized would be skipped. The lateness
+window covers the usual cases (a lagging shard or a slow symbol committing
+a few seconds behind the others); writers that commit old ticks much later,
+such as a spill replay (storage.spill), call rewind_high_water_marks() so
+the next run goes back to them. The mark is only moved forward from the
+value the run started with, so a rewind made meanwhile is never overwritten.
+
+Once pricesandvolume carries a symbol column (storage.schema), each chunk
+is resampled per symbol and candles are replaced per symbol, so bars that
+sync-history back-filled for other symbols are left alone. A candle table
+without a symbol column can only take a single symbol.
+
+With rollups=True the hourly/daily summary tables (aggregator.rollups) are
+refreshed in the same transaction; chunks are then aligned to whole hours so
+every hour is always rebuilt from all of its ticks. The rollup tables have
+no symbol column, so they follow `rollup_symbol` (required once the ticks
+hold more than one symbol).
+
+With a `cache` (storage.candle_cache.CandleCache) every rewritten chunk is
+reported to it, so cached candles from the chunk start on are refetched.
+"""
+
+import math
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from aggregator.resample import candle_rows, resample_ticks, to_epoch_ns
+from aggregator.rollups import HOUR, Rollups
+
+DEFAULT_INTERVALS = (60, 300, 900)
+STATE_TABLE = 'materialize_state'
+FETCH_BATCH = 50_000
+
+STATE_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+        name TEXT PRIMARY KEY,
+        hwm  TIMESTAMP
+    )
+"""
+
+
+def candle_table(interval_seconds):
+    """Table name for an interval: 60 -> candles_m1, 3600 -> candles_h1, 30 -> candles_s30."""
+    if interval_seconds % 3600 == 0:
+        return f"candles_h{interval_seconds // 3600}"
+    if interval_seconds % 60 == 0:
+        return f"candles_m{interval_seconds // 60}"
+    return f"candles_s{interval_seconds}"
+
+
+def floor_time(dt, seconds):
+    """Floor a datetime to an epoch-aligned multiple of `seconds`."""
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc if dt.tzinfo else None)
+    us = (dt - epoch) // timedelta(microseconds=1)
+    us -= us % (seconds * 1_000_000)
+    floored = epoch + timedelta(microseconds=us)
+    return floored.astimezone(dt.tzinfo) if dt.tzinfo else floored
+
+
+def has_column(cur, table, column):
+    """True if `table` has `column` (works on SQLite and Postgres)."""
+    cur.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+    return column in [d[0] for d in cur.description]
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def rewind_high_water_marks(store, since):
+    """
+    Move every materializer's high-water mark back to `since` if it is past
+    it, so ticks just committed with older timestamps are materialized by the
+    next run. Returns the number of marks moved.
+    """
+    p = store.placeholder
+    with getattr(store, 'lock', None) or nullcontext():
+        cur = store.conn.cursor()
+        cur.execute(STATE_DDL)
+        since = store.to_db_time(since)
+        cur.execute(f"UPDATE {STATE_TABLE} SET hwm = {p} WHERE hwm > {p}", (since, since))
+        moved = cur.rowcount
+        store.conn.commit()
+    return moved
+
+
+class CandleMaterializer:
+    def __init__(self, store, intervals=DEFAULT_INTERVALS,
+                 chunk=timedelta(hours=6), name='candles', rollups=False, rollup_symbol=None,
+                 cache=None, lateness=timedelta(minutes=5)):
+        self.store = store
+        self.cache = cache
+        self.intervals = sorted(set(int(i) for i in intervals))
+        self.tables = {i: candle_table(i) for i in self.intervals}
+        self.rollups = Rollups(store) if rollups else None
+        self.rollup_symbol = rollup_symbol
+        # restart point and chunk boundaries must be bucket boundaries for
+        # every interval (and for the hourly rollup, if enabled); 300 and 420
+        # only share boundaries every lcm = 2100 seconds
+        self.coarsest = math.lcm(*self.intervals, *((HOUR,) if rollups else ()))
+        step = timedelta(seconds=self.coarsest)
+        self.chunk = step * max(1, -(-chunk // step))
+        self.name = name
+        self.lateness = lateness
+        self._symbol_columns = {}
+        self._hwm = None            # the mark as this run last read or wrote it
+
+    # ---------------------------------------------------------------- schema
+    def ensure_tables(self):
+        cur = self.store.conn.cursor()
+        for table in self.tables.values():
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    symbol    TEXT NOT NULL DEFAULT '',
+                    timestamp TIMESTAMP NOT NULL,
+                    open      DOUBLE PRECISION,
+                    high      DOUBLE PRECISION,
+                    low       DOUBLE PRECISION,
+                    close     DOUBLE PRECISION,
+                    volume    DOUBLE PRECISION
+                )
+            """)
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_timestamp_idx ON {table} (timestamp)"
+            )
+        cur.execute(STATE_DDL)
+        self.store.conn.commit()
+        if self.rollups:
+            self.rollups.ensure_tables()
+
+    # ---------------------------------------------------------------- state
+    def high_water_mark(self):
+        p = self.store.placeholder
+        cur = self.store.conn.cursor()
+        cur.execute(f"SELECT hwm FROM {STATE_TABLE} WHERE name = {p}", (self.name,))
+        row = cur.fetchone()
+        return _as_datetime(row[0]) if row and row[0] is not None else None
+
+    def _set_high_water_mark(self, cur, hwm):
+        """
+        Move the mark forward to `hwm`; False if it was rewound since this run
+        read it (the rewind is kept, and the run stops).
+        """
+        p = self.store.placeholder
+        to_db = self.store.to_db_time
+        if self._hwm is None:
+            cur.execute(f"DELETE FROM {STATE_TABLE} WHERE name = {p}", (self.name,))
+            cur.execute(f"INSERT INTO {STATE_TABLE} (name, hwm) VALUES ({p}, {p})",
+                        (self.name, to_db(hwm)))
+        else:
+            hwm = max(hwm, self._hwm)
+            cur.execute(f"UPDATE {STATE_TABLE} SET hwm = {p} WHERE name = {p} AND hwm = {p}",
+                        (to_db(hwm), self.name, to_db(self._hwm)))
+            if cur.rowcount != 1:
+                return False
+        self._hwm = hwm
+        return True
+
+    # ---------------------------------------------------------------- work
+    def _has_symbol(self, cur, table):
+        if table not in self._symbol_columns:
+            self._symbol_columns[table] = has_column(cur, table, 'symbol')
+        return self._symbol_columns[table]
+
+    def _next_tick_time(self, since):
+        p = self.store.placeholder
+        cur = self.store.conn.cursor()
+        if since is None:
+            cur.execute("SELECT MIN(timestamp) FROM pricesandvolume")
+        else:
+            cur.execute(
+                f"SELECT MIN(timestamp) FROM pricesandvolume WHERE timestamp >= {p}",
+                (self.store.to_db_time(since),)
+            )
+        row = cur.fetchone()
+        return _as_datetime(row[0]) if row and row[0] is not None else None
+
+    def _fetch(self, start, end):
+        """
+        Ticks in [start, end) as {symbol: (ts_ns, bid, ask, volume)} NumPy
+        columns in timestamp order, plus the newest timestamp. Rows are read
+        with fetchmany, so only one batch of row tuples is alive at a time;
+        ticks without a symbol column count as symbol ''.
+        """
+        p = self.store.placeholder
+        cur = self.store.conn.cursor()
+        with_symbol = self._has_symbol(cur, 'pricesandvolume')
+        cur.execute(
+            f"""
+            SELECT timestamp, bid, ask, volume{', symbol' if with_symbol else ''}
+              FROM pricesandvolume
+             WHERE timestamp >= {p} AND timestamp < {p}
+             ORDER BY timestamp
+            """,
+            (self.store.to_db_time(start), self.store.to_db_time(end))
+        )
+        parts = {}
+        last = None
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            last = rows[-1][0]
+            cols = list(zip(*rows))
+            del rows
+            batch = (to_epoch_ns(cols[0]), np.array(cols[1], dtype=np.float64),
+                     np.array(cols[2], dtype=np.float64),
+                     # NULL volume counts as 0
+                     np.nan_to_num(np.array(cols[3], dtype=np.float64)))
+            if not with_symbol:
+                parts.setdefault('', []).append(batch)
+                continue
+            symbols = np.array([s or '' for s in cols[4]], dtype=object)
+            for symbol in set(symbols):
+                mask = symbols == symbol
+                parts.setdefault(symbol, []).append(tuple(c[mask] for c in batch))
+        columns = {symbol: tuple(np.concatenate(c) for c in zip(*batches))
+                   for symbol, batches in parts.items()}
+        return columns, (_as_datetime(last) if last is not None else None)
+
+    def _write(self, cur, table, candles, start, end, symbol):
+        p = self.store.placeholder
+        to_db = self.store.to_db_time
+        rows = [(to_db(r[0]),) + r[1:] for r in candle_rows(candles)]
+        if self._has_symbol(cur, table):
+            cur.execute(
+                f"DELETE FROM {table} WHERE symbol = {p} AND timestamp >= {p} AND timestamp < {p}",
+                (symbol, to_db(start), to_db(end))
+            )
+            cur.executemany(
+                f"INSERT INTO {table} (timestamp, open, high, low, close, volume, symbol) "
+                f"VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})",
+                [r + (symbol,) for r in rows]
+            )
+            return
+        cur.execute(
+            f"DELETE FROM {table} WHERE timestamp >= {p} AND timestamp < {p}",
+            (to_db(start), to_db(end))
+        )
+        cur.executemany(
+            f"INSERT INTO {table} (timestamp, open, high, low, close, volume) "
+            f"VALUES ({p}, {p}, {p}, {p}, {p}, {p})",
+            rows
+        )
+
+    def process_chunk(self, by_symbol, start, end, last):
+        """
+        Resample one chunk of per-symbol (ts_ns, bid, ask, volume) columns, as
+        returned by _fetch, and persist it with the mark moved to `last`.
+        False if the mark was rewound meanwhile.
+        """
+        cur = self.store.conn.cursor()
+        for table in self.tables.values():
+            if len(by_symbol) > 1 and not self._has_symbol(cur, table):
+                raise ValueError(
+                    f"{table} has no symbol column and cannot hold candles of "
+                    f"{', '.join(sorted(by_symbol))}; run `forex-bot migrate` first"
+                )
+        if self.rollups and self.rollup_symbol is None and len(by_symbol) > 1:
+            raise ValueError("ticks of several symbols: rollups need a rollup_symbol")
+
+        for symbol, (ts_ns, bid, ask, volume) in by_symbol.items():
+            for interval, table in self.tables.items():
+                candles = resample_ticks(ts_ns, bid, ask, interval, volume=volume)
+                self._write(cur, table, candles, start, end, symbol)
+            # legacy ticks (no symbol column) are all of one symbol
+            if self.rollups and (symbol == '' or self.rollup_symbol in (None, symbol)):
+                self.rollups.update(cur, ts_ns, bid, ask, volume, start, end)
+        moved = self._set_high_water_mark(cur, last)
+        self.store.conn.commit()
+        if self.cache is not None:
+            for table in self.tables.values():
+                for symbol in by_symbol:
+                    self.cache.invalidate(table, symbol or None, since=start)
+        return moved
+
+    def run_once(self):
+        """Bring all candle tables up to date. Returns the number of ticks processed."""
+        hwm = self._hwm = self.high_water_mark()
+        start = floor_time(hwm - self.lateness, self.coarsest) if hwm else None
+        processed = 0
+        while True:
+            first = self._next_tick_time(start)
+            if first is None:
+                break
+            # jump over empty stretches (weekends, outages) in one query
+            start = floor_time(first, self.coarsest)
+            end = start + self.chunk
+            by_symbol, last = self._fetch(start, end)
+            if by_symbol:
+                processed += sum(len(c[0]) for c in by_symbol.values())
+                if not self.process_chunk(by_symbol, start, end, last):
+                    print(f"[INFO] {self.name}: high-water mark rewound by a late commit, "
+                          f"restarting from it on the next run")
+                    break
+            start = end
+        return processed
+
+    def run_forever(self, poll_seconds=5.0):
+        """Keep the tables current alongside `collect`; never rescans history."""
+        last = self.high_water_mark()
+        while True:
+            n = self.run_once()
+            hwm = self.high_water_mark()
+            if hwm != last:
+                print(f"[materialize] {n} ticks up to {hwm} -> {', '.join(self.tables.values())}")
+                last = hwm
+            time.sleep(poll_seconds)
@@ -0,0 +1,162 @@
+# aggregator/records.py
+
+"""
+Compact Tick and Candle value types for the per-tick hot path.
+
+Both are plain __slots__ classes: no per-instance __dict__, so an object is
+a fraction of the size of the equivalent dict, and attribute access
+(tick.bid, candle.close) is a slot load rather than a hash lookup.
+
+They also behave like the read-mostly dicts they replace: tick['bid'],
+candle.get('volume'), keys()/items(), dict(candle) and `==` against a dict
+all work, so callers and tests written against dicts keep working. Hot
+code should prefer the attributes.
+
+Tick.timestamp keeps whatever the source delivered (the collector emits
+naive UTC ISO strings, as before); Tick.time is the parsed datetime,
+computed once and cached. Tick.mid / Tick.price is the bid/ask mid.
+
+Tick.trace is None unless latency tracing is on; then it is a list of
+time.perf_counter_ns() stamps indexed by the TRACE_* constants, filled in
+as the tick moves through the live pipeline (see app.latency).
+"""
+
+from datetime import datetime
+
+_MISSING = object()
+
+# Tick.trace slots
+TRACE_RECEIVE = 0
+TRACE_AGGREGATE = 1
+TRACE_AGGREGATED = 2
+TRACE_INDICATORS = 3
+TRACE_INDICATORS_DONE = 4
+TRACE_SIGNAL = 5
+TRACE_ORDER = 6
+TRACE_SLOTS = 7
+
+
+class _Record:
+    __slots__ = ()
+    _fields = ()
+    _keys = frozenset()
+
+    def __getitem__(self, key):
+        if key in self._keys:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._keys else default
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, k) for k in self._fields]
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self._fields]
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self._fields}
+
+    def __eq__(self, other):
+        if isinstance(other, _Record):
+            return self._fields == other._fields and self.values() == other.values()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        args = ', '.join(f"{k}={getattr(self, k)!r}" for k in self._fields)
+        return f"{type(self).__name__}({args})"
+
+    def __reduce__(self):
+        return (type(self), tuple(self.values()))
+
+
+class Tick(_Record):
+    __slots__ = ('timestamp', 'symbol', 'bid', 'ask', 'volume', 'bid_size', 'ask_size',
+                 '_time', 'trace')
+    _fields = ('timestamp', 'symbol', 'bid', 'ask', 'volume', 'bid_size', 'ask_size')
+    # mid/price are derived, readable as tick['price'] but not part of keys()
+    _keys = frozenset(_fields + ('mid', 'price'))
+
+    def __init__(self, timestamp, symbol=None, bid=None, ask=None, volume=0.0,
+                 bid_size=None, ask_size=None):
+        self.timestamp = timestamp
+        self.symbol = symbol
+        self.bid = bid
+        self.ask = ask
+        self.volume = volume
+        self.bid_size = bid_size
+        self.ask_size = ask_size
+        self._time = _MISSING
+        self.trace = None
+
+    @classmethod
+    def from_dict(cls, d):
+        """Build a Tick from a tick dict (missing optional keys default to None)."""
+        if isinstance(d, cls):
+            return d
+        return cls(d['timestamp'], d.get('symbol'), d['bid'], d['ask'], d.get('volume', 0.0),
+                   d.get('bid_size'), d.get('ask_size'))
+
+    @property
+    def time(self):
+        """timestamp as a datetime (ISO strings are parsed once and cached)."""
+        t = self._time
+        if t is _MISSING:
+            ts = self.timestamp
+            t = self._time = datetime.fromisoformat(ts) if isinstance(ts, str) else ts
+        return t
+
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2.0
+
+    price = mid
+
+
+class Candle(_Record):
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+    _fields = __slots__
+    _keys = frozenset(_fields)
+
+    def __init__(self, timestamp, open, high, low, close, volume=0.0):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_dict(cls, d):
+        if isinstance(d, cls):
+            return d
+        return cls(d['timestamp'], d['open'], d['high'], d['low'], d['close'], d.get('volume', 0.0))
+
+
+def ohlc(candle):
+    """(open, high, low, close) of a Candle or a candle dict."""
+    if type(candle) is Candle:
+        return candle.open, candle.high, candle.low, candle.close
+    return candle['open'], candle['high'], candle['low'], candle['close']
@@ -0,0 +1,177 @@
+# aggregator/reorder.py
+
+"""
+Out-of-order tick handling in front of the candle aggregator.
+
+ReorderBuffer holds ticks in a min-heap and releases them in timestamp order
+once the watermark (latest timestamp seen minus the allowed lateness) has
+passed them, so the downstream CandleBuilder only ever sees increasing time
+and therefore only finalizes a candle after the watermark has moved past it.
+Ticks that arrive behind what has already been released are "late";
+ReorderingCandleBuilder turns those into correction events for the bar they
+belong to instead of folding them into the wrong bucket.
+
+Both knobs are exposed: max_lateness trades latency for tolerance, and
+max_buffered caps memory (when exceeded, the oldest ticks are released early).
+"""
+
+import datetime
+import heapq
+import itertools
+import math
+from collections import OrderedDict
+
+from aggregator.candle_builder import MultiIntervalCandleBuilder
+from aggregator.records import Tick
+
+
+class ReorderBuffer:
+    def __init__(self, max_lateness=2.0, max_buffered=10000):
+        self.max_lateness = datetime.timedelta(seconds=max_lateness)
+        self.max_buffered = max_buffered
+        self.max_seen = None
+        self.watermark = None       # timestamp of the last released tick
+        self.late = 0               # ticks rejected as late
+        self.forced = 0             # ticks released early because the buffer was full
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, tick):
+        """
+        Add a tick. Returns (ready, late): ticks now safe to aggregate, in
+        timestamp order, and the tick itself if it arrived too late.
+        Tick dicts are converted to Tick here so the timestamp is parsed once.
+        """
+        if type(tick) is not Tick:
+            tick = Tick.from_dict(tick)
+        ts = tick.time
+        if self.watermark is not None and ts < self.watermark:
+            self.late += 1
+            return [], [tick]
+        heapq.heappush(self._heap, (ts, next(self._seq), tick))
+        if self.max_seen is None or ts > self.max_seen:
+            self.max_seen = ts
+        return self._release(self.max_seen - self.max_lateness), []
+
+    def flush(self):
+        """Release everything still buffered (e.g. on shutdown)."""
+        return self._release(None)
+
+    def _release(self, until):
+        ready = []
+        heap = self._heap
+        while heap:
+            ts = heap[0][0]
+            if until is not None and ts > until:
+                if len(heap) <= self.max_buffered:
+                    break
+                self.forced += 1
+            ready.append(heapq.heappop(heap)[2])
+            self.watermark = ts
+        return ready
+
+
+class ReorderingCandleBuilder:
+    """
+    MultiIntervalCandleBuilder behind a ReorderBuffer.
+
+    add_tick() returns {'candles': [(interval, candle), ...],
+                        'corrections': [(interval, candle), ...]}.
+    Corrections carry the full, updated candle for a bar that was already
+    emitted; the last `keep` finalized bars per interval are retained for this.
+    Late ticks that fall in a still-open bar are merged into it silently.
+    """
+    def __init__(self, intervals, max_lateness=2.0, max_buffered=10000,
+                 keep=64, cascade=False):
+        self.buffer = ReorderBuffer(max_lateness, max_buffered)
+        self.builder = MultiIntervalCandleBuilder(intervals, cascade=cascade)
+        self.keep = keep
+        self.dropped = 0            # late ticks whose bar was no longer retained
+        self._finalized = {i: OrderedDict() for i in self.builder.builders}
+        self._first_ts = {}
+        self._last_ts = None
+
+    def add_tick(self, tick):
+        ready, late = self.buffer.push(tick)
+        return self._process(ready, late)
+
+    def flush(self):
+        return self._process(self.buffer.flush(), [])
+
+    def _process(self, ready, late):
+        events = {'candles': [], 'corrections': []}
+        for tick in ready:
+            ts = tick.time
+            completed = self.builder.add_tick(tick)
+            for interval, candle in completed.items():
+                self._remember(interval, candle)
+                events['candles'].append((interval, candle))
+                self._first_ts[interval] = ts
+            if self._last_ts is None:
+                self._first_ts = {i: ts for i in self.builder.builders}
+            self._last_ts = ts
+        for tick in late:
+            events['corrections'].extend(self._apply_late(tick))
+        return events
+
+    def _remember(self, interval, candle):
+        bars = self._finalized[interval]
+        bars[candle['timestamp']] = {
+            'candle': candle,
+            'first': self._first_ts[interval],
+            'last': self._last_ts,
+        }
+        while len(bars) > self.keep:
+            bars.popitem(last=False)
+
+    def _apply_late(self, tick):
+        ts = tick.time
+        mid = tick.mid
+        volume = tick.volume
+        corrections = []
+        fine_start = None
+        if self.builder.cascade:
+            fine_start = self.builder.builders[self.builder.finest].current_start
+        for interval, b in self.builder.builders.items():
+            if ts >= b.current_start:
+                # still-open bar; in cascading mode a coarse bar only holds the
+                # completed finer bars, the live fine bar is handled by its builder
+                if fine_start is not None and interval != self.builder.finest and ts >= fine_start:
+                    continue
+                if b.open is None:
+                    # cascading coarse bar with no completed finer bar yet; the
+                    # later fine bars set its close as they are folded in
+                    b.open = b.high = b.low = b.close = mid
+                    b.volume = volume
+                    self._first_ts[interval] = ts
+                    continue
+                b.high = max(b.high, mid)
+                b.low = min(b.low, mid)
+                b.volume += volume
+                if ts < self._first_ts[interval]:
+                    b.open = mid
+                    self._first_ts[interval] = ts
+                continue
+
+            periods = math.ceil((b.current_start - ts) / b.interval)
+            start = (b.current_start - b.interval * periods).isoformat()
+            entry = self._finalized[interval].get(start)
+            if entry is None:
+                self.dropped += 1
+                continue
+            candle = dict(entry['candle'])
+            candle['high'] = max(candle['high'], mid)
+            candle['low'] = min(candle['low'], mid)
+            candle['volume'] += volume
+            if ts < entry['first']:
+                candle['open'] = mid
+                entry['first'] = ts
+            if ts > entry['last']:
+                candle['close'] = mid
+                entry['last'] = ts
+            entry['candle'] = candle
+            corrections.append((interval, candle))
+        return corrections
@@ -0,0 +1,167 @@
+# aggregator/resample.py
+
+"""
+Batch tick -> OHLCV resampling on NumPy columns.
+
+Unlike CandleBuilder, which walks one tick at a time and anchors its first
+bucket on the first tick it sees, the resampler works on whole tick arrays
+and aligns every bucket to the Unix epoch, so a 5-minute bar always starts
+at :00, :05, :10 ... and a 1-hour bar on the hour, regardless of where the
+input begins. Ticks must already be in timestamp order (which is how every
+store returns them); the reduction is done segment-wise with
+``np.ufunc.reduceat`` so no sort or per-tick Python loop is involved.
+"""
+
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+
+NS_PER_SECOND = 1_000_000_000
+
+_UNIT_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_INTERVAL_RE = re.compile(r'^\s*(\d+)\s*([smhd]?)\s*$', re.IGNORECASE)
+
+
+def parse_interval(interval):
+    """
+    Normalise an interval to whole seconds.
+    Accepts an int/float number of seconds or a string such as '30s', '5m',
+    '1h', '1d' (a bare number string is taken as seconds).
+    """
+    if isinstance(interval, str):
+        match = _INTERVAL_RE.match(interval)
+        if not match:
+            raise ValueError(f"Unrecognised interval: {interval!r}")
+        value, unit = match.groups()
+        seconds = int(value) * _UNIT_SECONDS[(unit or 's').lower()]
+    else:
+        seconds = int(interval)
+    if seconds <= 0:
+        raise ValueError(f"Interval must be positive, got {interval!r}")
+    return seconds
+
+
+def to_epoch_ns(timestamps):
+    """
+    Convert timestamps to an int64 array of nanoseconds since the epoch.
+    Accepts datetime64 arrays, integer arrays (already epoch-ns), or a
+    sequence of datetime objects / ISO strings as returned by the stores.
+    Naive datetimes are taken as UTC; aware ones are converted to UTC.
+    """
+    arr = np.asarray(timestamps)
+    if arr.dtype.kind == 'M':
+        return arr.astype('datetime64[ns]').astype(np.int64)
+    if arr.dtype.kind in 'iu':
+        return arr.astype(np.int64, copy=False)
+    if arr.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if isinstance(arr.flat[0], datetime):
+        arr = np.array(
+            [t.astimezone(timezone.utc).replace(tzinfo=None) if t.tzinfo else t
+             for t in arr.ravel()],
+            dtype='datetime64[ns]'
+        )
+        return arr.astype(np.int64)
+    return np.array(arr, dtype='datetime64[ns]').astype(np.int64)
+
+
+def epoch_ns_to_iso(ns):
+    """int64 epoch-ns array -> naive UTC ISO strings with microseconds (the SQLite tick format)."""
+    return np.datetime_as_string(
+        np.asarray(ns, dtype=np.int64).view('datetime64[ns]').astype('datetime64[us]')
+    ).tolist()
+
+
+def bucket_starts(ts_ns, interval_seconds):
+    """Epoch-aligned bucket start (epoch-ns) for each timestamp."""
+    step = np.int64(interval_seconds) * NS_PER_SECOND
+    return ts_ns - np.mod(ts_ns, step)
+
+
+def resample_ticks(timestamps, bid, ask, interval, volume=None,
+                   bid_size=None, ask_size=None):
+    """
+    Resample time-ordered ticks into epoch-aligned candles.
+
+    timestamps: anything accepted by to_epoch_ns
+    bid, ask:   price arrays, same length as timestamps
+    interval:   seconds or a string like '5m' (see parse_interval)
+    volume:     per-tick volume; if omitted, bid_size + ask_size is used
+                (NULL sizes count as 0), and zero if neither is given.
+
+    Returns a dict of equal-length NumPy columns, one row per non-empty bucket:
+      timestamp              datetime64[ns] bucket start
+      open/high/low/close    mid-price OHLC
+      volume                 summed tick volume
+      ticks                  number of ticks in the bucket
+      spread_mean/min/max    ask - bid statistics
+    """
+    step = parse_interval(interval)
+    ts_ns = to_epoch_ns(timestamps)
+    bid = np.asarray(bid, dtype=np.float64)
+    ask = np.asarray(ask, dtype=np.float64)
+    n = ts_ns.shape[0]
+    if bid.shape[0] != n or ask.shape[0] != n:
+        raise ValueError("timestamps, bid and ask must have the same length")
+
+    if volume is not None:
+        vol = np.asarray(volume, dtype=np.float64)
+    elif bid_size is not None or ask_size is not None:
+        vol = np.zeros(n, dtype=np.float64)
+        for sizes in (bid_size, ask_size):
+            if sizes is not None:
+                vol += np.nan_to_num(np.asarray(sizes, dtype=np.float64))
+    else:
+        vol = np.zeros(n, dtype=np.float64)
+
+    if n == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return {
+            'timestamp': np.empty(0, dtype='datetime64[ns]'),
+            'open': empty, 'high': empty.copy(), 'low': empty.copy(),
+            'close': empty.copy(), 'volume': empty.copy(),
+            'ticks': np.empty(0, dtype=np.int64),
+            'spread_mean': empty.copy(), 'spread_min': empty.copy(),
+            'spread_max': empty.copy(),
+        }
+
+    buckets = bucket_starts(ts_ns, step)
+    if n > 1 and np.any(buckets[1:] < buckets[:-1]):
+        raise ValueError("ticks must be sorted by timestamp")
+
+    # Segment boundaries: first tick plus every tick that opens a new bucket.
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    mid = (bid + ask) * 0.5
+    spread = ask - bid
+    counts = np.diff(np.r_[starts, n])
+
+    return {
+        'timestamp': buckets[starts].astype('datetime64[ns]'),
+        'open': mid[starts],
+        'high': np.maximum.reduceat(mid, starts),
+        'low': np.minimum.reduceat(mid, starts),
+        'close': mid[ends],
+        'volume': np.add.reduceat(vol, starts),
+        'ticks': counts.astype(np.int64),
+        'spread_mean': np.add.reduceat(spread, starts) / counts,
+        'spread_min': np.minimum.reduceat(spread, starts),
+        'spread_max': np.maximum.reduceat(spread, starts),
+    }
+
+
+def candle_rows(candles, columns=('timestamp', 'open', 'high', 'low', 'close', 'volume')):
+    """
+    Turn resampled columns into a list of row tuples for executemany(),
+    with bucket timestamps as naive UTC datetime objects.
+    """
+    out = []
+    for name in columns:
+        col = candles[name]
+        if col.dtype.kind == 'M':
+            out.append(col.astype('datetime64[us]').tolist())
+        else:
+            out.append(col.tolist())
+    return list(zip(*out))
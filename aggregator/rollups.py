@@ -0,0 +1,242 @@
+# aggregator/rollups.py
+
+"""
+Hourly and daily summary tables kept next to the candle tables.
+
+    rollup_h1 / rollup_d1:
+        timestamp                 bucket start (UTC, epoch-aligned)
+        open, high, low, close    mid-price OHLC
+        volume, ticks             summed tick volume, number of ticks
+        spread_avg                mean ask - bid over the bucket's ticks
+        pattern_bull/bear         1-minute bars in the bucket whose
+                                  single-candle pattern score is >0 / <0
+
+Rollups are written by CandleMaterializer as it processes tick chunks. With
+rollups enabled, its chunks start on whole hours and it restarts from the
+hour containing the high-water mark. Every hour a chunk touches is then
+rebuilt from all of its ticks. Daily rows are re-derived from the hourly
+rows of each day touched, so neither table ever needs a rescan of ticks.
+
+range_stats() answers range questions (high/low/range/volume/pattern counts
+between two times) from at most a handful of rollup rows. Whole days come
+from rollup_d1 and the partial days at either end from rollup_h1.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+from aggregator.resample import NS_PER_SECOND, candle_rows, resample_ticks, to_epoch_ns
+
+HOUR = 3600
+DAY = 86400
+ROLLUP_TABLES = {HOUR: 'rollup_h1', DAY: 'rollup_d1'}
+ROLLUP_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume',
+                  'ticks', 'spread_avg', 'pattern_bull', 'pattern_bear')
+
+
+def candle_pattern_scores(open_, high, low, close):
+    """
+    Vectorized strategy.indicators.detect_candle_pattern: one score per
+    candle (Doji ±0.5, Marubozu ±0.7, Hammer/Hanging Man and Inverted
+    Hammer/Shooting Star ±0.4, else 0).
+    """
+    o, h, l, c = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    body = np.abs(c - o)
+    total = h - l
+    upper = h - np.maximum(o, c)
+    lower = np.minimum(o, c) - l
+    sign = np.sign(c - o)
+    direction = np.where(c > o, 1.0, -1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = body / total
+    valid = total != 0
+    # same precedence as the scalar version: first matching rule wins
+    return np.select(
+        [
+            ~valid,
+            ratio < 0.1,
+            body >= 0.9 * total,
+            (lower >= 2 * body) & (upper <= 0.3 * body),
+            (upper >= 2 * body) & (lower <= 0.3 * body),
+        ],
+        [0.0, 0.5 * sign, 0.7 * direction, 0.4 * direction, 0.4 * direction],
+        default=0.0,
+    )
+
+
+def _bucket_of(ts_ns, seconds):
+    step = np.int64(seconds) * NS_PER_SECOND
+    return ts_ns - np.mod(ts_ns, step)
+
+
+def _floor_day(dt):
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _group_counts(keys, buckets, values):
+    """Sum of `values` per entry of `buckets` (both sorted epoch-ns)."""
+    idx = np.searchsorted(buckets, keys)
+    return np.bincount(idx, weights=values, minlength=len(buckets)).astype(np.int64)
+
+
+def combine(rows):
+    """
+    Merge time-ordered rollup rows (dicts of columns) into one summary.
+    Returns None when there are no rows.
+    """
+    if not len(rows['timestamp']):
+        return None
+    ticks = rows['ticks'].sum()
+    spread = (rows['spread_avg'] * rows['ticks']).sum() / ticks if ticks else float('nan')
+    high, low = rows['high'].max(), rows['low'].min()
+    return {
+        'open': float(rows['open'][0]),
+        'high': float(high),
+        'low': float(low),
+        'close': float(rows['close'][-1]),
+        'range': float(high - low),
+        'volume': float(rows['volume'].sum()),
+        'ticks': int(ticks),
+        'spread_avg': float(spread),
+        'pattern_bull': int(rows['pattern_bull'].sum()),
+        'pattern_bear': int(rows['pattern_bear'].sum()),
+    }
+
+
+def hourly_rollups(ts_ns, bid, ask, volume):
+    """Hourly rollup columns for a run of time-ordered ticks."""
+    hours = resample_ticks(ts_ns, bid, ask, HOUR, volume=volume)
+    minutes = resample_ticks(ts_ns, bid, ask, 60, volume=volume)
+    scores = candle_pattern_scores(minutes['open'], minutes['high'],
+                                   minutes['low'], minutes['close'])
+    hour_ns = hours['timestamp'].astype(np.int64)
+    minute_hours = _bucket_of(minutes['timestamp'].astype(np.int64), HOUR)
+    return {
+        'timestamp': hours['timestamp'],
+        'open': hours['open'], 'high': hours['high'],
+        'low': hours['low'], 'close': hours['close'],
+        'volume': hours['volume'],
+        'ticks': hours['ticks'],
+        'spread_avg': hours['spread_mean'],
+        'pattern_bull': _group_counts(minute_hours, hour_ns, (scores > 0).astype(np.float64)),
+        'pattern_bear': _group_counts(minute_hours, hour_ns, (scores < 0).astype(np.float64)),
+    }
+
+
+def daily_rollups(hourly):
+    """Daily rollup columns from time-ordered hourly rollup columns."""
+    ts = to_epoch_ns(hourly['timestamp'])
+    if not len(ts):
+        return {k: np.asarray(hourly[k])[:0] for k in ROLLUP_COLUMNS}
+    days = _bucket_of(ts, DAY)
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    ticks = np.add.reduceat(hourly['ticks'], starts)
+    spread_sum = np.add.reduceat(hourly['spread_avg'] * hourly['ticks'], starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = np.where(ticks > 0, spread_sum / ticks, np.nan)
+    return {
+        'timestamp': days[starts].astype('datetime64[ns]'),
+        'open': hourly['open'][starts],
+        'high': np.maximum.reduceat(hourly['high'], starts),
+        'low': np.minimum.reduceat(hourly['low'], starts),
+        'close': hourly['close'][ends],
+        'volume': np.add.reduceat(hourly['volume'], starts),
+        'ticks': ticks,
+        'spread_avg': spread,
+        'pattern_bull': np.add.reduceat(hourly['pattern_bull'], starts),
+        'pattern_bear': np.add.reduceat(hourly['pattern_bear'], starts),
+    }
+
+
+class Rollups:
+    def __init__(self, store):
+        self.store = store
+
+    def ensure_tables(self):
+        cur = self.store.conn.cursor()
+        for table in ROLLUP_TABLES.values():
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    timestamp    TIMESTAMP NOT NULL PRIMARY KEY,
+                    open         DOUBLE PRECISION,
+                    high         DOUBLE PRECISION,
+                    low          DOUBLE PRECISION,
+                    close        DOUBLE PRECISION,
+                    volume       DOUBLE PRECISION,
+                    ticks        BIGINT,
+                    spread_avg   DOUBLE PRECISION,
+                    pattern_bull INTEGER,
+                    pattern_bear INTEGER
+                )
+            """)
+        self.store.conn.commit()
+
+    # ---------------------------------------------------------------- writes
+    def _replace(self, cur, table, rows, start, end):
+        p = self.store.placeholder
+        to_db = self.store.to_db_time
+        cur.execute(
+            f"DELETE FROM {table} WHERE timestamp >= {p} AND timestamp < {p}",
+            (to_db(start), to_db(end))
+        )
+        cur.executemany(
+            f"INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)}) "
+            f"VALUES ({', '.join([p] * len(ROLLUP_COLUMNS))})",
+            [(to_db(r[0]),) + r[1:] for r in candle_rows(rows, ROLLUP_COLUMNS)]
+        )
+
+    def update(self, cur, ts_ns, bid, ask, volume, start, end):
+        """
+        Rebuild the hours in [start, end) from this chunk's ticks and the
+        days they fall in from rollup_h1. `start` must be on an hour boundary
+        and the ticks must cover everything from `start` onwards.
+        """
+        self._replace(cur, ROLLUP_TABLES[HOUR], hourly_rollups(ts_ns, bid, ask, volume), start, end)
+        day_start = _floor_day(start)
+        day_end = _floor_day(end)
+        if day_end < end:
+            day_end += timedelta(days=1)
+        hourly = self._read(cur, ROLLUP_TABLES[HOUR], day_start, day_end)
+        self._replace(cur, ROLLUP_TABLES[DAY], daily_rollups(hourly), day_start, day_end)
+
+    # ---------------------------------------------------------------- reads
+    def _read(self, cur, table, start, end):
+        p = self.store.placeholder
+        cur.execute(
+            f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM {table} "
+            f"WHERE timestamp >= {p} AND timestamp < {p} ORDER BY timestamp",
+            (self.store.to_db_time(start), self.store.to_db_time(end))
+        )
+        rows = cur.fetchall()
+        cols = list(zip(*rows)) if rows else [()] * len(ROLLUP_COLUMNS)
+        out = {'timestamp': to_epoch_ns(cols[0]).astype('datetime64[ns]')}
+        for name, values in zip(ROLLUP_COLUMNS[1:], cols[1:]):
+            dtype = np.int64 if name in ('ticks', 'pattern_bull', 'pattern_bear') else np.float64
+            out[name] = np.array(values, dtype=dtype)
+        return out
+
+    def range_stats(self, since, until):
+        """
+        Summary of [since, until) at hour resolution (both ends are floored to
+        the hour): open/high/low/close, range, volume, ticks, spread_avg and
+        pattern counts. None if there is no data in the range.
+        """
+        since = since.replace(minute=0, second=0, microsecond=0)
+        until = until.replace(minute=0, second=0, microsecond=0)
+        first_day = _floor_day(since)
+        if first_day < since:
+            first_day += timedelta(days=1)
+        last_day = _floor_day(until)
+        cur = self.store.conn.cursor()
+        if first_day < last_day:
+            parts = [
+                self._read(cur, ROLLUP_TABLES[HOUR], since, first_day),
+                self._read(cur, ROLLUP_TABLES[DAY], first_day, last_day),
+                self._read(cur, ROLLUP_TABLES[HOUR], last_day, until),
+            ]
+            rows = {k: np.concatenate([p[k] for p in parts]) for k in ROLLUP_COLUMNS}
+        else:
+            rows = self._read(cur, ROLLUP_TABLES[HOUR], since, until)
+        return combine(rows)
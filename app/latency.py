@@ -0,0 +1,156 @@
+# app/latency.py
+
+"""
+Latency histograms for the live pipeline.
+
+LatencyHistogram is HDR-style: values (nanoseconds) go into log-linear
+buckets, with 2**sub_bits sub-buckets per power of two. The relative error
+is therefore bounded (about 1.6% with the default 6 bits) from nanoseconds
+to minutes, in a fixed list of counters. Recording is a handful of integer
+operations; percentiles are computed only when a snapshot is taken.
+
+With tracing on, the collector stamps every Tick with its receive time
+(Tick.trace, see aggregator.records) and the pipeline stages add theirs.
+LatencyRecorder turns the stamps into one histogram per step:
+
+    queue           receive -> aggregate stage picks the tick up
+    aggregate       candle building
+    indicators      evaluate_indicators
+    strategy        bar close -> signal (includes indicators)
+    order           signal -> order handed off
+    tick_to_signal  receive -> signal
+    tick_to_order   receive -> order
+    persist         one store.insert_ticks batch
+
+Each histogram is written by a single stage thread, so no locks are taken.
+With tracing off, Tick.trace stays None and nothing is recorded.
+"""
+
+import json
+import os
+import time
+
+STAGES = ('queue', 'aggregate', 'indicators', 'strategy', 'order',
+          'tick_to_signal', 'tick_to_order', 'persist')
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    def __init__(self, sub_bits=6, max_bits=44):
+        # values beyond 2**max_bits ns (~4.9 hours) land in the last bucket
+        self.sub_bits = sub_bits
+        self.max_value = (1 << max_bits) - 1
+        self.counts = [0] * ((max_bits - sub_bits + 1) << sub_bits)
+
+    def record(self, ns):
+        if ns < 0:
+            ns = 0
+        elif ns > self.max_value:
+            ns = self.max_value
+        shift = ns.bit_length() - self.sub_bits
+        if shift <= 0:
+            self.counts[ns] += 1
+        else:
+            self.counts[(shift << self.sub_bits) + (ns >> shift)] += 1
+
+    def _value(self, index):
+        """Midpoint of a bucket's value range."""
+        shift = index >> self.sub_bits
+        if shift == 0:
+            return index
+        low = (index & ((1 << self.sub_bits) - 1)) << shift
+        return low + (1 << shift) // 2
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def percentile(self, p):
+        total = self.count
+        if not total:
+            return 0
+        rank = max(1, -(-total * p // 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self._value(i)
+        return self._value(len(self.counts) - 1)
+
+    def mean(self):
+        total = self.count
+        if not total:
+            return 0.0
+        return sum(n * self._value(i) for i, n in enumerate(self.counts) if n) / total
+
+    def max(self):
+        for i in range(len(self.counts) - 1, -1, -1):
+            if self.counts[i]:
+                return self._value(i)
+        return 0
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+
+    def snapshot(self):
+        """count, mean, percentiles and max in microseconds."""
+        out = {'count': self.count, 'mean_us': self.mean() / 1000}
+        for p in PERCENTILES:
+            out[f'p{p:g}_us'] = self.percentile(p) / 1000
+        out['max_us'] = self.max() / 1000
+        return out
+
+
+class LatencyRecorder:
+    def __init__(self, stages=STAGES):
+        self.histograms = {s: LatencyHistogram() for s in stages}
+
+    def record(self, stage, ns):
+        self.histograms[stage].record(ns)
+
+    def snapshot(self):
+        return {s: h.snapshot() for s, h in self.histograms.items() if h.count}
+
+    def report_line(self):
+        parts = []
+        for stage, s in self.snapshot().items():
+            parts.append(f"{stage} p50={s['p50_us']:.1f}us p99={s['p99_us']:.1f}us")
+        return '[latency] ' + ('; '.join(parts) if parts else 'no samples')
+
+
+def write_stats(path, stages, latency=None):
+    """Write the pipeline metrics (and latency snapshot) for `forex-bot stats`."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'time': time.time(), 'stages': stages,
+                   'latency': latency.snapshot() if latency else {}}, f, indent=1)
+    os.replace(tmp, path)
+
+
+def format_stats(data):
+    """Text report of a stats file as written by write_stats."""
+    age = time.time() - data.get('time', 0)
+    lines = [f"Pipeline stats, {age:.0f}s old"]
+    stages = data.get('stages') or []
+    if stages:
+        lines.append(f"{'stage':<15}{'depth':>8}{'max':>8}{'rate/s':>10}{'busy':>8}"
+                     f"{'dropped':>9}{'errors':>8}")
+        for s in stages:
+            lines.append(f"{s['stage']:<15}{s['depth']:>8}{s['high_water']:>8}"
+                         f"{s['rate']:>10.1f}{s['busy']:>8.1%}{s['dropped']:>9}{s['errors']:>8}")
+    latency = data.get('latency') or {}
+    if latency:
+        cols = ['count', 'mean_us'] + [f'p{p:g}_us' for p in PERCENTILES] + ['max_us']
+        lines.append('')
+        lines.append(f"{'latency (us)':<15}" + ''.join(f"{c.replace('_us', ''):>10}" for c in cols))
+        for stage, s in latency.items():
+            lines.append(f"{stage:<15}{s['count']:>10}"
+                         + ''.join(f"{s[c]:>10.1f}" for c in cols[1:]))
+    return '\n'.join(lines)
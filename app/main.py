@@ -1,40 +1,299 @@
 # app/main.py
+import functools
+import json
+import os
 import typer
+from datetime import datetime, timedelta
+import numpy as np
 from config.loader import load_config
 from collector.saxo import SaxoCollector
-from storage.store import get_store
-from aggregator.candle_builder import MultiIntervalCandleBuilder
-from strategy.strategies import ParametrizedStrategy
+from collector.capture import CaptureWriter
+from collector.router import ShardedRouter, SymbolRouter
+from app.pipeline import collect_pipeline
+from app.latency import LatencyRecorder, format_stats
+from storage.store import get_store, get_archive
+from storage.spill import SpillingStore
+from storage.candle_cache import CandleCache
+from aggregator.materialize import CandleMaterializer, DEFAULT_INTERVALS, rewind_high_water_marks
 #from backtest.replay import run_backtest
 from backtest.trading_logic_test import backtest as run_legacy
 
 app = typer.Typer()
 
+DEFAULT_STATS_FILE = 'data/collect_stats.json'
+
+@app.command()
+def collect(
+    workers: int = typer.Option(None, help="Worker processes to shard symbols over (default collector.workers, 1 = in-process)."),
+    capture: str = typer.Option(None, help="Record raw messages and ticks to this capture directory (default collector.capture_dir)."),
+    latency: bool = typer.Option(None, "--latency/--no-latency", help="Trace per-stage tick latency (default collector.latency)."),
+):
+    """Stream ticks for all configured symbols, with per-symbol candles and strategy."""
+    settings = load_config()
+    with get_store() as store:
+        if len(settings.collector.symbols) > 1 and not store.has_symbol_column():
+            print("[ERROR] pricesandvolume has no symbol column, so several symbols would be "
+                  "mixed; run `forex-bot migrate` first")
+            raise typer.Exit(1)
+        capture  = capture or getattr(settings.collector, 'capture_dir', None)
+        recorder = CaptureWriter(capture) if capture else None
+        if latency is None:
+            latency = getattr(settings.collector, 'latency', False)
+        latency  = LatencyRecorder() if latency else None
+        collector= SaxoCollector(settings.collector, store, capture=recorder, trace=latency is not None)
+        workers  = workers or getattr(settings.collector, 'workers', 1)
+        policy   = getattr(settings.collector, 'queue_policy', 'block')
+        if workers > 1:
+            router = ShardedRouter(
+                workers,
+                maxsize=getattr(settings.collector, 'shard_queue_size', 10_000),
+                policy=policy,
+            ).start()
+            print(f"[INFO] {len(settings.collector.symbols)} symbols over {workers} shards")
+        else:
+            router = SymbolRouter()
+        # failed batches are retried, then spilled to disk and replayed, never dropped
+        # replayed spills hold old ticks: rewind the materializer so it picks them up
+        writer   = SpillingStore(store, getattr(settings.storage, 'spill_dir', None) or 'data/spill',
+                                 on_replay=functools.partial(rewind_high_water_marks, store))
+        pipeline = collect_pipeline(
+            writer, router,
+            queue_size=getattr(settings.collector, 'queue_size', 10_000),
+            policy=policy,
+            report_interval=getattr(settings.collector, 'report_interval', 60.0),
+            latency=latency,
+            stats_file=getattr(settings.collector, 'stats_file', DEFAULT_STATS_FILE),
+        ).start()
+
+        collector.on_tick(pipeline.submit_async)
+        try:
+            collector.run()
+        finally:
+            pipeline.close()
+            pipeline.report()
+            router.close()
+            if recorder:
+                recorder.close()
+
 @app.command()
-def collect():
+def stats(
+    path: str = typer.Option(None, "--file", help="Stats file written by collect (default collector.stats_file)."),
+    as_json: bool = typer.Option(False, "--json", help="Print the raw JSON."),
+):
+    """Show the pipeline throughput and latency histograms of the running collect."""
     settings = load_config()
-    store    = get_store()
-    collector= SaxoCollector(settings.collector, store)
-    builder  = MultiIntervalCandleBuilder(settings.aggregator.intervals)
-    strategy = ParametrizedStrategy(settings.strategy)
-
-    def on_tick(tick):
-        store.insert_tick(tick)
-        completed = builder.add_tick(tick)
-        if 60 in completed:
-            # e.g. keep only 1m history for simplicity
-            history.append(completed[60])
-            signal = strategy.generate_signal(history, tick)
-            print(f"{tick['timestamp']}: {signal}")
-
-    collector.on_tick(on_tick)
-    collector.run()
+    path = path or getattr(settings.collector, 'stats_file', DEFAULT_STATS_FILE)
+    if not os.path.exists(path):
+        print(f"[ERROR] No stats at {path}; is collect running?")
+        raise typer.Exit(1)
+    with open(path) as f:
+        data = json.load(f)
+    print(json.dumps(data, indent=1) if as_json else format_stats(data))
+
+@app.command()
+def materialize(
+    follow: bool = typer.Option(False, help="Keep running and pick up new ticks as they arrive."),
+    poll: float = typer.Option(5.0, help="Seconds between passes with --follow."),
+    chunk_hours: float = typer.Option(6.0, help="Tick window processed per bulk step."),
+    lateness: float = typer.Option(300.0, help="Seconds behind the high-water mark rescanned for late-committed ticks."),
+    rollups: bool = typer.Option(True, help="Also maintain the rollup_h1/rollup_d1 summary tables."),
+    rollup_symbol: str = typer.Option(None, help="Symbol the rollups follow (default: first of collector.symbols)."),
+):
+    """Build candles_m1/m5/m15 (plus configured intervals) from pricesandvolume."""
+    settings = load_config()
+    with get_store() as store:
+        intervals = set(DEFAULT_INTERVALS) | set(settings.aggregator.intervals)
+        rollup_symbol = rollup_symbol or next(iter(settings.collector.symbols), None)
+        cache    = CandleCache(getattr(settings.storage, 'candle_cache_dir', None) or 'data/candle_cache')
+        job = CandleMaterializer(store, intervals, chunk=timedelta(hours=chunk_hours),
+                                 rollups=rollups, rollup_symbol=rollup_symbol, cache=cache,
+                                 lateness=timedelta(seconds=lateness))
+        job.ensure_tables()
+        try:
+            if follow:
+                job.run_forever(poll)
+            else:
+                n = job.run_once()
+                print(f"Materialized {n} ticks into {', '.join(job.tables.values())}")
+        except ValueError as e:
+            print(f"[ERROR] {e}")
+            raise typer.Exit(1)
+
+@app.command("range-stats")
+def range_stats(
+    since: str = typer.Argument(..., help="ISO start time (floored to the hour)."),
+    until: str = typer.Argument(..., help="ISO end time, exclusive (floored to the hour)."),
+):
+    """High/low/range, volume, spread and pattern counts from the rollup tables."""
+    from aggregator.rollups import Rollups
+    with get_store() as store:
+        stats = Rollups(store).range_stats(datetime.fromisoformat(since),
+                                           datetime.fromisoformat(until))
+    if stats is None:
+        print("[ERROR] No rollups in range; run `forex-bot materialize` first")
+        raise typer.Exit(1)
+    for key, value in stats.items():
+        print(f"{key:>13}: {value:.5f}" if isinstance(value, float) else f"{key:>13}: {value}")
+
+@app.command()
+def migrate(
+    months_ahead: int = typer.Option(3, help="Monthly partitions to create beyond the current month."),
+    symbol: str = typer.Option('', help="Symbol to assign to rows copied from legacy tables."),
+    keep_legacy: bool = typer.Option(True, help="Keep <table>_legacy after copying its rows."),
+):
+    """Create or migrate to the month-partitioned Postgres schema for ticks and candles."""
+    from storage.schema import TICK_TABLE, migrate_table
+    from aggregator.materialize import candle_table
+    settings = load_config()
+    if not settings.storage.db_config:
+        print("[ERROR] migrate needs storage.db_config (Postgres)")
+        raise typer.Exit(1)
+    with get_store() as store:
+        tables = [(TICK_TABLE, 'ticks')]
+        intervals = sorted(set(DEFAULT_INTERVALS) | set(settings.aggregator.intervals))
+        tables += [(candle_table(i), 'candles') for i in intervals]
+        for table, kind in tables:
+            print(migrate_table(store.conn, table, kind, months_ahead, symbol, keep_legacy))
+
+@app.command("archive-ticks")
+def archive_ticks(
+    since: str = typer.Argument(..., help="ISO timestamp to export from."),
+    path: str = typer.Option(None, help="Archive root (default: storage.archive_path)."),
+    symbol: str = typer.Option('default', help="Symbol directory to write into."),
+):
+    """Copy pricesandvolume ticks into the columnar per-day archive."""
+    with get_store() as store:
+        archive = get_archive(path)
+        total = 0
+        # streamed in chunks, so arbitrarily long ranges export in constant memory
+        for chunk in store.fetch_ticks_iter(since, chunk_size=50_000):
+            archive.append_columns(symbol, chunk['timestamp'], chunk['bid'], chunk['ask'],
+                                   np.nan_to_num(chunk['volume']))
+            total += len(chunk['timestamp'])
+        if not total:
+            print("[ERROR] No ticks found since", since)
+            return
+        print(f"Archived {total} ticks under {archive.root}/{symbol}")
+
+@app.command("compact-archive")
+def compact_archive(
+    before: str = typer.Option(None, help="Compact days before this ISO date (default: today, UTC)."),
+    path: str = typer.Option(None, help="Archive root (default: storage.archive_path)."),
+    symbol: str = typer.Option('default', help="Symbol directory to compact."),
+    pip_scale: int = typer.Option(None, help="Pipettes per price unit (default: 1000 for JPY pairs, else 100000)."),
+):
+    """Re-encode closed archive days into compressed, delta-encoded tick files."""
+    archive = get_archive(path)
+    before = datetime.fromisoformat(before) if before else datetime.utcnow()
+    days, raw, compact = archive.compact(before, symbol, pip_scale)
+    if not days:
+        print(f"[INFO] Nothing to compact under {archive.root}/{symbol} before {before:%Y-%m-%d}")
+        return
+    print(f"Compacted {days} day(s) under {archive.root}/{symbol}: "
+          f"{raw / 1e6:,.1f} MB -> {compact / 1e6:,.1f} MB ({raw / max(compact, 1):.1f}x)")
+
+@app.command("sync-history")
+def sync_history(
+    days: int = typer.Option(30, help="How far back to check for missing bars."),
+    horizon: list[int] = typer.Option(None, help="Bar size in minutes (repeatable); "
+                                                  "default: 1/5/15 plus configured intervals."),
+    symbol: list[str] = typer.Option(None, help="Symbols to sync (default: collector.symbols)."),
+    dry_run: bool = typer.Option(False, help="Only report gaps, fetch nothing."),
+):
+    """Back-fill candle tables from the Saxo chart API, fetching only missing bars."""
+    from collector.chart_downloader import ChartDownloader
+    from collector.history_sync import HORIZONS, HistorySync
+    from collector.saxo import DEFAULT_TOKEN_FILE, uic_map
+    from aggregator.materialize import floor_time
+    settings = load_config()
+    cfg      = settings.collector
+    symbols  = symbol or list(cfg.symbols)
+    uics     = uic_map(symbols, getattr(cfg, 'uics', None) or {})
+    if not horizon:
+        seconds = set(DEFAULT_INTERVALS) | set(settings.aggregator.intervals)
+        horizon = sorted(s // 60 for s in seconds if s % 60 == 0 and s // 60 in HORIZONS)
+    with open(os.path.expanduser(getattr(cfg, 'token_file', DEFAULT_TOKEN_FILE))) as f:
+        token = f.read().strip()
+    cache_dir = getattr(settings.storage, 'chart_cache_dir', None) or 'data/chart_cache'
+    downloaders = {
+        s: ChartDownloader(token, uics[s], getattr(cfg, 'asset_type', 'FxSpot'), cache_dir=cache_dir)
+        for s in symbols
+    }
+    cache = CandleCache(getattr(settings.storage, 'candle_cache_dir', None) or 'data/candle_cache')
+    with get_store() as store:
+        job = HistorySync(store, downloaders, cache=cache)
+        now = datetime.utcnow()
+        for s in symbols:
+            for h in horizon:
+                end = floor_time(now, h * 60)          # the open bar is left to the collector
+                try:
+                    r = job.sync(s, h, end - timedelta(days=days), end, dry_run=dry_run)
+                except ValueError as e:
+                    print(f"[ERROR] {e}")
+                    raise typer.Exit(1)
+                missing = sum((b - a) // timedelta(minutes=h) for a, b in r['gaps'])
+                print(f"{s} {r['table']}: latest {r['latest']}, {len(r['gaps'])} gap(s) "
+                      f"<= {missing} bars, fetched {r['fetched']}, inserted {r['inserted']}")
+
+@app.command("gen-data")
+def gen_data(
+    fmt: str = typer.Argument(..., help="sqlite, postgres (storage.db_config), csv, capture or archive."),
+    out: str = typer.Option(None, help="Output file (sqlite, csv) or directory (capture, archive)."),
+    ticks: int = typer.Option(1_000_000, help="Number of ticks to generate."),
+    rate: float = typer.Option(10.0, help="Average ticks per second over open hours."),
+    start: str = typer.Option('2024-01-01T00:00:00', help="ISO timestamp of the first tick (UTC)."),
+    symbol: str = typer.Option('EURUSD', help="Symbol of the generated ticks."),
+    price: float = typer.Option(1.1, help="Starting mid price."),
+    volatility: float = typer.Option(0.08, help="Annualized volatility of the mid."),
+    jumps: float = typer.Option(0.0, help="Expected price jumps per day (0: plain GBM)."),
+    jump_size: float = typer.Option(0.002, help="Standard deviation of a log jump."),
+    spread: float = typer.Option(0.00008, help="Mean bid/ask spread."),
+    decimals: int = typer.Option(5, help="Price decimals (3 for JPY pairs)."),
+    weekends: bool = typer.Option(False, help="Keep ticking through the FX weekend close."),
+    seed: int = typer.Option(None, help="Random seed, for reproducible streams."),
+    chunk_size: int = typer.Option(1_000_000, help="Ticks generated and written per step."),
+):
+    """Generate a synthetic FX tick stream for load tests and offline backtests."""
+    from collector.synthetic import FORMATS, SyntheticTicks, write_ticks
+    if fmt not in FORMATS:
+        print(f"[ERROR] Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        raise typer.Exit(1)
+    store = None
+    if fmt == 'postgres':
+        if not load_config().storage.db_config:
+            print("[ERROR] postgres output needs storage.db_config")
+            raise typer.Exit(1)
+        store = get_store()
+    elif not out:
+        print(f"[ERROR] {fmt} output needs --out")
+        raise typer.Exit(1)
+    gen = SyntheticTicks(symbol, datetime.fromisoformat(start), price, rate, volatility,
+                         jump_intensity=jumps, jump_size=jump_size, spread=spread,
+                         decimals=decimals, weekends=weekends, seed=seed)
+
+    def progress(n, elapsed):
+        print(f"[INFO] {n:,}/{ticks:,} ticks, {n / max(elapsed, 1e-9):,.0f}/s")
+
+    try:
+        total = write_ticks(gen.chunks(ticks, chunk_size), fmt, out, store, progress)
+    finally:
+        if store is not None:
+            store.close()
+    print(f"Wrote {total:,} {symbol} ticks to {out or 'postgres'}")
 
 @app.command()
-def backtest():
+def backtest(
+    profile: str = typer.Option(None, help="Run under a profiler: 'cprofile' (deterministic) or 'sample'."),
+    profile_out: str = typer.Option('profiles/backtest', help="Output path prefix for .folded/.txt/.prof."),
+    profile_top: int = typer.Option(25, help="Functions listed in the profile summary."),
+):
     """Run the original trading_logic_test backtester against Postgres candles."""
     from backtest.trading_logic_test import backtest as run_legacy
-    run_legacy()
+    if profile:
+        from backtest.profiling import profile_call
+        profile_call(run_legacy, mode=profile, output=profile_out, top=profile_top)
+    else:
+        run_legacy()
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,360 @@
+# app/pipeline.py
+
+"""
+Staged tick pipeline for `collect`.
+
+The feed callback only hands each tick to the pipeline (ingest), which
+fans it out to two independent chains of stages:
+
+    ingest -> persist                                  (store.insert_ticks)
+    ingest -> aggregate -> strategy -> execute         (candles, signal, order)
+
+Every stage is a thread reading a bounded queue, so a slow stage only
+backs up its own queue: a slow database commit fills the persist queue
+but never delays aggregation or signal generation. The persist stage
+group-commits whatever has queued up (up to batch_size) in one
+insert_ticks call. What a full queue does follows the TickQueue policies
+(block, drop_oldest, drop_newest); persist defaults to a large blocking
+queue, so nothing is lost unless the database stays behind for long.
+
+The feed runs on an asyncio loop, so it hands ticks over with submit_async():
+a full blocking queue is waited on in an executor thread rather than on the
+loop, which keeps reading the stream. close() waits for durable stages
+(persist) without a deadline, so ticks already queued for the database are
+committed (or spilled) before collect exits; the other stages get `timeout`.
+
+Stage metrics (queue depth and high-water mark, throughput, busy share,
+drops, errors) are available from Pipeline.stats() and are printed every
+report_interval seconds, and written to stats_file for `forex-bot stats`.
+With a LatencyRecorder (app.latency) the stages also stamp each traced tick
+and record per-step latency histograms.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from time import perf_counter_ns
+
+from aggregator.records import (
+    TRACE_AGGREGATE, TRACE_AGGREGATED, TRACE_INDICATORS, TRACE_INDICATORS_DONE,
+    TRACE_ORDER, TRACE_RECEIVE, TRACE_SIGNAL, TRACE_SLOTS, Tick,
+)
+from app.latency import write_stats
+from collector.router import ShardedRouter, print_signal, tick_symbol
+from collector.tick_queue import POLICIES
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name, fn, maxsize=10_000, policy='block', batch_size=1, durable=False):
+        """
+        `fn` gets one item (or a list of up to batch_size items when
+        batch_size > 1) and returns the item for the next stages, or None.
+        A durable stage is drained completely by Pipeline.close().
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}; expected one of {POLICIES}")
+        self.name = name
+        self.fn = fn
+        self.policy = policy
+        self.batch_size = batch_size
+        self.durable = durable
+        self.outputs = []
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.stalls = 0           # offers that found a blocking queue full
+        self.high_water = 0
+        self.busy = 0.0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name=f'stage-{name}', daemon=True)
+        self._warned = False
+        self._last = (time.monotonic(), 0, 0.0)
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, item):
+        """Queue an item according to the policy. Returns False if an item was dropped."""
+        q = self._queue
+        if self.policy == 'block':
+            q.put(item)
+        else:
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                self._drop()
+                if self.policy == 'drop_newest':
+                    return False
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                q.put(item)
+                return False
+        self._mark()
+        return True
+
+    def offer(self, item):
+        """
+        put() that never waits: False when a blocking queue is full, and the
+        item was not queued (the caller waits elsewhere, see submit_async).
+        """
+        if self.policy != 'block':
+            self.put(item)
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.stalls += 1
+            if self.stalls == 1:
+                print(f"[WARN] Stage {self.name} queue full: waiting off the event loop")
+            return False
+        self._mark()
+        return True
+
+    def _mark(self):
+        size = self._queue.qsize()
+        if size > self.high_water:
+            self.high_water = size
+
+    def _drop(self):
+        self.dropped += 1
+        if not self._warned:
+            self._warned = True
+            print(f"[WARN] Stage {self.name} queue full, policy {self.policy}: dropping items")
+
+    def stop(self):
+        self._queue.put(_STOP)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        get = self._queue.get
+        get_nowait = self._queue.get_nowait
+        while True:
+            item = get()
+            if item is _STOP:
+                break
+            if self.batch_size > 1:
+                batch = [item]
+                stop = False
+                while len(batch) < self.batch_size:
+                    try:
+                        more = get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is _STOP:
+                        stop = True
+                        break
+                    batch.append(more)
+                self._process(batch, len(batch))
+                if stop:
+                    break
+            else:
+                self._process(item, 1)
+        for stage in self.outputs:
+            stage.stop()
+
+    def _process(self, item, n):
+        t0 = time.perf_counter()
+        try:
+            out = self.fn(item)
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERROR] Stage {self.name} failed on {n} item(s): {e}")
+            out = None
+        self.busy += time.perf_counter() - t0
+        self.processed += n
+        if out is not None:
+            for stage in self.outputs:
+                stage.put(out)
+
+    def snapshot(self):
+        """Metrics since the previous snapshot (rate, busy share) and in total."""
+        now = time.monotonic()
+        t, processed, busy = self._last
+        elapsed = max(now - t, 1e-9)
+        self._last = (now, self.processed, self.busy)
+        return {
+            'stage': self.name,
+            'depth': self.depth,
+            'high_water': self.high_water,
+            'processed': self.processed,
+            'rate': (self.processed - processed) / elapsed,
+            'busy': (self.busy - busy) / elapsed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+class Pipeline:
+    def __init__(self, report_interval=None, latency=None, stats_file=None):
+        self.stages = []
+        self.sources = []
+        self.ingested = 0
+        self.report_interval = report_interval
+        self.latency = latency
+        self.stats_file = stats_file
+        self._stop = threading.Event()
+        self._reporter = None
+        self._last = (time.monotonic(), 0)
+
+    def stage(self, name, fn, after=None, **options):
+        """Add a stage fed by `after` (a Stage), or by ingest when after is None."""
+        stage = Stage(name, fn, **options)
+        (after.outputs if after is not None else self.sources).append(stage)
+        self.stages.append(stage)
+        return stage
+
+    def submit(self, item):
+        """Ingest: hand one item to every source stage."""
+        self._ingest(item)
+        for stage in self.sources:
+            stage.put(item)
+
+    async def submit_async(self, item):
+        """
+        submit() for a feed on an asyncio loop: never blocks the loop. A full
+        blocking queue is waited on in the default executor; awaiting it keeps
+        the ticks in order.
+        """
+        self._ingest(item)
+        for stage in self.sources:
+            if not stage.offer(item):
+                await asyncio.get_running_loop().run_in_executor(None, stage.put, item)
+
+    def _ingest(self, item):
+        self.ingested += 1
+        if self.latency is not None and type(item) is Tick and item.trace is None:
+            item.trace = [perf_counter_ns()] + [0] * (TRACE_SLOTS - 1)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        if self.report_interval:
+            self._reporter = threading.Thread(target=self._report_loop, name='pipeline-report',
+                                              daemon=True)
+            self._reporter.start()
+        return self
+
+    def close(self, timeout=30.0):
+        """
+        Drain every stage in order, then stop. Durable stages are waited for
+        without a deadline; the others get `timeout` seconds in all.
+        """
+        for stage in self.sources:
+            stage.stop()
+        deadline = time.monotonic() + timeout
+        for stage in self.stages:
+            if stage.durable:
+                stage.join()
+            else:
+                stage.join(max(0.0, deadline - time.monotonic()))
+        self._stop.set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        now = time.monotonic()
+        t, ingested = self._last
+        self._last = (now, self.ingested)
+        ingest = {'stage': 'ingest', 'depth': 0, 'high_water': 0, 'processed': self.ingested,
+                  'rate': (self.ingested - ingested) / max(now - t, 1e-9), 'busy': 0.0,
+                  'dropped': 0, 'errors': 0}
+        return [ingest] + [s.snapshot() for s in self.stages]
+
+    def report(self):
+        stats = self.stats()
+        for s in stats:
+            print(f"[pipeline] {s['stage']:<9} depth={s['depth']:<6} max={s['high_water']:<6} "
+                  f"rate={s['rate']:8.1f}/s busy={s['busy']:5.1%} "
+                  f"dropped={s['dropped']} errors={s['errors']}")
+        if self.latency is not None:
+            print(self.latency.report_line())
+        if self.stats_file:
+            try:
+                write_stats(self.stats_file, stats, self.latency)
+            except OSError as e:
+                print(f"[WARN] Could not write {self.stats_file}: {e}")
+
+    def _report_loop(self):
+        while not self._stop.wait(self.report_interval):
+            self.report()
+
+
+def collect_pipeline(store, router, on_signal=print_signal, queue_size=10_000,
+                     policy='block', persist_queue=1_000_000, persist_batch=1000,
+                     report_interval=None, latency=None, stats_file=None):
+    """
+    The `collect` pipeline. With an in-process SymbolRouter the aggregate,
+    strategy and execute steps are separate stages; a ShardedRouter already
+    runs them in its worker processes, so one route stage feeds the shards
+    (traces do not cross the process boundary; only persist is timed then).
+    """
+    pipeline = Pipeline(report_interval, latency, stats_file)
+    persist = store.insert_ticks
+    if latency is not None:
+        persist_hist = latency.histograms['persist']
+
+        def persist(ticks):
+            t0 = perf_counter_ns()
+            store.insert_ticks(ticks)
+            persist_hist.record(perf_counter_ns() - t0)
+
+    pipeline.stage('persist', persist, maxsize=persist_queue, batch_size=persist_batch,
+                   durable=True)
+    if isinstance(router, ShardedRouter):
+        pipeline.stage('route', router.route, maxsize=queue_size, policy=policy)
+        return pipeline
+
+    record = latency.record if latency is not None else None
+
+    def aggregate(tick):
+        trace = getattr(tick, 'trace', None)
+        if trace is not None:
+            trace[TRACE_AGGREGATE] = perf_counter_ns()
+        state = router.state(tick_symbol(tick))
+        update = state.aggregate(tick)
+        if trace is not None:
+            now = trace[TRACE_AGGREGATED] = perf_counter_ns()
+            record('queue', trace[TRACE_AGGREGATE] - trace[TRACE_RECEIVE])
+            record('aggregate', now - trace[TRACE_AGGREGATE])
+        return None if update is None else (state, tick, update)
+
+    def evaluate(item):
+        state, tick, update = item
+        signal = state.evaluate(tick, update)
+        trace = getattr(tick, 'trace', None)
+        if trace is not None:
+            now = trace[TRACE_SIGNAL] = perf_counter_ns()
+            if trace[TRACE_INDICATORS_DONE]:
+                record('indicators', trace[TRACE_INDICATORS_DONE] - trace[TRACE_INDICATORS])
+            record('strategy', now - trace[TRACE_AGGREGATED])
+            record('tick_to_signal', now - trace[TRACE_RECEIVE])
+        # a bar correction alone yields no signal; like SymbolRouter.route, nothing to execute
+        return None if signal is None else (state.symbol, tick, signal)
+
+    def execute(item):
+        on_signal(*item)
+        trace = getattr(item[1], 'trace', None)
+        if trace is not None:
+            now = trace[TRACE_ORDER] = perf_counter_ns()
+            record('order', now - trace[TRACE_SIGNAL])
+            record('tick_to_order', now - trace[TRACE_RECEIVE])
+
+    agg = pipeline.stage('aggregate', aggregate, maxsize=queue_size, policy=policy)
+    strat = pipeline.stage('strategy', evaluate, after=agg, maxsize=queue_size, policy=policy)
+    pipeline.stage('execute', execute, after=strat, maxsize=queue_size, policy=policy)
+    return pipeline
@@ -6,13 +6,14 @@ multi-timeframe candles using the aggregator, then evaluates pattern
 signals on the fly.
 """
 
-import psycopg2
 import yaml
 from datetime import datetime
 
 from storage.indicators import load_candle_table
+from storage.pool import get_manager
 from aggregator.candles import process_tick, truncate_timestamp
 from strategy.indicators import detect_five_candle_pattern
+from backtest.profiling import main_with_profile
 
 
 def load_yaml_config(path):
@@ -76,11 +77,12 @@ def main():
     start_time = datetime.fromisoformat(config['start'])
     end_time = datetime.fromisoformat(config['end'])
 
-    # Connect to Postgres and load last 5 completed candles
-    conn = psycopg2.connect(**db_conn_info)
-    recent_1m_candles  = load_candle_table(conn, "candles_m1",  limit=5)
-    recent_5m_candles  = load_candle_table(conn, "candles_m5",  limit=5)
-    recent_15m_candles = load_candle_table(conn, "candles_m15", limit=5)
+    # Load last 5 completed candles and the tick window over a pooled connection
+    with get_manager(db_conn_info).connection() as conn:
+        recent_1m_candles  = load_candle_table(conn, "candles_m1",  limit=5)
+        recent_5m_candles  = load_candle_table(conn, "candles_m5",  limit=5)
+        recent_15m_candles = load_candle_table(conn, "candles_m15", limit=5)
+        ticks = fetch_ticks(conn, start_time, end_time)
 
     # Prepare in-memory candle builders
     builder_1m  = make_candle_builder(1)
@@ -91,8 +93,6 @@ def main():
     last_bucket_by_interval      = {1: None, 5: None, 15: None}
     last_state_by_interval       = {1: None, 5: None, 15: None}
 
-    # Fetch ticks from the database
-    ticks = fetch_ticks(conn, start_time, end_time)
     if not ticks:
         print("[ERROR] No ticks found in the specified window.")
         return
@@ -149,8 +149,7 @@ def main():
 #            f"S15={S15:.2f},E15={E15:.2f},F15={F15:.2f}"
 #        )
 
-    conn.close()
 
 if __name__ == '__main__':
-    main()
-
+    # --profile [cprofile|sample] runs main() under backtest.profiling
+    main_with_profile(main)
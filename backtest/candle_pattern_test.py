@@ -2,10 +2,9 @@
 # backtest/candle_pattern_report.py
 import os
 import yaml
-import requests
-from datetime import datetime, timezone, timedelta
-import psycopg2
+from datetime import datetime
 from zoneinfo import ZoneInfo
+from collector.chart_downloader import ChartDownloader
 from analytics.candles import (
     detect_candle_pattern,
     detect_multi_candle_pattern,
@@ -39,7 +38,6 @@ def load_yaml_config(path):
 cfg = yaml.safe_load(open(os.path.expanduser('~/mytrader/config/config.yaml')))
 TOKEN_FILE = os.path.expanduser('~/trader/tok.txt')
 API_URL    = 'https://gateway.saxobank.com/sim/openapi/chart/v3/charts'
-MAX_COUNT  = 1200000
 
 def _load_token():
     if not os.path.exists(TOKEN_FILE):
@@ -65,87 +63,26 @@ def fetch_candles(
         close:     float,
         volume:    float|None
       }
-    Automatically pages (max 1200 bars/call) and adapts to FX vs non-FX fields.
+    Pages are fetched concurrently and cached on disk (see ChartDownloader),
+    so re-running over the same window does not hit the API again.
     """
-    token      = _load_token()
-    uic        = cfg['uic']
-    asset_type = cfg.get('asset_type', 'FxSpot')
-
-    # how many bars we need
-    total_bars = int((end_time - start_time).total_seconds() / (60 * horizon))
-    remaining  = total_bars
-    current    = start_time
-
-    headers = {
-        'Authorization': f'Bearer {token}',
-        'Accept':        'application/json',
-    }
-
-    candles = []
-    while remaining > 0:
-        cnt = min(remaining, MAX_COUNT)
-        params = {
-            'Uic':                 uic,
-            'AssetType':           asset_type,
-            'Horizon':             horizon,
-            'Count':               cnt,
-            'Mode':                'From',             # page forward
-            'Time':                current.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'ChartSampleFieldSet': 'LastTraded',       # get Volume & Interest
-        }
-
-        r = requests.get(API_URL, params=params, headers=headers)
-        r.raise_for_status()
-        batch = r.json().get('Data', [])
-        if not batch:
-            break
-
-        for b in batch:
-            # parse the ISO string into a datetime
-            ts = datetime.strptime(
-                b['Time'],
-                '%Y-%m-%dT%H:%M:%S.%fZ'
-            ).replace(tzinfo=timezone.utc)
-
-            # for FX you'll get OpenBid/HighBid/etc, for non-FX you'll get Open/High/Low/Close
-            open_  = b.get('Open',  b.get('OpenBid'))
-            high   = b.get('High',  b.get('HighBid'))
-            low    = b.get('Low',   b.get('LowBid'))
-            close  = b.get('Close', b.get('CloseBid'))
-            volume = b.get('Volume')   # FX will return None
-
-            candles.append({
-                'timestamp': ts,
-                'open':      open_,
-                'high':      high,
-                'low':       low,
-                'close':     close,
-                'volume':    volume,
-            })
-
-        # advance to just after the last bar
-        last = batch[-1]['Time']
-        dt   = datetime.strptime(last, '%Y-%m-%dT%H:%M:%S.%fZ')\
-                      .replace(tzinfo=timezone.utc)
-        current   = dt + timedelta(minutes=horizon)
-        remaining -= len(batch)
-
-    return candles
+    downloader = ChartDownloader(
+        _load_token(), cfg['uic'], cfg.get('asset_type', 'FxSpot'), api_url=API_URL
+    )
+    return downloader.candles(start_time, end_time, horizon)
 
 def main():
-    # 1) Load config window & DB
+    # 1) Load config window
     conf = load_yaml_config('config/config.yaml')['backtest']
     start_time = datetime.fromisoformat(conf['start'])
     end_time   = datetime.fromisoformat(conf['end'])
-    db_info = load_yaml_config('config/db.secret.yaml')
 
-    # 2) Fetch 5m candles series
-    conn = psycopg2.connect(**db_info)
-    #series_5m = fetch_candles(conn, 'candles_m5', start_time, end_time)
+    # 2) Fetch 5m candles series (from the chart API; no DB connection needed)
+    #with get_manager(load_yaml_config('config/db.secret.yaml')).connection() as conn:
+    #    series_5m = fetch_candles(conn, 'candles_m5', start_time, end_time)
     series_5m = fetch_candles( start_time, end_time, horizon=5)
     if not series_5m:
         print("[ERROR] No 5m candles in window")
-        conn.close()
         return
 
     # 3) Iterate
@@ -172,7 +109,6 @@ def main():
         f"F5={F5:+.2f}"
         )
 
-    conn.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,355 @@
+# backtest/profiling.py
+
+"""
+Profiling mode for backtests and replays.
+
+    profile_call(fn, mode='cprofile' | 'sample', output='profiles/backtest')
+
+runs a job under a profiler and writes:
+
+    <output>.folded   folded stacks ("a;b;c <weight>"), the input format of
+                      flamegraph.pl, speedscope and inferno
+    <output>.txt      top-N functions by self and total time, plus the
+                      numba and database breakdown (also printed)
+    <output>.prof     pstats dump (cprofile mode), for snakeviz/gprof2dot
+
+'cprofile' is deterministic (every call counted, main thread only, with
+noticeable overhead). Its folded stacks are reconstructed from the
+caller/callee graph, splitting each function's time over its callers in
+proportion. 'sample' captures the real stacks of all threads every
+`interval` seconds with close to no overhead; weights are sample counts.
+
+Numba-compiled functions are C calls invisible to both profilers, so while
+profiling every numba dispatcher found in the project's modules is timed
+(see NumbaTimer): calls, run time and JIT compile time are reported per
+function. Database time is the time spent in cursor execute/fetch/copy
+calls of sqlite3 and psycopg2 (cprofile), or the samples whose innermost
+frame is on such a call (sample).
+"""
+
+import argparse
+import cProfile
+import io
+import linecache
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+PROJECT_PACKAGES = ('strategy', 'aggregator', 'analytics', 'backtest', 'storage', 'collector')
+_DB_CALL = re.compile(r"\.(execute|executemany|fetch\w*|copy_\w*|mogrify)\s*\(")
+_DB_BUILTIN = re.compile(
+    r"method '(execute|executemany|fetch\w*|copy_\w*)' of '(sqlite3|psycopg2)[\w.]*"
+)
+_DB_MODULE = re.compile(r"[/\\](psycopg2|sqlite3)[/\\]")
+
+
+# ---------------------------------------------------------------- numba
+_timed_classes = {}
+
+
+def _timed_class(cls):
+    """Subclass of a dispatcher class whose __call__ reports to the dispatcher's NumbaTimer."""
+    timed = _timed_classes.get(cls)
+    if timed is None:
+        def __call__(self, *args, **kwargs):
+            dispatcher = self                         # read by Sampler
+            timer, name = dispatcher._profile_timer
+            compiled = len(dispatcher.signatures)
+            t0 = time.perf_counter()
+            try:
+                return cls.__call__(dispatcher, *args, **kwargs)
+            finally:
+                timer._record(name, time.perf_counter() - t0,
+                              len(dispatcher.signatures) > compiled)
+        timed = _timed_classes[cls] = type(cls.__name__, (cls,), {'__call__': __call__})
+    return timed
+
+
+class NumbaTimer:
+    """
+    Times the numba dispatchers found in project modules. Module attributes
+    are left alone: each dispatcher object gets a timing subclass as its
+    class while the timer is active, so jitted code compiled meanwhile
+    still resolves its callees as dispatchers (a plain wrapper function in
+    the module globals would fail numba's typing).
+    """
+
+    def __init__(self, packages=PROJECT_PACKAGES):
+        self.packages = packages
+        self.calls = Counter()
+        self.seconds = defaultdict(float)
+        self.compile_seconds = defaultdict(float)
+        self._lock = threading.Lock()
+        self._patched = []
+
+    @staticmethod
+    def is_dispatcher(obj):
+        return type(obj).__module__.startswith('numba') and hasattr(obj, 'py_func')
+
+    def _record(self, name, seconds, compiled):
+        with self._lock:
+            self.calls[name] += 1
+            if compiled:
+                self.compile_seconds[name] += seconds
+            else:
+                self.seconds[name] += seconds
+
+    def __enter__(self):
+        seen = set()
+        for mod_name, module in list(sys.modules.items()):
+            if module is None or mod_name.split('.')[0] not in self.packages:
+                continue
+            for obj in list(vars(module).values()):
+                if id(obj) in seen or not self.is_dispatcher(obj):
+                    continue
+                seen.add(id(obj))
+                name = f"{obj.py_func.__module__}.{obj.py_func.__name__}"
+                cls = type(obj)
+                obj._profile_timer = (self, name)
+                obj.__class__ = _timed_class(cls)
+                self._patched.append((obj, cls))
+        return self
+
+    def __exit__(self, *exc):
+        for obj, cls in reversed(self._patched):
+            obj.__class__ = cls
+            del obj._profile_timer
+        self._patched = []
+
+    def report(self):
+        names = sorted(self.calls, key=lambda n: -(self.seconds[n] + self.compile_seconds[n]))
+        if not names:
+            return ["numba: no compiled functions called"]
+        lines = [f"{'numba function':<50}{'calls':>10}{'run s':>10}{'compile s':>11}"]
+        for n in names:
+            lines.append(f"{n:<50}{self.calls[n]:>10}{self.seconds[n]:>10.3f}"
+                         f"{self.compile_seconds[n]:>11.3f}")
+        return lines
+
+
+# ---------------------------------------------------------------- sampling
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_db_line(frame):
+    if _DB_MODULE.search(frame.f_code.co_filename):
+        return True
+    if frame.f_lineno is None:
+        # numba's generated code (ir.py frames among others) has no line
+        return False
+    line = linecache.getline(frame.f_code.co_filename, frame.f_lineno)
+    return bool(_DB_CALL.search(line))
+
+
+class Sampler:
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.db_samples = 0
+        self.numba_samples = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        db_cache = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                try:
+                    self._sample(ident, frame, names, db_cache)
+                except Exception as e:
+                    # one odd frame must not end the sampler (and cut the profile short)
+                    self.errors += 1
+                    if self.errors == 1:
+                        print(f"[WARN] Profile sampler skipped a frame: {e!r}")
+
+    def _sample(self, ident, frame, names, db_cache):
+        key = (frame.f_code, frame.f_lineno)
+        is_db = db_cache.get(key)
+        if is_db is None:
+            is_db = db_cache[key] = _is_db_line(frame)
+        stack = []
+        in_numba = False
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == '__call__' and code.co_filename == __file__:
+                in_numba = True
+                fn = frame.f_locals.get('dispatcher')
+                stack.append(f"{getattr(getattr(fn, 'py_func', None), '__name__', '?')} [numba]")
+            else:
+                stack.append(_frame_label(code))
+            frame = frame.f_back
+        stack.append(names.get(ident, f'thread-{ident}'))
+        self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+        self.db_samples += is_db
+        self.numba_samples += in_numba
+
+    def folded(self):
+        return [f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common()]
+
+    def top(self, n):
+        if not self.samples:
+            return ["no samples (job shorter than the sampling interval?)"]
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        lines = [f"{'self %':>7}{'total %':>9}  function"]
+        for label, count in own.most_common(n):
+            lines.append(f"{100 * count / self.samples:>7.1f}{100 * total[label] / self.samples:>9.1f}"
+                         f"  {label}")
+        return lines
+
+
+# ---------------------------------------------------------------- cProfile
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name.strip('<>{}')
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def folded_from_stats(stats, max_depth=64):
+    """
+    Approximate folded stacks (weights in microseconds) from a pstats.Stats
+    call graph: a function's self time is split over the call paths leading
+    to it in proportion to the time each caller spent in it.
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+    roots = [f for f, e in entries.items() if not e[4]]
+    out = Counter()
+
+    def walk(func, path, share):
+        _, _, tt, ct, _ = entries[func]
+        path = path + (_label(func),)
+        if tt * share > 0:
+            out[path] += tt * share
+        if len(path) >= max_depth or ct * share < 1e-6:
+            return
+        for child, edge_ct in children.get(func, ()):
+            child_ct = entries[child][3]
+            if child_ct <= 0 or _label(child) in path:
+                continue                      # recursion: already on this path
+            walk(child, path, share * min(1.0, edge_ct / child_ct))
+
+    for root in roots:
+        walk(root, (), 1.0)
+    return [f"{';'.join(p)} {int(w * 1e6)}" for p, w in out.most_common() if int(w * 1e6) > 0]
+
+
+def db_seconds(stats):
+    """Time in sqlite3/psycopg2 cursor calls, from a pstats.Stats."""
+    total = 0.0
+    for (filename, _, name), (_, _, tt, ct, _) in stats.stats.items():
+        if filename == '~' and _DB_BUILTIN.search(name):
+            total += tt
+    return total
+
+
+# ---------------------------------------------------------------- entry point
+def profile_call(fn, *args, mode='cprofile', output='profiles/profile', top=25,
+                 interval=0.001, **kwargs):
+    """Run fn(*args, **kwargs) under the profiler, write the reports and return fn's result."""
+    if mode not in ('cprofile', 'sample'):
+        raise ValueError(f"Unknown profile mode {mode!r}; expected 'cprofile' or 'sample'")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    numba = NumbaTimer()
+    profiler = cProfile.Profile() if mode == 'cprofile' else Sampler(interval)
+    t0 = time.perf_counter()
+    with numba:
+        if mode == 'cprofile':
+            profiler.enable()
+        else:
+            profiler.start()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+    wall = time.perf_counter() - t0
+
+    lines = [f"{getattr(fn, '__qualname__', fn)}: {wall:.3f}s wall, mode {mode}", '']
+    if mode == 'cprofile':
+        profiler.dump_stats(output + '.prof')
+        stats = pstats.Stats(profiler)
+        folded = folded_from_stats(stats)
+        for key in ('tottime', 'cumulative'):
+            buf = io.StringIO()
+            pstats.Stats(profiler, stream=buf).sort_stats(key).print_stats(top)
+            lines.append(f"--- top {top} by {key} ---")
+            lines.extend(l for l in buf.getvalue().splitlines()[4:] if l.strip())
+            lines.append('')
+        db = db_seconds(stats)
+    else:
+        folded = profiler.folded()
+        lines.append(f"--- top {top} by self samples ({profiler.samples} samples) ---")
+        lines.extend(profiler.top(top))
+        lines.append('')
+        db = wall * profiler.db_samples / max(profiler.samples, 1)
+
+    numba_run = sum(numba.seconds.values())
+    numba_compile = sum(numba.compile_seconds.values())
+    lines.append("--- breakdown ---")
+    lines.append(f"database   {db:10.3f}s  {100 * db / wall if wall else 0:5.1f}%")
+    lines.append(f"numba run  {numba_run:10.3f}s  (summed over threads)")
+    lines.append(f"numba JIT  {numba_compile:10.3f}s")
+    if mode == 'sample' and profiler.samples:
+        lines.append(f"numba samples {100 * profiler.numba_samples / profiler.samples:.1f}% "
+                     f"of all thread samples")
+    lines.append('')
+    lines.extend(numba.report())
+
+    with open(output + '.folded', 'w') as f:
+        f.write('\n'.join(folded) + '\n')
+    with open(output + '.txt', 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    print('\n'.join(lines))
+    print(f"[INFO] Profile written to {output}.folded / {output}.txt"
+          + (f" / {output}.prof" if mode == 'cprofile' else ''))
+    return result
+
+
+def main_with_profile(main, default_output=None):
+    """
+    `python -m backtest.<script> [--profile [cprofile|sample]] [--profile-out PATH]
+    [--profile-top N]`: run a script's main() directly or under profile_call.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=('cprofile', 'sample'))
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    parser.add_argument('--profile-out', default=default_output or f"profiles/{script}")
+    parser.add_argument('--profile-top', type=int, default=25)
+    args = parser.parse_args()
+    if not args.profile:
+        return main()
+    return profile_call(main, mode=args.profile, output=args.profile_out, top=args.profile_top)
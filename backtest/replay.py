@@ -1,20 +1,37 @@
 from storage.store import SqliteStore
+from aggregator.records import Tick
 from aggregator.candle_builder import MultiIntervalCandleBuilder
+from collector.capture import CaptureReader
 from strategy.strategies import RsiStrategy
 from config.loader import load_config
 
-def run_backtest():
+
+def replay_capture(directory, on_tick, since=None, until=None, symbol=None):
+    """Feed the ticks of a capture log (collector.capture) to on_tick; returns the count."""
+    n = 0
+    for tick in CaptureReader(directory).ticks(since, until, symbol):
+        on_tick(tick)
+        n += 1
+    return n
+
+
+def run_backtest(capture=None):
     settings = load_config()
-    store = SqliteStore(settings.storage.database)
     builder = MultiIntervalCandleBuilder(settings.aggregator.intervals)
     strategy = RsiStrategy(settings.strategy.rsi_period)
-    ticks = store.fetch_ticks(settings.backtest.start)
     history = []
 
-    for ts, bid, ask, volume in ticks:
-        tick = {'timestamp': ts, 'bid': bid, 'ask': ask, 'volume': volume}
+    def on_tick(tick):
         candles = builder.add_tick(tick)
         if candles.get(60):
             history.append(candles[60])
         signal = strategy.generate_signal(history, tick)
-        print(f"{ts}: {signal}")
+        print(f"{tick.timestamp}: {signal}")
+
+    if capture:
+        # exact production session, no database needed
+        replay_capture(capture, on_tick, since=settings.backtest.start)
+        return
+    store = SqliteStore(settings.storage.database)
+    for ts, bid, ask, volume in store.fetch_ticks(settings.backtest.start):
+        on_tick(Tick(ts, None, bid, ask, volume))
@@ -1,9 +1,11 @@
-import psycopg2
 import numpy as np
 from datetime import datetime, timedelta
 from config.loader import load_config
 from strategy.indicators import evaluate_indicators
 from strategy.strategies import ParametrizedStrategy
+from storage.indicators import CandleColumns
+from storage.candle_cache import CandleCache
+from storage.pool import get_manager
 
 # Load secrets + strategy config
 settings  = load_config()
@@ -14,38 +16,29 @@ strat_cfg = settings.strategy
 MIN_PROFIT_PIPS  = strat_cfg.min_profit_pips
 MIN_HOLD_SECONDS = strat_cfg.min_hold_seconds
 
-def load_candle_table(table):
-    with psycopg2.connect(**DB_CFG) as conn:
-        with conn.cursor() as cur:
-            cur.execute(f"""
-                SELECT timestamp, open, high, low, close, volume
-                FROM {table}
-                ORDER BY timestamp ASC
-            """)
-            return [
-                {
-                    "time":   row[0],
-                    "open":   float(row[1]),
-                    "high":   float(row[2]),
-                    "low":    float(row[3]),
-                    "close":  float(row[4]),
-                    "volume": float(row[5])
-                }
-                for row in cur.fetchall()
-            ]
-
-def backtest():
-    candles_1m  = load_candle_table("candles_m1")
-    candles_5m  = load_candle_table("candles_m5")
-    candles_15m = load_candle_table("candles_m15")
+# repeated runs only fetch candles newer than what is already cached
+CANDLE_CACHE = CandleCache(getattr(settings.storage, 'candle_cache_dir', None) or 'data/candle_cache')
 
-    if not candles_1m:
-        print("[ERROR] No 1-minute candles found.")
-        return
-
-    prices     = [c["close"] for c in candles_1m]
-    volumes    = [c["volume"] for c in candles_1m]
-    timestamps = [c["time"]   for c in candles_1m]
+def load_candle_table(table):
+    with get_manager().connection() as conn:
+        return CANDLE_CACHE.get(conn, table)
+
+def simulate(cols_1m, cols_5m, cols_15m):
+    """
+    Run the trading loop over columnar candles (see load_candle_columns).
+    Returns (trade_logs, stats).
+    """
+    candles_1m  = CandleColumns(cols_1m)
+    candles_5m  = CandleColumns(cols_5m)
+    candles_15m = CandleColumns(cols_15m)
+
+    prices     = cols_1m["close"]
+    volumes    = cols_1m["volume"]
+    timestamps = cols_1m["time"].tolist()
+    # number of 5m/15m candles with time <= each 1m candle, instead of
+    # rescanning both lists on every step
+    n5m  = np.searchsorted(cols_5m["time"],  cols_1m["time"], side="right")
+    n15m = np.searchsorted(cols_15m["time"], cols_1m["time"], side="right")
 
     position        = None
     pnl             = 0
@@ -58,13 +51,13 @@ def backtest():
 
     for i in range(len(prices)):
         now   = timestamps[i]
-        price = prices[i]
+        price = float(prices[i])
 
         price_buf = prices[:i+1]
         vol_buf   = volumes[:i+1]
         c1m_buf   = candles_1m[:i+1]
-        c5m_buf   = [c for c in candles_5m  if c["time"]  <= now]
-        c15m_buf  = [c for c in candles_15m if c["time"] <= now]
+        c5m_buf   = candles_5m[:n5m[i]]
+        c15m_buf  = candles_15m[:n15m[i]]
 
 
         vals   = evaluate_indicators(
@@ -77,7 +70,7 @@ def backtest():
 
         action = strategy.generate_signal(
             history_1m   = c1m_buf,
-            tick         = { 'timestamp': now, 'bid': price, 'ask': price, 'volume': vol_buf[-1] },
+            tick         = { 'timestamp': now, 'bid': price, 'ask': price, 'volume': float(vol_buf[-1]) },
             candles_5m   = c5m_buf,
             candles_15m  = c15m_buf,
         )
@@ -122,8 +115,28 @@ def backtest():
                     trade_logs.append((now,"OPEN",action.upper(),price,None,*vals))
                     print(f"{now} OPEN {action} @ {price:.5f}")
 
+    stats = {
+        "pnl": pnl,
+        "trades": total_trades,
+        "wins": win_trades,
+        "losses": loss_trades,
+        "hold_time": total_hold_time,
+    }
+    return trade_logs, stats
+
+def backtest():
+    cols_1m  = load_candle_table("candles_m1")
+    cols_5m  = load_candle_table("candles_m5")
+    cols_15m = load_candle_table("candles_m15")
+
+    if not len(cols_1m["close"]):
+        print("[ERROR] No 1-minute candles found.")
+        return
+
+    trade_logs, stats = simulate(cols_1m, cols_5m, cols_15m)
+
     # write to trade_signals
-    with psycopg2.connect(**DB_CFG) as conn:
+    with get_manager().connection() as conn:
         with conn.cursor() as cur:
             cur.execute("DELETE FROM trade_signals")
             cur.executemany(
@@ -138,12 +151,13 @@ def backtest():
             )
 
     # summary
+    total_trades = stats["trades"]
     print("\n=== BACKTEST COMPLETE ===")
-    print(f"Total PnL: {pnl:.2f}")
-    print(f"Trades: {total_trades} (Wins: {win_trades}, Losses: {loss_trades})")
+    print(f"Total PnL: {stats['pnl']:.2f}")
+    print(f"Trades: {total_trades} (Wins: {stats['wins']}, Losses: {stats['losses']})")
     if total_trades:
-        print(f"Win Rate: {100*win_trades/total_trades:.1f}%")
-        print(f"Avg Hold Time: {total_hold_time/total_trades:.1f}s")
+        print(f"Win Rate: {100*stats['wins']/total_trades:.1f}%")
+        print(f"Avg Hold Time: {stats['hold_time']/total_trades:.1f}s")
 
 if __name__ == "__main__":
     backtest()
@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+
+"""
+Performance benchmarks (see benchmarks.runner; run with `python -m benchmarks`).
+"""
@@ -0,0 +1,53 @@
+# benchmarks/__main__.py
+
+"""
+    python -m benchmarks run [-k PATTERN] [--sizes 10000,100000] [--max-size N] [-o results.json]
+    python -m benchmarks compare BASE.json NEW.json [--threshold 0.1] [--stat median]
+
+compare exits with status 1 when any benchmark regressed, failed or went missing.
+"""
+
+import argparse
+import sys
+
+from benchmarks.runner import FAILED, compare, load, print_comparison, run, save
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_run = sub.add_parser('run', help="Run the benchmarks and write JSON results.")
+    p_run.add_argument('-k', '--filter', help="Only benchmarks whose name contains this.")
+    p_run.add_argument('--sizes', help="Comma-separated sizes to run (default: all).")
+    p_run.add_argument('--max-size', type=int, help="Skip sizes above this.")
+    p_run.add_argument('-o', '--output', default='data/benchmarks/results.json')
+
+    p_cmp = sub.add_parser('compare', help="Compare two result files and flag regressions.")
+    p_cmp.add_argument('base')
+    p_cmp.add_argument('new')
+    p_cmp.add_argument('--threshold', type=float, default=0.10,
+                       help="Relative slowdown that counts as a regression (default 0.10).")
+    p_cmp.add_argument('--stat', default='median', choices=('min', 'median', 'mean'))
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        sizes = {int(s) for s in args.sizes.split(',')} if args.sizes else None
+        data = run(args.filter, sizes, args.max_size)
+        save(data, args.output)
+        print(f"[INFO] {len(data['results'])} results written to {args.output}")
+        return 0
+
+    rows = compare(load(args.base), load(args.new), args.threshold, args.stat)
+    print_comparison(rows)
+    regressions = sum(r[4] == 'REGRESSION' for r in rows)
+    broken = sum(r[4] in ('ERROR', 'MISSING') for r in rows)
+    if regressions:
+        print(f"[WARN] {regressions} regression(s) above {args.threshold:.0%}")
+    if broken:
+        print(f"[WARN] {broken} benchmark(s) failed or missing in {args.new}")
+    return 1 if any(r[4] in FAILED for r in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# benchmarks/data.py
+
+"""
+Deterministic synthetic inputs for the benchmarks, from collector.synthetic.
+"""
+
+import numpy as np
+
+from collector.synthetic import SyntheticTicks
+
+START = np.datetime64('2024-01-01T00:00:00', 'us')
+
+
+def prices(n, seed=0, start=1.1):
+    """Mid prices about a minute apart (one close per 1m bar)."""
+    c = SyntheticTicks(price=start, rate=1 / 60, weekends=True, seed=seed).chunk(n)
+    return (c['bid'] + c['ask']) / 2
+
+
+def candle_columns(n, interval_seconds=60, seed=0):
+    """load_candle_columns()-style OHLCV columns with `n` bars."""
+    rng = np.random.default_rng(seed)
+    close = prices(n, seed)
+    open_ = np.r_[close[0], close[:-1]]
+    wick = np.abs(rng.normal(0.0, 5e-5, (2, n)))
+    return {
+        'time': START + np.arange(n) * np.timedelta64(interval_seconds, 's'),
+        'open': open_,
+        'high': np.maximum(open_, close) + wick[0],
+        'low': np.minimum(open_, close) - wick[1],
+        'close': close,
+        'volume': rng.integers(1, 100, n).astype(np.float64),
+    }
+
+
+def candles(n, seed=0):
+    """The same bars as a list of candle dicts."""
+    cols = candle_columns(n, seed=seed)
+    return [
+        {'timestamp': t, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for t, o, h, l, c, v in zip(cols['time'].tolist(), cols['open'].tolist(),
+                                    cols['high'].tolist(), cols['low'].tolist(),
+                                    cols['close'].tolist(), cols['volume'].tolist())
+    ]
+
+
+def ticks(n, seed=0, symbol='EURUSD', rate=2.0):
+    """Tick objects with ISO timestamps, `rate` per second on average."""
+    return list(SyntheticTicks(symbol, rate=rate, seed=seed).ticks(n))
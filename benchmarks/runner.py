@@ -0,0 +1,185 @@
+# benchmarks/runner.py
+
+"""
+Minimal benchmark runner with JSON results and regression comparison.
+
+Benchmarks register themselves with @benchmark(sizes=...). For every size,
+`setup(size)` builds the inputs once (untimed) and returns the callable to
+time. The runner picks a loop count so one repeat takes at least
+`min_time` seconds (single calls for slow cases), runs `repeat` repeats
+and records per-call min/median/mean/stdev and the time per item
+(seconds / size). Setup or run failures (e.g. a missing optional
+dependency) are recorded as errors and do not stop the run.
+
+A results file is
+
+    {"meta": {machine, python, numpy, commit, time},
+     "results": {"<name>[<size>]": {name, size, number, repeat, min, median,
+                                    mean, stdev, per_item} | {name, size, error}}}
+
+and compare() flags every case whose statistic grew by more than the
+threshold between two such files, or that ran in the first but failed or
+is missing in the second.
+"""
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+SIZES = (10_000, 100_000, 1_000_000)
+REGISTRY = []
+
+
+class Benchmark:
+    def __init__(self, name, setup, sizes, repeat=5, min_time=0.2):
+        self.name = name
+        self.setup = setup
+        self.sizes = tuple(sizes)
+        self.repeat = repeat
+        self.min_time = min_time
+
+
+def benchmark(name=None, sizes=SIZES, repeat=5, min_time=0.2):
+    """Register `setup(size) -> callable` as a benchmark."""
+    def register(setup):
+        full = name or f"{setup.__module__.rsplit('.', 1)[-1]}.{setup.__name__}"
+        REGISTRY.append(Benchmark(full, setup, sizes, repeat, min_time))
+        return setup
+    return register
+
+
+def case_key(name, size):
+    return f"{name}[{size}]"
+
+
+def time_case(fn, repeat=5, min_time=0.2, max_number=1_000_000):
+    """(number, [seconds per call for each repeat]) for a zero-argument callable."""
+    t0 = time.perf_counter()
+    fn()                                       # warm-up (JIT, caches) and first estimate
+    once = time.perf_counter() - t0
+    number = 1 if once >= min_time else min(max_number, max(1, int(min_time / max(once, 1e-9))))
+    if once >= 10 * min_time:
+        repeat = min(repeat, 3)                # long cases: fewer repeats
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - t0) / number)
+    return number, timings
+
+
+def run(pattern=None, sizes=None, max_size=None, verbose=True):
+    """Run the registered benchmarks; returns the results dict (see module doc)."""
+    import benchmarks.suite  # noqa: F401  (registers the benchmarks)
+
+    results = {}
+    for bench in REGISTRY:
+        if pattern and pattern not in bench.name:
+            continue
+        for size in bench.sizes:
+            if (sizes and size not in sizes) or (max_size and size > max_size):
+                continue
+            key = case_key(bench.name, size)
+            try:
+                fn = bench.setup(size)
+                number, timings = time_case(fn, bench.repeat, bench.min_time)
+            except Exception as e:
+                results[key] = {'name': bench.name, 'size': size,
+                                'error': f"{type(e).__name__}: {e}"}
+                if verbose:
+                    print(f"[WARN] {key}: {results[key]['error']}")
+                continue
+            med = statistics.median(timings)
+            results[key] = {
+                'name': bench.name, 'size': size, 'number': number, 'repeat': len(timings),
+                'min': min(timings), 'median': med, 'mean': statistics.fmean(timings),
+                'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                'per_item': med / size,
+            }
+            if verbose:
+                print(f"{key:<55} {_fmt(med):>10}  {_fmt(med / size):>10}/item")
+    return {'meta': metadata(), 'results': results}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def save(data, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, new, threshold=0.10, stat='median'):
+    """
+    Rows (key, base, new, ratio, verdict) for the cases that ran in base;
+    verdict is 'REGRESSION' when new/base > 1 + threshold, 'faster' when
+    base/new > 1 + threshold, 'ERROR' or 'MISSING' when the case failed or
+    is absent in new (new and ratio are None then), else ''.
+    """
+    rows = []
+    for key, b in base['results'].items():
+        if 'error' in b:
+            continue
+        n = new['results'].get(key)
+        if n is None or 'error' in n:
+            rows.append((key, b[stat], None, None, 'MISSING' if n is None else 'ERROR'))
+            continue
+        ratio = n[stat] / b[stat] if b[stat] else float('inf')
+        if ratio > 1 + threshold:
+            verdict = 'REGRESSION'
+        elif ratio < 1 / (1 + threshold):
+            verdict = 'faster'
+        else:
+            verdict = ''
+        rows.append((key, b[stat], n[stat], ratio, verdict))
+    return rows
+
+
+FAILED = ('REGRESSION', 'ERROR', 'MISSING')
+
+
+def print_comparison(rows, out=None):
+    out = out or sys.stdout
+    print(f"{'benchmark':<55}{'base':>11}{'new':>11}{'ratio':>8}", file=out)
+    for key, b, n, ratio, verdict in rows:
+        if n is None:
+            print(f"{key:<55}{_fmt(b):>11}{'-':>11}{'-':>8}  {verdict}", file=out)
+        else:
+            print(f"{key:<55}{_fmt(b):>11}{_fmt(n):>11}{ratio:>8.2f}  {verdict}", file=out)
+
+
+def _fmt(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds * 1e9:.3g}ns"
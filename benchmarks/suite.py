@@ -0,0 +1,170 @@
+# benchmarks/suite.py
+
+"""
+The benchmark definitions. Imports of the code under test happen inside the
+setup functions, so a missing optional dependency (numba, config) only
+errors the benchmarks that need it.
+"""
+
+import contextlib
+import io
+
+from benchmarks import data
+from benchmarks.runner import benchmark
+
+# evaluate_indicators gets a live-sized window; `size` is the history
+WINDOW = 500
+
+
+# ---------------------------------------------------------------- indicators
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def fast_rsi(size):
+    from strategy.indicators import RSI_PERIOD, fast_rsi
+    p = data.prices(size)
+    return lambda: fast_rsi(p, RSI_PERIOD)
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def fast_macd(size):
+    from strategy.indicators import fast_macd
+    p = data.prices(size)
+    return lambda: fast_macd(p)
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def fast_bollinger(size):
+    from strategy.indicators import fast_bollinger
+    p = data.prices(size)
+    return lambda: fast_bollinger(p)
+
+
+@benchmark(sizes=(10_000, 100_000))
+def evaluate_indicators(size):
+    """One strategy evaluation over the last WINDOW bars of a `size` history."""
+    from config.loader import load_config
+    from storage.indicators import CandleColumns
+    from strategy.indicators import evaluate_indicators
+
+    cfg = load_config().strategy
+    cols = data.candle_columns(size)
+    candles = CandleColumns(cols)[-WINDOW:]
+    closes = cols['close'][-WINDOW:]
+    return lambda: evaluate_indicators(closes, candles, candles, candles, cfg=cfg)
+
+
+# ---------------------------------------------------------------- patterns
+@benchmark(sizes=(10_000, 100_000))
+def detect_candle_pattern(size):
+    from strategy.indicators import detect_candle_pattern
+    bars = data.candles(size)
+    return lambda: [detect_candle_pattern(c) for c in bars]
+
+
+@benchmark(sizes=(10_000, 100_000))
+def detect_multi_candle_pattern(size):
+    from strategy.indicators import detect_multi_candle_pattern
+    bars = data.candles(size)
+    return lambda: [detect_multi_candle_pattern(a, b) for a, b in zip(bars, bars[1:])]
+
+
+@benchmark(sizes=(10_000, 100_000))
+def detect_five_candle_pattern(size):
+    from strategy.indicators import detect_five_candle_pattern
+    bars = data.candles(size)
+    return lambda: [detect_five_candle_pattern(bars[i - 5:i]) for i in range(5, len(bars))]
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def detect_double_top_bottom(size):
+    from strategy.indicators import detect_double_bottom, detect_double_top
+    p = data.prices(size)
+    return lambda: (detect_double_bottom(p), detect_double_top(p))
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def candle_pattern_scores(size):
+    """Vectorized single-candle scores used by the rollups."""
+    from aggregator.rollups import candle_pattern_scores
+    c = data.candle_columns(size)
+    return lambda: candle_pattern_scores(c['open'], c['high'], c['low'], c['close'])
+
+
+# ---------------------------------------------------------------- records
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def records_tick_attributes(size):
+    """tick.bid + tick.ask over Tick objects; compare with records_dict_items."""
+    ticks = data.ticks(size)
+    return lambda: [t.bid + t.ask for t in ticks]
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def records_dict_items(size):
+    """The same access on the equivalent tick dicts."""
+    ticks = [t.to_dict() for t in data.ticks(size)]
+    return lambda: [t['bid'] + t['ask'] for t in ticks]
+
+
+# ---------------------------------------------------------------- aggregation
+def _feed(make_builder, ticks):
+    def run():
+        builder = make_builder()
+        for t in ticks:
+            builder.add_tick(t)
+    return run
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def candle_builder(size):
+    from aggregator.candle_builder import CandleBuilder
+    return _feed(lambda: CandleBuilder(60), data.ticks(size))
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def multi_interval_builder(size):
+    from aggregator.candle_builder import MultiIntervalCandleBuilder
+    return _feed(lambda: MultiIntervalCandleBuilder([60, 300, 900, 3600]), data.ticks(size))
+
+
+@benchmark(sizes=(10_000, 100_000, 1_000_000))
+def multi_interval_builder_cascade(size):
+    from aggregator.candle_builder import MultiIntervalCandleBuilder
+    return _feed(lambda: MultiIntervalCandleBuilder([60, 300, 900, 3600], cascade=True),
+                 data.ticks(size))
+
+
+@benchmark(sizes=(10_000, 100_000))
+def process_tick(size):
+    from aggregator.candles import process_tick
+    from backtest.tick_backtest import make_candle_builder
+
+    ticks = [(t.time, t.mid, t.volume) for t in data.ticks(size)]
+
+    def run():
+        builders = [make_candle_builder(m) for m in (1, 5, 15)]
+        recent = {1: [], 5: [], 15: []}
+        buckets = {1: None, 5: None, 15: None}
+        states = {1: None, 5: None, 15: None}
+        for ts, mid, volume in ticks:
+            r = process_tick(ts, mid, volume, recent[1], recent[5], recent[15],
+                             buckets, states, *builders)
+            recent = {1: r['recent_1m'], 5: r['recent_5m'], 15: r['recent_15m']}
+            buckets, states = r['last_buckets'], r['last_states']
+    return run
+
+
+# ---------------------------------------------------------------- backtest loop
+@benchmark(sizes=(10_000, 100_000), repeat=3)
+def trading_logic_simulate(size):
+    """
+    trading_logic_test.simulate over `size` 1m bars (trade prints silenced).
+    The loop re-slices its history every bar, so 1M bars is left out.
+    """
+    from backtest.trading_logic_test import simulate
+    cols_1m = data.candle_columns(size, 60)
+    cols_5m = data.candle_columns(size // 5, 300)
+    cols_15m = data.candle_columns(size // 15, 900)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            simulate(cols_1m, cols_5m, cols_15m)
+    return run
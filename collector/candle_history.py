@@ -3,10 +3,11 @@ import os
 import sys
 import subprocess
 import yaml
-import requests
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 
+from collector.chart_downloader import ChartDownloader
+
 # === CONFIG & TOKEN LOADING ===
 
 # Adjust this path as needed
@@ -53,35 +54,11 @@ start_local = end_local - timedelta(hours=24)
 end_utc     = end_local.astimezone(timezone.utc)
 start_utc   = start_local.astimezone(timezone.utc)
 
-total_count = int((end_utc - start_utc).total_seconds() / 60)
-MAX_COUNT   = 1200
-
-url     = 'https://gateway.saxobank.com/sim/openapi/chart/v3/charts'
-headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
-
-# === FETCH PAGES ===
-all_bars, remaining, current_time = [], total_count, end_utc
-while remaining > 0:
-    cnt = min(remaining, MAX_COUNT)
-    params = {
-        'Uic':       uic,
-        'AssetType': asset_type,
-        'Horizon':   1,
-        'Count':     cnt,
-        'Mode':      'UpTo',
-        'Time':      current_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
-    }
-    r = requests.get(url, params=params, headers=headers)
-    r.raise_for_status()
-    batch = r.json().get('Data', [])
-    if not batch: break
-    all_bars = batch + all_bars
-    # step back
-    earliest = datetime.strptime(batch[-1]['Time'],
-                                 '%Y-%m-%dT%H:%M:%S.%fZ'
-                                ).replace(tzinfo=timezone.utc)
-    current_time = earliest - timedelta(minutes=1)
-    remaining   -= cnt
+# === FETCH PAGES (concurrent, cached on disk) ===
+downloader = ChartDownloader(token, uic, asset_type, field_set=None)
+all_bars   = downloader.fetch(start_utc, end_utc, horizon=1)
+print(f"[INFO] {len(all_bars)} bars, {downloader.requests} API calls, "
+      f"{downloader.cache_hits} cached pages", file=sys.stderr)
 
 # === CONVERT TO LOCAL TZ & PRINT ===
 for bar in all_bars:
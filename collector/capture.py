@@ -0,0 +1,355 @@
+# collector/capture.py
+
+"""
+Append-only capture log of the raw feed and the normalized ticks.
+
+A capture directory holds numbered segments; each segment is a pair of
+files sharing a stem:
+
+    <dir>/<seq:06d>-<YYYYmmddTHHMMSS>.raw     raw WebSocket messages
+        (i64 recv_ns | u32 length | message bytes) ...
+    <dir>/<seq:06d>-<YYYYmmddTHHMMSS>.ticks   fixed-size TICK_DTYPE records
+
+recv_ns is the local receive time (time.time_ns()). Tick files have no
+header, so a segment is read back with np.memmap as a structured array:
+no parsing, and column access (ticks['bid']) is a strided view. A trailing
+partial record (crash mid-write) is ignored. A missing volume or bid/ask
+size is stored as NaN and read back as None.
+
+The live side only timestamps the item and puts it on a queue; encoding,
+file writes and segment rotation (after segment_bytes) happen on a
+background thread. If that thread falls behind and the queue fills, items
+are dropped and counted rather than blocking the feed. Files are only ever
+appended to; a new writer continues with the next segment number.
+"""
+
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from aggregator.records import Tick
+from aggregator.resample import to_epoch_ns
+
+TICK_DTYPE = np.dtype([
+    ('recv_ns', '<i8'),
+    ('timestamp', '<i8'),         # epoch ns (UTC)
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('volume', '<f8'),
+    ('bid_size', '<f8'),
+    ('ask_size', '<f8'),
+    ('symbol', 'S16'),
+])
+RAW_HEADER = struct.Struct('<qI')    # recv_ns, length
+
+_RAW = 0
+_TICK = 1
+_BLOCK = 2
+_STOP = object()
+
+
+def segments(directory):
+    """Segment stems (full paths without extension), oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    stems = {os.path.splitext(n)[0] for n in os.listdir(directory)
+             if n.endswith(('.raw', '.ticks'))}
+    return [os.path.join(directory, s) for s in sorted(stems)]
+
+
+class CaptureWriter:
+    def __init__(self, directory, segment_bytes=256 << 20, max_queue=1_000_000,
+                 batch_size=10_000, flush_interval=0.5):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.raw_written = 0
+        self.ticks_written = 0
+        self.dropped = 0
+        self.segments = 0
+        self.errors = 0
+        os.makedirs(directory, exist_ok=True)
+        existing = segments(directory)
+        self._seq = int(os.path.basename(existing[-1]).split('-')[0]) + 1 if existing else 0
+        self._raw = self._ticks = None
+        self._size = 0
+        self._warned = False
+        self._closed = False
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='capture-writer', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------------------------------------------- live side
+    def write_raw(self, data):
+        """Record one raw feed message (bytes)."""
+        self._put((_RAW, time.time_ns(), data))
+
+    def write_tick(self, tick):
+        """Record one normalized tick (Tick or tick dict)."""
+        self._put((_TICK, time.time_ns(), tick))
+
+    def write_block(self, block):
+        """
+        Record a pre-encoded TICK_DTYPE array (see encode_columns). Used for
+        bulk imports, so this blocks instead of dropping when the queue is full.
+        """
+        self._queue.put((_BLOCK, None, block))
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            if not self._warned:
+                self._warned = True
+                print(f"[WARN] Capture queue full; dropping messages in {self.directory}")
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written to disk."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # ---------------------------------------------------------------- writer thread
+    def _run(self):
+        batch = []
+        deadline = None
+        get = self._queue.get
+        while True:
+            try:
+                if batch:
+                    item = get(timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    item = get()
+            except queue.Empty:
+                self._commit(batch)
+                batch = []
+                continue
+
+            if item is _STOP:
+                self._commit(batch)
+                self._close_segment()
+                return
+            if isinstance(item, threading.Event):
+                self._commit(batch)
+                batch = []
+                item.set()
+                continue
+
+            batch.append(item)
+            if len(batch) == 1:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._commit(batch)
+                batch = []
+
+    def _commit(self, batch):
+        if not batch:
+            return
+        try:
+            if self._raw is None or self._size >= self.segment_bytes:
+                self._rotate()
+            raw = [(t, data) for kind, t, data in batch if kind == _RAW]
+            ticks = [(t, tick) for kind, t, tick in batch if kind == _TICK]
+            blocks = [block for kind, _, block in batch if kind == _BLOCK]
+            if raw:
+                buf = bytearray()
+                for t, data in raw:
+                    if isinstance(data, str):
+                        data = data.encode()
+                    buf += RAW_HEADER.pack(t, len(data))
+                    buf += data
+                self._raw.write(buf)
+                self._size += len(buf)
+                self.raw_written += len(raw)
+            if ticks:
+                block = encode_ticks([tick for _, tick in ticks], [t for t, _ in ticks])
+                self._ticks.write(block.tobytes())
+                self._size += block.nbytes
+                self.ticks_written += len(ticks)
+            for block in blocks:
+                self._ticks.write(block.tobytes())
+                self._size += block.nbytes
+                self.ticks_written += len(block)
+            self._raw.flush()
+            self._ticks.flush()
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERROR] Failed to write {len(batch)} capture records: {e}")
+
+    def _rotate(self):
+        self._close_segment()
+        opened = datetime.now(timezone.utc)
+        stem = os.path.join(self.directory, f"{self._seq:06d}-{opened:%Y%m%dT%H%M%S}")
+        self._raw = open(stem + '.raw', 'ab')
+        self._ticks = open(stem + '.ticks', 'ab')
+        self._seq += 1
+        self._size = 0
+        self.segments += 1
+
+    def _close_segment(self):
+        for f in (self._raw, self._ticks):
+            if f is not None:
+                f.close()
+        self._raw = self._ticks = None
+
+
+def _or_nan(value):
+    return math.nan if value is None else value
+
+
+def encode_ticks(ticks, recv_ns=None):
+    """Pack Ticks / tick dicts into a TICK_DTYPE array."""
+    out = np.zeros(len(ticks), dtype=TICK_DTYPE)
+    if not len(ticks):
+        return out
+    out['recv_ns'] = recv_ns if recv_ns is not None else time.time_ns()
+    out['timestamp'] = to_epoch_ns([t['timestamp'] for t in ticks])
+    out['bid'] = [t['bid'] for t in ticks]
+    out['ask'] = [t['ask'] for t in ticks]
+    out['volume'] = [_or_nan(t.get('volume')) for t in ticks]
+    out['bid_size'] = [_or_nan(t.get('bid_size')) for t in ticks]
+    out['ask_size'] = [_or_nan(t.get('ask_size')) for t in ticks]
+    out['symbol'] = [(t.get('symbol') or '').encode() for t in ticks]
+    return out
+
+
+def encode_columns(cols, recv_ns=None):
+    """
+    Pack tick columns into a TICK_DTYPE array without per-tick objects:
+    'timestamp' (anything to_epoch_ns accepts), 'bid', 'ask', and optionally
+    'volume', 'bid_size', 'ask_size' arrays and a 'symbol' string. recv_ns
+    defaults to the tick timestamps.
+    """
+    ts = to_epoch_ns(cols['timestamp'])
+    out = np.zeros(len(ts), dtype=TICK_DTYPE)
+    out['timestamp'] = ts
+    out['recv_ns'] = ts if recv_ns is None else recv_ns
+    out['bid'] = cols['bid']
+    out['ask'] = cols['ask']
+    out['volume'] = cols.get('volume', 0.0)
+    out['bid_size'] = cols.get('bid_size', math.nan)
+    out['ask_size'] = cols.get('ask_size', math.nan)
+    out['symbol'] = (cols.get('symbol') or '').encode()
+    return out
+
+
+# ---------------------------------------------------------------- reading
+def decode_ticks(records):
+    """TICK_DTYPE records -> list of Ticks (ISO timestamps, NaN volume and sizes as None)."""
+    times = records['timestamp'].view('datetime64[ns]').astype('datetime64[us]').astype(object)
+    symbols = [s.decode() or None for s in records['symbol']]
+    bid_size = records['bid_size'].tolist()
+    ask_size = records['ask_size'].tolist()
+    return [
+        Tick(ts.isoformat(), symbols[i], bid, ask, None if volume != volume else volume,
+             None if bid_size[i] != bid_size[i] else bid_size[i],
+             None if ask_size[i] != ask_size[i] else ask_size[i])
+        for i, (ts, bid, ask, volume) in enumerate(zip(
+            times, records['bid'].tolist(), records['ask'].tolist(), records['volume'].tolist()))
+    ]
+
+
+def read_ticks(stem):
+    """Memory-mapped TICK_DTYPE array of one segment (empty if it has no ticks)."""
+    path = stem + '.ticks'
+    n = os.path.getsize(path) // TICK_DTYPE.itemsize if os.path.exists(path) else 0
+    if n == 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode='r', shape=(n,))
+
+
+def read_raw(stem):
+    """Yield (recv_ns, message bytes) of one segment in write order."""
+    path = stem + '.raw'
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos, end = 0, len(mm)
+        while pos + RAW_HEADER.size <= end:
+            recv_ns, length = RAW_HEADER.unpack_from(mm, pos)
+            pos += RAW_HEADER.size
+            if pos + length > end:
+                break                      # partial trailing record
+            yield recv_ns, mm[pos:pos + length]
+            pos += length
+
+
+class CaptureReader:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def segments(self):
+        return segments(self.directory)
+
+    def iter_columns(self, since=None, until=None, symbol=None):
+        """
+        Yield the ticks with since <= timestamp < until (and the given symbol)
+        one segment at a time, as TICK_DTYPE arrays: the segment's memmap when
+        nothing is filtered, else the rows picked by a boolean mask. Only one
+        segment is ever materialized in memory.
+        """
+        lo = int(to_epoch_ns([since])[0]) if since is not None else None
+        hi = int(to_epoch_ns([until])[0]) if until is not None else None
+        key = symbol.encode() if symbol is not None else None
+        for stem in self.segments():
+            ticks = read_ticks(stem)
+            if not len(ticks):
+                continue
+            if lo is None and hi is None and key is None:
+                yield ticks
+                continue
+            ts = ticks['timestamp']
+            mask = np.ones(len(ticks), dtype=bool)
+            if lo is not None:
+                mask &= ts >= lo
+            if hi is not None:
+                mask &= ts < hi
+            if key is not None:
+                mask &= ticks['symbol'] == key
+            if mask.any():
+                yield ticks[mask]
+
+    def columns(self, since=None, until=None, symbol=None):
+        """
+        iter_columns() concatenated into one TICK_DTYPE array, for callers
+        that want every matching tick in memory at once.
+        """
+        parts = list(self.iter_columns(since, until, symbol))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=TICK_DTYPE)
+
+    def ticks(self, since=None, until=None, symbol=None, chunk_size=100_000):
+        """
+        Yield the captured ticks as Tick objects, as the collector produced
+        them, decoding chunk_size records at a time straight from each
+        segment.
+        """
+        for data in self.iter_columns(since, until, symbol):
+            for start in range(0, len(data), chunk_size):
+                yield from decode_ticks(data[start:start + chunk_size])
+
+    def raw(self):
+        """Yield (recv_ns, message bytes) over all segments in capture order."""
+        for stem in self.segments():
+            yield from read_raw(stem)
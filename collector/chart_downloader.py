@@ -0,0 +1,192 @@
+# collector/chart_downloader.py
+
+"""
+Concurrent, cached downloader for the Saxo chart API.
+
+A requested window is split into pages of PAGE_SIZE bars on a fixed grid
+(page starts are multiples of PAGE_SIZE * horizon minutes since the epoch),
+so the same page is requested, and cached, whatever window it is part of.
+Missing pages are fetched in parallel over one pooled requests.Session with
+retry (429/5xx, honouring Retry-After) and a shared rate limit. Each
+complete page is stored as JSON under
+
+    <cache_dir>/<asset type>/<uic>/<field set>/<horizon>/<page start YYYYmmddTHHMM>.json
+
+The asset type and the sample field set (ChartSampleFieldSet, 'default'
+when none is requested) are part of the key because they change the bars
+returned for the same uic, so downloaders with different settings can share
+one cache directory.
+
+Pages that end in the future are still filling and are never cached. So
+re-running a report over a past window is served entirely from disk.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = 'https://gateway.saxobank.com/sim/openapi/chart/v3/charts'
+PAGE_SIZE = 1200                      # the chart endpoint returns at most 1200 bars per call
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_time(value):
+    """Saxo bar time ('2024-01-01T10:00:00.000000Z') -> aware UTC datetime."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def _utc(dt):
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+
+class RateLimiter:
+    """Token bucket shared by the worker threads: `rate` calls per second, bursts of `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ChartDownloader:
+    def __init__(self, token, uic, asset_type='FxSpot', api_url=API_URL,
+                 cache_dir='data/chart_cache', max_workers=4, rate=10.0,
+                 retries=4, field_set='LastTraded', session=None):
+        self.uic = uic
+        self.asset_type = asset_type
+        self.api_url = api_url
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.field_set = field_set
+        self.limiter = RateLimiter(rate, burst=max_workers)
+        self.requests = 0
+        self.cache_hits = 0
+        self._counts = threading.Lock()     # the counters are bumped from worker threads
+        self.session = session or self._session(token, retries)
+
+    def _session(self, token, retries):
+        session = requests.Session()
+        retry = Retry(
+            total=retries, backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1,
+                              pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Authorization': f'Bearer {token}', 'Accept': 'application/json'})
+        return session
+
+    # ---------------------------------------------------------------- pages
+    def pages(self, start, end, horizon):
+        """Grid-aligned page starts covering [start, end)."""
+        span = timedelta(minutes=PAGE_SIZE * horizon)
+        first = EPOCH + span * ((_utc(start) - EPOCH) // span)
+        pages = []
+        page = first
+        while page < _utc(end):
+            pages.append(page)
+            page += span
+        return pages
+
+    def _cache_path(self, horizon, page):
+        return os.path.join(self.cache_dir, str(self.asset_type), str(self.uic),
+                            self.field_set or 'default', str(horizon),
+                            f"{page:%Y%m%dT%H%M}.json")
+
+    def _read_cache(self, horizon, page):
+        path = self._cache_path(horizon, page)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_cache(self, horizon, page, bars):
+        path = self._cache_path(horizon, page)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(bars, f)
+        os.replace(tmp, path)
+
+    def _download(self, horizon, page):
+        page_end = page + timedelta(minutes=PAGE_SIZE * horizon)
+        params = {
+            'Uic': self.uic,
+            'AssetType': self.asset_type,
+            'Horizon': horizon,
+            'Count': PAGE_SIZE,
+            'Mode': 'From',
+            'Time': page.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        if self.field_set:
+            params['ChartSampleFieldSet'] = self.field_set
+        self.limiter.acquire()
+        r = self.session.get(self.api_url, params=params, timeout=30)
+        r.raise_for_status()
+        with self._counts:
+            self.requests += 1
+        # 'From' returns the next PAGE_SIZE bars, which can run past the
+        # page when the market was closed; keep only this page's bars
+        bars = [b for b in r.json().get('Data', []) if page <= parse_time(b['Time']) < page_end]
+        if page_end <= datetime.now(timezone.utc):
+            self._write_cache(horizon, page, bars)
+        return bars
+
+    def _page(self, horizon, page):
+        bars = self._read_cache(horizon, page)
+        if bars is not None:
+            with self._counts:
+                self.cache_hits += 1
+            return bars
+        return self._download(horizon, page)
+
+    # ---------------------------------------------------------------- public
+    def fetch(self, start, end, horizon=1):
+        """Raw Saxo bars with start <= Time < end, oldest first."""
+        start, end = _utc(start), _utc(end)
+        pages = self.pages(start, end, horizon)
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='chart-download') as pool:
+            results = list(pool.map(lambda p: self._page(horizon, p), pages))
+        return [b for bars in results for b in bars if start <= parse_time(b['Time']) < end]
+
+    def candles(self, start, end, horizon=1):
+        """
+        Bars as {'timestamp' (aware UTC), 'open', 'high', 'low', 'close',
+        'volume'}. FX bars carry OpenBid/HighBid/...; others Open/High/...
+        """
+        return [
+            {
+                'timestamp': parse_time(b['Time']),
+                'open':      b.get('Open',  b.get('OpenBid')),
+                'high':      b.get('High',  b.get('HighBid')),
+                'low':       b.get('Low',   b.get('LowBid')),
+                'close':     b.get('Close', b.get('CloseBid')),
+                'volume':    b.get('Volume'),    # None for FX
+            }
+            for b in self.fetch(start, end, horizon)
+        ]
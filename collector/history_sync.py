@@ -0,0 +1,155 @@
+# collector/history_sync.py
+
+"""
+Incremental back-fill of candle tables from the Saxo chart API.
+
+For each (symbol, horizon) the sync reads the bar times already stored in
+the matching candle table (candles_m1, candles_m5, ...), works out which
+bar slots of the requested window are missing and downloads only those
+ranges through ChartDownloader (so pages already on disk cost nothing).
+Slots during the weekly FX close (Friday 17:00 to Sunday 17:00 New York
+time, collector.market_hours) are never expected, so weekends do not count
+as gaps. The latest stored bar
+needs no special case: everything after it is just the trailing gap.
+
+Fetched bars are inserted only where no row exists yet, so candles that
+the materializer built from collected ticks are never overwritten; the
+INSERT also skips rows that conflict with a unique key on the table, where
+there is one, in case a bar lands between reading the table and writing it.
+FX bars are stored as bid/ask mid prices, like tick-built candles, and a
+`cache` (storage.candle_cache.CandleCache) is told from which bar on the
+table changed.
+A candle table without a symbol column (not yet migrated, see
+storage.schema) can only hold one symbol: syncing several symbols into it
+raises ValueError instead of mixing their bars.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from aggregator.materialize import candle_table, has_column
+from aggregator.resample import NS_PER_SECOND, to_epoch_ns
+from collector.chart_downloader import PAGE_SIZE, parse_time
+from collector.market_hours import fx_closed
+
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+# Saxo chart horizons (minutes)
+HORIZONS = (1, 5, 10, 15, 30, 60, 120, 240, 360, 480, 1440)
+
+
+def find_gaps(existing, start, end, horizon, closed=fx_closed, merge_within=None):
+    """
+    Missing bar ranges in [start, end) as a list of (gap_start, gap_end)
+    aware UTC datetimes. `existing` holds the stored bar times (anything
+    to_epoch_ns accepts). Gaps separated by less than `merge_within`
+    (a timedelta) are merged into one fetch.
+    """
+    step = horizon * NS_PER_MINUTE
+    lo = int(to_epoch_ns([_naive_utc(start)])[0])
+    hi = int(to_epoch_ns([_naive_utc(end)])[0])
+    lo += -lo % step                              # first full slot
+    slots = np.arange(lo, hi, step, dtype=np.int64)
+    if closed is not None:
+        slots = slots[~closed(slots)]
+    have = np.sort(to_epoch_ns(existing)) if len(existing) else np.empty(0, dtype=np.int64)
+    missing = slots[~np.isin(slots, have)]
+    if not len(missing):
+        return []
+    merge_ns = int(merge_within / timedelta(microseconds=1)) * 1000 if merge_within else step
+    breaks = np.flatnonzero(np.diff(missing) > max(step, merge_ns))
+    firsts = np.r_[missing[0], missing[breaks + 1]]
+    lasts = np.r_[missing[breaks], missing[-1]]
+    return [(_from_ns(a), _from_ns(b + step)) for a, b in zip(firsts, lasts)]
+
+
+def _naive_utc(dt):
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _from_ns(ns):
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(ns) // 1000)
+
+
+def _mid(bar, field):
+    bid, ask = bar.get(field + 'Bid'), bar.get(field + 'Ask')
+    if bid is not None and ask is not None:
+        return (bid + ask) / 2
+    return bar.get(field, bid)
+
+
+class HistorySync:
+    def __init__(self, store, downloaders, cache=None):
+        """`downloaders` maps symbol -> ChartDownloader (or anything with .fetch)."""
+        self.store = store
+        self.downloaders = downloaders
+        self.cache = cache
+
+    def _existing(self, cur, table, start, end, symbol):
+        p = self.store.placeholder
+        to_db = self.store.to_db_time
+        sql = f"SELECT timestamp FROM {table} WHERE timestamp >= {p} AND timestamp < {p}"
+        params = [to_db(_naive_utc(start)), to_db(_naive_utc(end))]
+        if symbol is not None:
+            sql += f" AND symbol = {p}"
+            params.append(symbol)
+        cur.execute(sql, params)
+        return [r[0] for r in cur.fetchall()]
+
+    def sync(self, symbol, horizon, start, end, dry_run=False):
+        """
+        Fill the gaps of one symbol/horizon in [start, end). Returns a report
+        dict: table, latest (stored bar before syncing), gaps, fetched, inserted.
+        """
+        table = candle_table(horizon * 60)
+        cur = self.store.conn.cursor()
+        by_symbol = has_column(cur, table, 'symbol')
+        if not by_symbol and len(self.downloaders) > 1:
+            raise ValueError(
+                f"{table} has no symbol column and cannot hold bars of "
+                f"{', '.join(sorted(self.downloaders))}; run `forex-bot migrate` first"
+            )
+        existing = self._existing(cur, table, start, end, symbol if by_symbol else None)
+        have = set(to_epoch_ns(existing).tolist())
+        latest = _from_ns(max(have)) if have else None
+        gaps = find_gaps(existing, start, end, horizon,
+                         merge_within=timedelta(minutes=PAGE_SIZE * horizon))
+        report = {'table': table, 'latest': latest, 'gaps': gaps, 'fetched': 0, 'inserted': 0}
+        if dry_run or not gaps:
+            return report
+
+        rows = []
+        first = None
+        downloader = self.downloaders[symbol]
+        to_db = self.store.to_db_time
+        for gap_start, gap_end in gaps:
+            bars = downloader.fetch(gap_start, gap_end, horizon)
+            report['fetched'] += len(bars)
+            for b in bars:
+                ts = parse_time(b['Time']).replace(tzinfo=None)
+                key = int(to_epoch_ns([ts])[0])
+                if key in have:
+                    continue
+                have.add(key)
+                first = ts if first is None else min(first, ts)
+                row = (to_db(ts), _mid(b, 'Open'), _mid(b, 'High'), _mid(b, 'Low'),
+                       _mid(b, 'Close'), b.get('Volume') or 0.0)
+                rows.append(row + ((symbol,) if by_symbol else ()))
+
+        inserted = 0
+        if rows:
+            p = self.store.placeholder
+            cols = 'timestamp, open, high, low, close, volume' + (', symbol' if by_symbol else '')
+            cur.executemany(
+                # ON CONFLICT DO NOTHING: Postgres, and SQLite >= 3.24
+                f"INSERT INTO {table} ({cols}) VALUES ({', '.join([p] * len(rows[0]))}) "
+                f"ON CONFLICT DO NOTHING",
+                rows
+            )
+            # rows skipped on conflict are not counted (rowcount is -1 if the driver cannot tell)
+            inserted = cur.rowcount if cur.rowcount >= 0 else len(rows)
+            self.store.conn.commit()
+            if self.cache is not None:
+                self.cache.invalidate(table, symbol if by_symbol else None, since=first)
+        report['inserted'] = inserted
+        return report
@@ -0,0 +1,49 @@
+# collector/market_hours.py
+
+"""
+The weekly FX close, shared by the history back-fill and the synthetic
+tick generator.
+
+Spot FX closes Friday 17:00 New York time and reopens Sunday 17:00 New
+York time, so in UTC the close moves with US daylight saving time: 22:00
+in winter, 21:00 in summer. fx_closed() works on epoch-ns arrays: it
+builds the close intervals of the weeks the input spans (a handful of
+zoneinfo conversions per week) and looks every timestamp up with
+searchsorted.
+"""
+
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+NEW_YORK = ZoneInfo('America/New_York')
+CLOSE_TIME = time(17, 0)              # New York time, Friday close and Sunday open
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _epoch_ns(local):
+    return (local.astimezone(timezone.utc) - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def weekend_closes(lo_ns, hi_ns):
+    """(close, open) epoch-ns arrays of every weekend close overlapping [lo_ns, hi_ns]."""
+    first = (_EPOCH + timedelta(microseconds=int(lo_ns) // 1000)).date() - timedelta(days=7)
+    last = (_EPOCH + timedelta(microseconds=int(hi_ns) // 1000)).date() + timedelta(days=7)
+    friday = first + timedelta(days=(4 - first.weekday()) % 7)
+    closes, opens = [], []
+    while friday <= last:
+        closes.append(_epoch_ns(datetime.combine(friday, CLOSE_TIME, NEW_YORK)))
+        opens.append(_epoch_ns(datetime.combine(friday + timedelta(days=2), CLOSE_TIME, NEW_YORK)))
+        friday += timedelta(days=7)
+    return np.array(closes, dtype=np.int64), np.array(opens, dtype=np.int64)
+
+
+def fx_closed(times_ns):
+    """True for epoch-ns times inside the weekend FX close (Fri 17:00 - Sun 17:00 New York)."""
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    if not times_ns.size:
+        return np.zeros(times_ns.shape, dtype=bool)
+    closes, opens = weekend_closes(times_ns.min(), times_ns.max())
+    idx = np.searchsorted(closes, times_ns, side='right') - 1
+    return (idx >= 0) & (times_ns < opens[np.maximum(idx, 0)])
@@ -0,0 +1,244 @@
+# collector/router.py
+
+"""
+Per-symbol routing of the tick feed.
+
+Every symbol gets its own SymbolState (candle builder, strategy and 1m
+history), created on its first tick, so pairs never share bars or
+cooldowns. SymbolRouter does this in-process. The default builder is a
+ReorderingCandleBuilder, so ticks that arrive a little out of order (up to
+aggregator.max_lateness seconds) still land in the right bar, and later ones
+correct the bar already in the history instead of being folded into the
+wrong one.
+
+ShardedRouter spreads symbols over worker processes: a symbol always goes
+to shard crc32(symbol) % workers (stable across runs and hosts, unlike
+hash()), each shard has its own bounded queue and runs a SymbolRouter for
+its symbols. The single feed connection stays in the parent, which only
+routes. A pair that ticks heavily can fill its own shard's queue, but the
+other shards keep their own queues and CPUs, so it cannot starve them.
+What happens when a shard's queue is full follows the same policies as
+TickQueue: block, drop_oldest or drop_newest.
+"""
+
+import multiprocessing as mp
+import queue
+import signal as signals
+import zlib
+
+from aggregator.records import Tick
+from aggregator.reorder import ReorderingCandleBuilder
+from collector.tick_queue import POLICIES
+
+
+def shard_of(symbol, shards):
+    """Stable shard index of a symbol."""
+    return zlib.crc32(str(symbol).encode()) % shards
+
+
+def tick_symbol(tick):
+    return tick.symbol if type(tick) is Tick else tick.get('symbol')
+
+
+class SymbolState:
+    """
+    Aggregation and strategy state of one symbol.
+
+    The builder is a MultiIntervalCandleBuilder or a ReorderingCandleBuilder;
+    aggregate() hands evaluate() the signal-interval bars that closed and the
+    ones that were corrected by late ticks.
+    """
+
+    def __init__(self, symbol, builder, strategy, signal_interval=60, history_size=1000):
+        self.symbol = symbol
+        self.builder = builder
+        self.strategy = strategy
+        self.signal_interval = signal_interval
+        self.history_size = history_size
+        self.history = []
+        self.ticks = 0
+        self.corrections = 0
+        self._reordering = isinstance(builder, ReorderingCandleBuilder)
+
+    def on_tick(self, tick):
+        """Feed one tick; returns the strategy signal when a signal bar closes, else None."""
+        update = self.aggregate(tick)
+        return None if update is None else self.evaluate(tick, update)
+
+    def aggregate(self, tick):
+        """Candle step only: (closed, corrected) signal-interval bars, or None."""
+        self.ticks += 1
+        if not self._reordering:
+            bar = self.builder.add_tick(tick).get(self.signal_interval)
+            return None if bar is None else ([bar], [])
+        events = self.builder.add_tick(tick)
+        interval = self.signal_interval
+        closed = [c for i, c in events['candles'] if i == interval]
+        corrected = [c for i, c in events['corrections'] if i == interval]
+        return (closed, corrected) if closed or corrected else None
+
+    def evaluate(self, tick, update):
+        """
+        Strategy step: replace corrected bars in the history, append the closed
+        ones and evaluate. A correction alone does not produce a signal.
+        """
+        closed, corrected = update
+        history = self.history
+        for bar in corrected:
+            ts = bar['timestamp']
+            for i in range(len(history) - 1, -1, -1):
+                if history[i]['timestamp'] == ts:
+                    history[i] = bar
+                    self.corrections += 1
+                    break
+        if not closed:
+            return None
+        history.extend(closed)
+        if len(history) > 2 * self.history_size:
+            del history[:-self.history_size]
+        return self.strategy.generate_signal(history, tick)
+
+
+def default_state(symbol):
+    """SymbolState built from the aggregator and strategy config sections."""
+    from config.loader import load_config
+    from strategy.strategies import ParametrizedStrategy
+
+    settings = load_config()
+    builder = ReorderingCandleBuilder(
+        settings.aggregator.intervals,
+        max_lateness=getattr(settings.aggregator, 'max_lateness', 2.0),
+        max_buffered=getattr(settings.aggregator, 'max_buffered', 10000),
+        cascade=getattr(settings.aggregator, 'cascade', False),
+    )
+    return SymbolState(
+        symbol, builder, ParametrizedStrategy(settings.strategy),
+        history_size=getattr(settings.strategy, 'history_size', 1000),
+    )
+
+
+def print_signal(symbol, tick, signal):
+    print(f"{tick['timestamp']} {symbol}: {signal}")
+
+
+class SymbolRouter:
+    def __init__(self, state_factory=default_state, on_signal=print_signal):
+        self.state_factory = state_factory
+        self.on_signal = on_signal
+        self.states = {}
+
+    def state(self, symbol):
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = self.state_factory(symbol)
+        return state
+
+    def route(self, tick):
+        symbol = tick_symbol(tick)
+        signal = self.state(symbol).on_tick(tick)
+        if signal is not None and self.on_signal is not None:
+            self.on_signal(symbol, tick, signal)
+        return signal
+
+    def close(self):
+        pass
+
+
+def _run_shard(index, inbox, state_factory, on_signal):
+    # Ctrl-C goes to the whole process group; the parent drains and stops us
+    signals.signal(signals.SIGINT, signals.SIG_IGN)
+    router = SymbolRouter(state_factory, on_signal)
+    while True:
+        tick = inbox.get()
+        if tick is None:
+            break
+        try:
+            router.route(tick)
+        except Exception as e:
+            print(f"[ERROR] Shard {index}: {tick_symbol(tick)} tick failed: {e}")
+
+
+class ShardedRouter:
+    def __init__(self, workers, state_factory=default_state, on_signal=print_signal,
+                 maxsize=10_000, policy='block', mp_context=None):
+        if workers < 1:
+            raise ValueError("ShardedRouter needs at least one worker")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}; expected one of {POLICIES}")
+        self.workers = workers
+        self.state_factory = state_factory
+        self.on_signal = on_signal
+        self.policy = policy
+        self._ctx = mp_context or mp.get_context()
+        self.queues = [self._ctx.Queue(maxsize) for _ in range(workers)]
+        self.processes = []
+        self.routed = [0] * workers
+        self.dropped = [0] * workers
+        self._shards = {}
+        self._warned = set()
+
+    def start(self):
+        for i, inbox in enumerate(self.queues):
+            p = self._ctx.Process(
+                target=_run_shard, name=f'shard-{i}',
+                args=(i, inbox, self.state_factory, self.on_signal), daemon=True,
+            )
+            p.start()
+            self.processes.append(p)
+        return self
+
+    def shard(self, symbol):
+        s = self._shards.get(symbol)
+        if s is None:
+            s = self._shards[symbol] = shard_of(symbol, self.workers)
+        return s
+
+    def route(self, tick):
+        """Queue a tick on its symbol's shard. Returns False if a tick was dropped."""
+        i = self.shard(tick_symbol(tick))
+        inbox = self.queues[i]
+        if self.policy == 'block':
+            inbox.put(tick)
+            self.routed[i] += 1
+            return True
+        try:
+            inbox.put_nowait(tick)
+            self.routed[i] += 1
+            return True
+        except queue.Full:
+            pass
+        self._drop(i)
+        if self.policy == 'drop_oldest':
+            try:
+                inbox.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                inbox.put_nowait(tick)
+                self.routed[i] += 1
+            except queue.Full:
+                pass
+        return False
+
+    def _drop(self, i):
+        self.dropped[i] += 1
+        if i not in self._warned:
+            self._warned.add(i)
+            print(f"[WARN] Shard {i} queue full, policy {self.policy}: dropping ticks")
+
+    def close(self, timeout=10.0):
+        """Let every shard finish its queued ticks, then stop the workers."""
+        for inbox in self.queues:
+            inbox.put(None)
+        for p in self.processes:
+            p.join(timeout)
+            if p.is_alive():
+                print(f"[WARN] {p.name} did not stop within {timeout}s; terminating")
+                p.terminate()
+        self.processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
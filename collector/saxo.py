@@ -1,5 +1,68 @@
+# collector/saxo.py
+
+"""
+Saxo OpenAPI streaming collector.
+
+The collector opens the streaming WebSocket at collector.endpoint, creates
+an info-price subscription for the configured instruments over REST and
+turns every price update into an aggregator.records.Tick (dict-compatible):
+
+    timestamp, symbol, bid, ask, volume, bid_size, ask_size
+
+Saxo sends binary frames; one WebSocket message can hold several:
+
+    8 bytes   message id (uint64 LE)
+    2 bytes   reserved
+    1 byte    reference id length n
+    n bytes   reference id (ASCII)
+    1 byte    payload format (0 = JSON)
+    4 bytes   payload size (int32 LE)
+    payload
+
+Reference ids starting with '_' are control messages: _heartbeat (logged;
+a silent socket past heartbeat_timeout is treated as dead), _resetsubscriptions
+(subscriptions are recreated) and _disconnect (reconnect with a new
+context). Any connection loss, and any other failure while connecting or
+reading, reconnects with exponential backoff, resumes with the last message
+id and resubscribes. A malformed message is counted (stats['bad_messages'])
+and skipped from the first bad frame on.
+
+The socket reader only parses frames and puts ticks on a bounded TickQueue
+(collector.queue_size, collector.queue_policy: block / drop_oldest /
+drop_newest); a separate task hands them to the on_tick callback, so a slow
+consumer never stalls frame parsing, and overload is handled by the policy.
+
+With a capture writer (collector.capture.CaptureWriter) every raw message
+and every tick is also recorded; replay_async() feeds captured raw messages
+back through the same parsing path.
+
+With trace=True every tick gets a Tick.trace list stamped with its receive
+time, for the latency histograms of the collect pipeline (app.latency).
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import struct
+import urllib.request
+import uuid
 from abc import ABC, abstractmethod
-from storage.store import SqliteStore
+from datetime import datetime, timezone
+from time import perf_counter_ns
+
+import websockets
+
+from aggregator.records import TRACE_SLOTS, Tick
+from collector.tick_queue import TickQueue
+
+_HEADER = struct.Struct('<QHB')       # message id, reserved, reference id length
+_PAYLOAD = struct.Struct('<Bi')       # payload format, payload size
+
+DEFAULT_REST = 'https://gateway.saxobank.com/sim/openapi'
+DEFAULT_TOKEN_FILE = '~/trader/tok.txt'
+PRICE_REFERENCE = 'prices'
+
 
 class ITickSource(ABC):
     @abstractmethod
@@ -10,31 +73,326 @@ class ITickSource(ABC):
     def on_tick(self, callback):
         pass
 
+
+# what a truncated or corrupt message raises from iter_frames (JSONDecodeError is a ValueError)
+FRAME_ERRORS = (struct.error, UnicodeDecodeError, ValueError)
+
+
+def iter_frames(data):
+    """Yield the (message_id, reference_id, payload) frames of one binary WebSocket message."""
+    pos = 0
+    while pos < len(data):
+        msg_id, _, ref_len = _HEADER.unpack_from(data, pos)
+        pos += _HEADER.size
+        ref_id = data[pos:pos + ref_len].decode('ascii')
+        pos += ref_len
+        fmt, size = _PAYLOAD.unpack_from(data, pos)
+        pos += _PAYLOAD.size
+        if size < 0 or pos + size > len(data):
+            raise struct.error(f"frame {msg_id} truncated: {size} payload bytes announced")
+        raw = bytes(data[pos:pos + size])
+        pos += size
+        yield msg_id, ref_id, json.loads(raw) if fmt == 0 else raw
+
+
+def parse_frames(data):
+    """Split one binary WebSocket message into (message_id, reference_id, payload) tuples."""
+    return list(iter_frames(data))
+
+
+def encode_frame(msg_id, ref_id, payload):
+    """Inverse of parse_frames for one JSON frame (used by replay servers and tests)."""
+    ref = ref_id.encode('ascii')
+    body = json.dumps(payload).encode()
+    return _HEADER.pack(msg_id, 0, len(ref)) + ref + _PAYLOAD.pack(0, len(body)) + body
+
+
+def _utc_iso(value):
+    if not value:
+        return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+    dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def uic_map(symbols, uics):
+    """symbol -> Uic from collector.uics; symbols that are numbers are Uics already."""
+    out = {}
+    for s in symbols:
+        try:
+            out[s] = int(uics.get(s, s))
+        except ValueError:
+            raise ValueError(f"No Uic for symbol {s!r}; add it to collector.uics") from None
+    return out
+
+
 class SaxoCollector(ITickSource):
-    def __init__(self, config, store: SqliteStore):
+    def __init__(self, config, store=None, subscribe=None, token=None, capture=None,
+                 trace=False):
         self.endpoint = config.endpoint
-        self.symbols = config.symbols
+        self.symbols = list(config.symbols)
         self.store = store
+        self.uics = uic_map(self.symbols, getattr(config, 'uics', None) or {})
+        self.symbol_by_uic = {u: s for s, u in self.uics.items()}
+        self.asset_type = getattr(config, 'asset_type', 'FxSpot')
+        self.rest_endpoint = getattr(config, 'rest_endpoint', DEFAULT_REST)
+        self.token_file = os.path.expanduser(getattr(config, 'token_file', DEFAULT_TOKEN_FILE))
+        self.queue_size = getattr(config, 'queue_size', 10_000)
+        self.queue_policy = getattr(config, 'queue_policy', 'block')
+        self.heartbeat_timeout = getattr(config, 'heartbeat_timeout', 30.0)
+        self.max_backoff = getattr(config, 'max_backoff', 30.0)
+        self._token = token
+        self._subscribe = subscribe or self._subscribe_rest
+        self.capture = capture
+        self.trace = trace
+        self.callback = None
+        self.queue = None
+        self.context_id = None
+        self.last_message_id = None
+        self.quotes = {}               # uic -> last full quote, deltas are merged in
+        self.stats = {'messages': 0, 'ticks': 0, 'heartbeats': 0, 'reconnects': 0, 'resets': 0,
+                      'errors': 0, 'bad_messages': 0}
+        self._stopping = False
 
+    # ---------------------------------------------------------------- ITickSource
     def connect(self):
-        # TODO: Connect to Saxo WebSocket at self.endpoint
-        print(f"Connecting to {self.endpoint} for symbols {self.symbols}")
+        """Start a fresh streaming context and return the WebSocket URL for it."""
+        self.context_id = uuid.uuid4().hex[:20]
+        self.last_message_id = None
+        return self._url()
 
     def on_tick(self, callback):
-        # TODO: Register tick callback
         self.callback = callback
 
-    def run(self):
+    def _url(self):
+        url = f"{self.endpoint}?contextId={self.context_id}"
+        if self.last_message_id is not None:
+            url += f"&messageid={self.last_message_id}"
+        return url
+
+    def token(self):
+        if self._token:
+            return self._token
+        with open(self.token_file) as f:
+            return f.read().strip()
+
+    # ---------------------------------------------------------------- subscription
+    def _subscribe_rest(self, context_id, reference_id):
+        body = json.dumps({
+            'ContextId': context_id,
+            'ReferenceId': reference_id,
+            'ReplaceReferenceId': reference_id,
+            'Arguments': {
+                'Uics': ','.join(str(u) for u in self.uics.values()),
+                'AssetType': self.asset_type,
+                'FieldGroups': ['Quote'],
+            },
+        }).encode()
+        req = urllib.request.Request(
+            f"{self.rest_endpoint}/trade/v1/infoprices/subscriptions/",
+            data=body, method='POST',
+            headers={'Authorization': f"Bearer {self.token()}",
+                     'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read() or b'{}')
+
+    async def _resubscribe(self):
+        if inspect.iscoroutinefunction(self._subscribe):
+            result = await self._subscribe(self.context_id, PRICE_REFERENCE)
+        else:
+            # the REST call blocks; keep it off the event loop
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, self._subscribe, self.context_id, PRICE_REFERENCE
+            )
+        snapshot = (result or {}).get('Snapshot', {}).get('Data', [])
+        await self._handle_prices(snapshot)
+        print(f"[INFO] Subscribed to {', '.join(self.symbols)} (context {self.context_id})")
+
+    # ---------------------------------------------------------------- messages
+    def _tick(self, update):
+        """Merge a price update into the last quote; the Tick, or None while bid/ask are unknown."""
+        uic = update.get('Uic')
+        quote = self.quotes.setdefault(uic, {})
+        quote.update(update.get('Quote') or {})
+        if 'Bid' not in quote or 'Ask' not in quote:
+            return None
+        bid_size = quote.get('BidSize')
+        ask_size = quote.get('AskSize')
+        return Tick(
+            _utc_iso(update.get('LastUpdated')),
+            self.symbol_by_uic.get(uic, str(uic)),
+            quote['Bid'],
+            quote['Ask'],
+            (bid_size or 0) + (ask_size or 0),
+            bid_size,
+            ask_size,
+        )
+
+    async def _handle_prices(self, payload):
+        for update in payload if isinstance(payload, list) else [payload]:
+            try:
+                tick = self._tick(update)
+            except Exception as e:
+                # one malformed update must not take the reader down
+                self.stats['errors'] += 1
+                print(f"[ERROR] Skipping malformed price update {str(update)[:200]}: {e}")
+                continue
+            if tick is None:
+                continue
+            if self.trace:
+                tick.trace = [perf_counter_ns()] + [0] * (TRACE_SLOTS - 1)
+            self.stats['ticks'] += 1
+            if self.capture is not None:
+                self.capture.write_tick(tick)
+            await self.queue.put(tick)
+
+    async def _handle_control(self, ref_id, payload):
+        """Returns False when the server asked us to disconnect."""
+        if ref_id == '_heartbeat':
+            self.stats['heartbeats'] += 1
+            for hb in payload or []:
+                for beat in hb.get('Heartbeats', []):
+                    if beat.get('Reason') == 'SubscriptionPermanentlyDisabled':
+                        print(f"[WARN] Subscription {beat.get('OriginatingReferenceId')} disabled by server")
+        elif ref_id == '_resetsubscriptions':
+            self.stats['resets'] += 1
+            targets = (payload or {}).get('TargetReferenceIds') or [PRICE_REFERENCE]
+            if PRICE_REFERENCE in targets:
+                print("[WARN] Server reset subscriptions; resubscribing")
+                await self._resubscribe()
+        elif ref_id == '_disconnect':
+            print("[WARN] Server requested disconnect")
+            return False
+        return True
+
+    async def _read(self, ws):
+        """Read until the socket closes or goes silent. Returns True to resume the context."""
+        while True:
+            try:
+                data = await asyncio.wait_for(ws.recv(), self.heartbeat_timeout)
+            except asyncio.TimeoutError:
+                print(f"[WARN] No data for {self.heartbeat_timeout}s; reconnecting")
+                return True
+            if not await self._handle_message(data):
+                return False
+
+    async def _handle_message(self, data):
+        """Process one WebSocket message. Returns False when the server asked us to disconnect."""
+        if isinstance(data, str):
+            data = data.encode()
+        if self.capture is not None:
+            self.capture.write_raw(data)
+        frames = iter_frames(data)
+        while True:
+            try:
+                frame = next(frames, None)
+            except FRAME_ERRORS as e:
+                # the frames before the bad one are handled; the rest of the message is lost
+                self.stats['bad_messages'] += 1
+                print(f"[ERROR] Dropping rest of malformed message ({len(data)} bytes): {e!r}")
+                return True
+            if frame is None:
+                return True
+            msg_id, ref_id, payload = frame
+            self.stats['messages'] += 1
+            self.last_message_id = msg_id
+            if ref_id.startswith('_'):
+                if not await self._handle_control(ref_id, payload):
+                    return False
+            elif ref_id == PRICE_REFERENCE:
+                await self._handle_prices(payload)
+
+    # ---------------------------------------------------------------- run loop
+    async def _reader(self):
         self.connect()
-        # Example: simulate incoming ticks
-        import datetime, time
-        for i in range(5):
-            tick = {
-                'timestamp': datetime.datetime.now().isoformat(),
-                'bid': 1.1 + i*0.001,
-                'ask': 1.1 + i*0.001 + 0.0001,
-                'volume': 100 + i
-            }
-            self.store.insert_tick(tick)
-            self.callback(tick)
-            time.sleep(1)
+        backoff = min(1.0, self.max_backoff)
+        while not self._stopping:
+            try:
+                async with websockets.connect(
+                    self._url(),
+                    additional_headers={'Authorization': f"Bearer {self.token()}"},
+                    max_size=None,
+                ) as ws:
+                    print(f"[INFO] Connected to {self.endpoint}")
+                    await self._resubscribe()
+                    backoff = min(1.0, self.max_backoff)
+                    resume = await self._read(ws)
+            except (OSError, websockets.WebSocketException) as e:
+                print(f"[WARN] Stream connection lost: {e}")
+                resume = True
+            except Exception as e:
+                # e.g. a failing resubscribe: treat it as a dropped connection
+                # and back off, instead of ending the reader (and run())
+                self.stats['errors'] += 1
+                print(f"[ERROR] Stream failed: {e!r}; reconnecting")
+                resume = True
+            if self._stopping:
+                break
+            if not resume:
+                self.connect()            # server asked for a fresh context
+            self.stats['reconnects'] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _consumer(self):
+        callback = self.callback
+        is_async = inspect.iscoroutinefunction(callback)
+        while True:
+            tick = await self.queue.get()
+            if tick is None:
+                return
+            try:
+                if is_async:
+                    await callback(tick)
+                else:
+                    callback(tick)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"[ERROR] on_tick failed for {tick.symbol} {tick.timestamp}: {e}")
+
+    async def run_async(self, duration=None):
+        """Stream until cancelled (or for `duration` seconds), feeding on_tick."""
+        if self.callback is None:
+            raise RuntimeError("SaxoCollector.on_tick() must be called before run()")
+        self.queue = TickQueue(self.queue_size, self.queue_policy)
+        self._stopping = False
+        reader = asyncio.create_task(self._reader())
+        consumer = asyncio.create_task(self._consumer())
+        try:
+            if duration is None:
+                await asyncio.gather(reader, consumer)
+            else:
+                await asyncio.sleep(duration)
+        finally:
+            self._stopping = True
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+            # let the consumer finish what is already queued
+            if not consumer.done():
+                await self.queue.close()
+                await asyncio.wait_for(asyncio.gather(consumer, return_exceptions=True), 5.0)
+
+    async def replay_async(self, messages):
+        """
+        Feed recorded raw messages (bytes, or (recv_ns, bytes) as yielded by
+        CaptureReader.raw()) through frame parsing to on_tick, without a
+        connection. Subscription resets are acknowledged but not re-sent.
+        """
+        if self.callback is None:
+            raise RuntimeError("SaxoCollector.on_tick() must be called before replay")
+        self.queue = TickQueue(self.queue_size, 'block')
+        subscribe, self._subscribe = self._subscribe, lambda context_id, reference_id: {}
+        consumer = asyncio.create_task(self._consumer())
+        try:
+            for message in messages:
+                await self._handle_message(message[1] if isinstance(message, tuple) else message)
+        finally:
+            self._subscribe = subscribe
+            await self.queue.close()
+            await consumer
+
+    def run(self):
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,268 @@
+# collector/synthetic.py
+
+"""
+Synthetic FX tick streams for load tests and benchmarks.
+
+SyntheticTicks generates ticks in vectorized chunks of NumPy columns
+(timestamp as epoch ns, bid, ask, volume, bid_size, ask_size), so streams
+of any length are produced and written in constant memory:
+
+    arrivals   Poisson with an intraday intensity profile: `rate` ticks per
+               second on average over the open hours, busiest in the
+               London/New York overlap, quietest in the late Asian session.
+               FX is closed from Friday 17:00 to Sunday 17:00 New York
+               time (collector.market_hours) unless weekends=True. Arrival times are drawn in "activity time"
+               and mapped to clock time by inverting the cumulative
+               intensity, which is piecewise linear per hour.
+    mid        geometric Brownian motion in activity time (volatility is
+               annualized and scales with activity, so quiet hours move
+               less), plus optional Merton jumps (jump_intensity per day).
+    spread     lognormal around `spread`, wider in quiet hours; bid and ask
+               are rounded to `decimals` and kept at least one point apart.
+    sizes      lognormal top-of-book sizes in lots of 100k, larger in busy
+               hours; volume = bid_size + ask_size, as the Saxo collector
+               reports it.
+
+Each component draws from its own random stream, so the same seed and
+parameters give the same ticks whatever the chunk size (timestamps to
+within nanosecond rounding at chunk boundaries). write_ticks() sends a
+stream to SQLite, Postgres, CSV, the feed capture format
+(collector.capture) or the columnar archive.
+"""
+
+import csv
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from aggregator.records import Tick
+from aggregator.resample import epoch_ns_to_iso, to_epoch_ns
+from collector.market_hours import fx_closed
+
+FORMATS = ('sqlite', 'postgres', 'csv', 'capture', 'archive')
+NS_PER_SECOND = 1_000_000_000
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+SECONDS_PER_YEAR = 365 * 86_400
+LOT = 100_000
+
+# relative tick intensity per UTC hour (mean 1): Asia, London open,
+# London/New York overlap peaking around 13-15 UTC, New York afternoon
+INTRADAY_PROFILE = np.array([
+    0.45, 0.45, 0.45, 0.55, 0.6, 0.65, 0.85, 1.2, 1.45, 1.4, 1.3, 1.25,
+    1.4, 1.75, 1.9, 1.75, 1.45, 1.15, 0.9, 0.75, 0.6, 0.5, 0.4, 0.4,
+])
+INTRADAY_PROFILE = INTRADAY_PROFILE / INTRADAY_PROFILE.mean()
+
+
+class SyntheticTicks:
+    def __init__(self, symbol='EURUSD', start=datetime(2024, 1, 1), price=1.1, rate=10.0,
+                 volatility=0.08, drift=0.0, jump_intensity=0.0, jump_size=0.002,
+                 spread=0.00008, spread_volatility=0.3, decimals=5, mean_size=2.0,
+                 weekends=False, profile=INTRADAY_PROFILE, seed=None):
+        """
+        rate is ticks per second averaged over open hours; volatility and
+        drift are annualized; jump_size is the standard deviation of the log
+        jump; spread is the mean spread in price units; mean_size is the
+        median top-of-book size in lots.
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.symbol = symbol
+        self.rate = rate
+        self.volatility = volatility
+        self.drift = drift
+        self.jump_intensity = jump_intensity
+        self.jump_size = jump_size
+        self.spread = spread
+        self.spread_volatility = spread_volatility
+        self.decimals = decimals
+        self.mean_size = mean_size
+        self.weekends = weekends
+        self.profile = np.asarray(profile, dtype=np.float64)
+        if self.profile.shape != (24,):
+            raise ValueError("profile needs one weight per UTC hour (24 values)")
+        (self._arrival_rng, self._move_rng, self._jump_rng, self._jump_size_rng,
+         self._spread_rng, self._size_rng) = [
+            np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(6)
+        ]
+        # stream position carried across chunks
+        self._now = int(to_epoch_ns([start])[0])
+        self._log_mid = float(np.log(price))
+
+    # ---------------------------------------------------------------- intensity
+    def _hour_weights(self, hours):
+        """Tick intensity weight of each absolute hour index (epoch hours)."""
+        w = self.profile[hours % 24]
+        if not self.weekends:
+            # the close starts and ends on a whole UTC hour (New York is on whole-hour offsets)
+            w = np.where(fx_closed(hours * NS_PER_HOUR), 0.0, w)
+        return w
+
+    def _arrivals(self, n):
+        """n arrival times (epoch ns), their activity-time gaps and hour weights."""
+        # arrivals are memoryless, so each chunk starts fresh at the last
+        # arrival: unit-rate gaps in activity time, where one clock second
+        # of an hour with weight w holds rate * w units
+        gaps = self._arrival_rng.exponential(1.0, n)
+        activity = np.cumsum(gaps)
+        now = self._now
+        first = now // NS_PER_HOUR
+        span = int(activity[-1] / (self.rate * 3600)) + 48
+        while True:
+            hours = np.arange(first, first + span, dtype=np.int64)
+            # clock knots (ns after `now`): now, then every following hour start
+            clock = np.maximum((hours - first) * NS_PER_HOUR - (now - first * NS_PER_HOUR), 0)
+            clock = np.append(clock, clock[-1] + NS_PER_HOUR).astype(np.float64)
+            units = self._hour_weights(hours) * self.rate * np.diff(clock) / NS_PER_SECOND
+            knots = np.concatenate(([0.0], np.cumsum(units)))
+            if knots[-1] > activity[-1]:
+                break
+            span *= 2
+        # invert the piecewise linear cumulative activity; side='right' skips
+        # closed (zero-width) hours
+        idx = np.searchsorted(knots, activity, side='right') - 1
+        frac = (activity - knots[idx]) / (knots[idx + 1] - knots[idx])
+        offset = clock[idx] + frac * (clock[idx + 1] - clock[idx])
+        ts = now + np.rint(offset).astype(np.int64)
+        self._now = int(ts[-1])
+        return ts, gaps, self._hour_weights(hours[idx])
+
+    # ---------------------------------------------------------------- prices
+    def chunk(self, n):
+        """The next n ticks as a dict of columns."""
+        ts, gaps, weight = self._arrivals(n)
+
+        # GBM in activity time: one unit of activity is 1/rate seconds at
+        # average intensity, so volatility tracks the tick rate
+        dt = gaps / self.rate / SECONDS_PER_YEAR
+        sigma = self.volatility
+        steps = (self.drift - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * self._move_rng.standard_normal(n)
+        if self.jump_intensity:
+            # counts and sizes come from separate streams, one draw per tick
+            # each, so the stream does not depend on where chunks end
+            jumps = self._jump_rng.poisson(self.jump_intensity * gaps / self.rate / 86_400.0)
+            sizes = self._jump_size_rng.standard_normal(n)
+            steps += self.jump_size * np.sqrt(jumps) * sizes
+        log_mid = self._log_mid + np.cumsum(steps)
+        self._log_mid = float(log_mid[-1])
+        mid = np.exp(log_mid)
+
+        quiet = 1.0 / np.sqrt(np.maximum(weight, 0.05))
+        s = self.spread_volatility
+        spread = self.spread * quiet * np.exp(s * self._spread_rng.standard_normal(n) - 0.5 * s * s)
+        point = 10.0 ** -self.decimals
+        bid = np.round(mid - spread / 2, self.decimals)
+        ask = np.maximum(np.round(mid + spread / 2, self.decimals), bid + point)
+
+        scale = self.mean_size * np.sqrt(weight)
+        sizes = self._size_rng.lognormal(0.0, 0.6, (n, 2))
+        bid_size = np.maximum(np.round(scale * sizes[:, 0]), 1.0) * LOT
+        ask_size = np.maximum(np.round(scale * sizes[:, 1]), 1.0) * LOT
+        return {
+            'symbol': self.symbol,
+            'timestamp': ts,
+            'bid': bid,
+            'ask': ask,
+            'volume': bid_size + ask_size,
+            'bid_size': bid_size,
+            'ask_size': ask_size,
+        }
+
+    def chunks(self, total, chunk_size=1_000_000):
+        """Yield `total` ticks as column chunks of at most chunk_size."""
+        while total > 0:
+            n = min(chunk_size, total)
+            yield self.chunk(n)
+            total -= n
+
+    def ticks(self, total, chunk_size=100_000):
+        """Yield Tick objects with ISO timestamps, as the collector emits them."""
+        for c in self.chunks(total, chunk_size):
+            for row in zip(epoch_ns_to_iso(c['timestamp']), c['bid'].tolist(), c['ask'].tolist(),
+                           c['volume'].tolist(), c['bid_size'].tolist(), c['ask_size'].tolist()):
+                ts, bid, ask, volume, bs, as_ = row
+                yield Tick(ts, self.symbol, bid, ask, volume, bs, as_)
+
+
+# ---------------------------------------------------------------- writers
+def _write_csv(chunks, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(('timestamp', 'symbol', 'bid', 'ask', 'volume', 'bid_size', 'ask_size'))
+        for c in chunks:
+            n = len(c['timestamp'])
+            writer.writerows(zip(epoch_ns_to_iso(c['timestamp']), [c['symbol']] * n,
+                                 c['bid'].tolist(), c['ask'].tolist(), c['volume'].tolist(),
+                                 c['bid_size'].tolist(), c['ask_size'].tolist()))
+            yield n
+
+
+def _write_capture(chunks, directory):
+    from collector.capture import CaptureWriter, encode_columns
+    with CaptureWriter(directory) as writer:
+        for c in chunks:
+            block = encode_columns(c)
+            writer.flush()                   # at most one block queued while the next is built
+            writer.write_block(block)
+            yield len(block)
+
+
+def _write_store(chunks, store):
+    for c in chunks:
+        store.insert_columns(c)
+        yield len(c['timestamp'])
+
+
+def sqlite_store(path):
+    """SqliteStore at `path`, with the tick table created if missing."""
+    from storage.store import SqliteStore
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    store = SqliteStore(path)
+    with store.lock:
+        store.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pricesandvolume "
+            "(timestamp TEXT, bid REAL, ask REAL, volume REAL, symbol TEXT NOT NULL DEFAULT '')"
+        )
+        store.conn.commit()
+    return store
+
+
+def write_ticks(chunks, fmt, out=None, store=None, progress=None):
+    """
+    Write column chunks to `fmt`: 'csv' (file `out`), 'capture' (capture
+    directory `out`), 'archive' (archive root `out`), 'sqlite' (database
+    file `out`) or 'postgres' (`store`, a PostgresStore). `progress(n, elapsed)`
+    is called after every chunk. Returns the number of ticks written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+    if fmt == 'postgres':
+        if store is None:
+            raise ValueError("postgres output needs a store")
+        written = _write_store(chunks, store)
+    elif out is None:
+        raise ValueError(f"{fmt} output needs a path")
+    elif fmt == 'csv':
+        written = _write_csv(chunks, out)
+    elif fmt == 'capture':
+        written = _write_capture(chunks, out)
+    elif fmt == 'archive':
+        from storage.archive import TickArchiveStore
+        written = _write_store(chunks, TickArchiveStore(out))
+    else:
+        written = _write_store(chunks, store or sqlite_store(out))
+
+    total = 0
+    t0 = time.perf_counter()
+    for n in written:
+        total += n
+        if progress:
+            progress(total, time.perf_counter() - t0)
+    return total
@@ -0,0 +1,81 @@
+# collector/tick_queue.py
+
+"""
+Bounded asyncio queue between a feed reader and its consumers.
+
+What happens when consumers fall behind and the queue is full is an explicit
+policy:
+
+    block        the reader waits for space; nothing is lost, the socket
+                 stops being read and the server buffers (or disconnects us)
+    drop_oldest  the oldest queued tick is discarded to make room; consumers
+                 always see the freshest prices
+    drop_newest  the incoming tick is discarded; the queued backlog is kept
+
+Dropped ticks are counted in `dropped`, and the first drop after a quiet
+period is printed, so overload is visible without flooding the log.
+"""
+
+import asyncio
+
+POLICIES = ('block', 'drop_oldest', 'drop_newest')
+
+
+class TickQueue:
+    def __init__(self, maxsize=10_000, policy='block'):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}; expected one of {POLICIES}")
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.high_water = 0
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._warned = False
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    async def put(self, item):
+        """Enqueue according to the policy. Returns False if a tick was dropped."""
+        q = self._queue
+        if self.policy == 'block':
+            await q.put(item)
+            self._note_size()
+            return True
+        if not q.full():
+            q.put_nowait(item)
+            self._note_size()
+            return True
+        self._drop()
+        if self.policy == 'drop_oldest':
+            q.get_nowait()
+            q.task_done()
+            q.put_nowait(item)
+        return False
+
+    async def get(self):
+        item = await self._queue.get()
+        self._queue.task_done()
+        if self._queue.empty():
+            self._warned = False
+        return item
+
+    def get_nowait(self):
+        item = self._queue.get_nowait()
+        self._queue.task_done()
+        return item
+
+    async def close(self):
+        """Queue the None end marker behind everything already queued (never dropped)."""
+        await self._queue.put(None)
+
+    def _note_size(self):
+        size = self._queue.qsize()
+        if size > self.high_water:
+            self.high_water = size
+
+    def _drop(self):
+        self.dropped += 1
+        if not self._warned:
+            self._warned = True
+            print(f"[WARN] Tick queue full ({self.maxsize}), policy {self.policy}: dropping ticks")
@@ -3,12 +3,14 @@ from setuptools import setup, find_packages
 setup(
     name='forex_bot',
     version='0.1.0',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=[
         'typer',
         'pydantic',
         'PyYAML',
         'numpy',
+        'requests',
+        'websockets>=14',
     ],
     entry_points={
         'console_scripts': [
@@ -0,0 +1,240 @@
+# storage/archive.py
+
+"""
+Columnar on-disk tick archive.
+
+Ticks are appended to one raw little-endian file per column, per symbol and
+per UTC day:
+
+    <root>/<symbol>/<YYYY-MM-DD>/timestamp.i8   int64 epoch nanoseconds
+                                 bid.f8         float64
+                                 ask.f8         float64
+                                 volume.f8      float64
+
+Files have no header, so a day is read back with np.memmap and the result of
+fetch_ticks() is a dict of NumPy column views rather than a list of row
+tuples. Ticks are expected to arrive in timestamp order within a day (as the
+collector produces them); range lookups use searchsorted on that order.
+
+compact() re-encodes closed days into one storage.tickcodec file per day,
+
+    <root>/<symbol>/<YYYY-MM-DD>/ticks.fxtk
+
+with prices in pipettes, microsecond timestamps and whole-unit volume, and
+removes the raw column files. Compacted days read back as decoded arrays
+instead of memmaps; ticks appended to a day after it was compacted stay in
+raw columns and are merged in on read (and on the next compact()).
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from aggregator.resample import to_epoch_ns
+from storage.store import IStore
+from storage.tickcodec import TickFileReader, encode_ticks
+
+COLUMNS = (
+    ('timestamp', '<i8'),
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('volume', '<f8'),
+)
+NS_PER_DAY = 86_400 * 1_000_000_000
+COMPACT_FILE = 'ticks.fxtk'
+
+
+def pip_scale_for(symbol):
+    """Pipettes per price unit: 1000 for JPY pairs (3 decimals), else 100000."""
+    return 1_000 if 'JPY' in (symbol or '').upper() else 100_000
+
+
+def _day_name(day_index):
+    return (datetime(1970, 1, 1) + timedelta(days=int(day_index))).strftime('%Y-%m-%d')
+
+
+def _column_file(path, name, dtype):
+    return os.path.join(path, f"{name}.{dtype[1:]}")
+
+
+def _empty():
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+class TickArchiveStore(IStore):
+    def __init__(self, root, symbol='default'):
+        self.root = root
+        self.symbol = symbol
+        os.makedirs(root, exist_ok=True)
+
+    def to_db_time(self, dt):
+        return int(to_epoch_ns([dt])[0])
+
+    def _tick_columns(self):
+        # every symbol has its own directory, so ticks always keep their symbol
+        return ['symbol'] + [name for name, _ in COLUMNS]
+
+    # ---------------------------------------------------------------- writes
+    def insert_tick(self, tick):
+        self.insert_ticks([tick])
+
+    def insert_ticks(self, ticks):
+        by_symbol = {}
+        for t in ticks:
+            by_symbol.setdefault(t.get('symbol') or self.symbol, []).append(t)
+        for symbol, rows in by_symbol.items():
+            self.append_columns(
+                symbol,
+                timestamp=[t['timestamp'] for t in rows],
+                bid=[t['bid'] for t in rows],
+                ask=[t['ask'] for t in rows],
+                volume=[t['volume'] or 0.0 for t in rows],
+            )
+
+    def insert_columns(self, cols):
+        self.append_columns(cols.get('symbol') or self.symbol, cols['timestamp'], cols['bid'],
+                            cols['ask'], np.nan_to_num(cols['volume']))
+
+    def append_columns(self, symbol, timestamp, bid, ask, volume):
+        """Append whole columns at once (the fast path for bulk imports)."""
+        cols = {
+            'timestamp': to_epoch_ns(timestamp),
+            'bid': np.asarray(bid, dtype='<f8'),
+            'ask': np.asarray(ask, dtype='<f8'),
+            'volume': np.asarray(volume, dtype='<f8'),
+        }
+        days = cols['timestamp'] // NS_PER_DAY
+        if days.size == 0:
+            return
+        bounds = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            path = self._day_dir(symbol, _day_name(days[lo]))
+            os.makedirs(path, exist_ok=True)
+            for name, dtype in COLUMNS:
+                with open(_column_file(path, name, dtype), 'ab') as f:
+                    f.write(np.ascontiguousarray(cols[name][lo:hi], dtype=dtype).tobytes())
+
+    # ---------------------------------------------------------------- reads
+    def _day_dir(self, symbol, day):
+        return os.path.join(self.root, symbol, day)
+
+    def days(self, symbol=None):
+        """Sorted list of archived days ('YYYY-MM-DD') for a symbol."""
+        path = os.path.join(self.root, symbol or self.symbol)
+        if not os.path.isdir(path):
+            return []
+        return sorted(d for d in os.listdir(path) if len(d) == 10)
+
+    def read_day(self, day, symbol=None):
+        """
+        Columns for one day: memory-mapped raw columns, decoded ones for a
+        compacted day; empty arrays if it is missing.
+        """
+        path = self._day_dir(symbol or self.symbol, day)
+        raw = self._read_raw(path)
+        compact = self._read_compact(path, raw_left=len(raw['timestamp']) > 0)
+        if compact is None:
+            return raw
+        if not len(raw['timestamp']):
+            return compact
+        cols = {name: np.concatenate((compact[name], raw[name])) for name, _ in COLUMNS}
+        if np.any(np.diff(cols['timestamp']) < 0):
+            order = np.argsort(cols['timestamp'], kind='stable')
+            cols = {name: col[order] for name, col in cols.items()}
+        return cols
+
+    @staticmethod
+    def _read_raw(path):
+        cols = {}
+        for name, dtype in COLUMNS:
+            fname = _column_file(path, name, dtype)
+            if not os.path.exists(fname) or os.path.getsize(fname) == 0:
+                return _empty()
+            cols[name] = np.memmap(fname, dtype=dtype, mode='r')
+        # a crash between column appends can leave columns of unequal length
+        n = min(len(c) for c in cols.values())
+        return {name: col[:n] for name, col in cols.items()}
+
+    @staticmethod
+    def _read_compact(path, raw_left):
+        fname = os.path.join(path, COMPACT_FILE)
+        # compact() writes <file>.new before it removes the raw columns; it
+        # replaces the old file only once they are gone
+        if not raw_left and os.path.exists(fname + '.new'):
+            fname += '.new'
+        if not os.path.exists(fname):
+            return None
+        cols = TickFileReader(fname).read()
+        return {name: np.ascontiguousarray(cols[name], dtype=dtype) for name, dtype in COLUMNS}
+
+    def compact(self, before, symbol=None, pip_scale=None):
+        """
+        Re-encode every day before `before` (anything to_epoch_ns accepts,
+        floored to its day) into a compact tick file and drop its raw
+        columns. pip_scale defaults to pip_scale_for(symbol); prices must be
+        whole pipettes at that scale. Returns (days, bytes before, bytes after).
+        """
+        symbol = symbol or self.symbol
+        scale = pip_scale or pip_scale_for(symbol)
+        last = _day_name(int(to_epoch_ns([before])[0]) // NS_PER_DAY)
+        done = raw_bytes = compact_bytes = 0
+        for day in self.days(symbol):
+            if day >= last:
+                break
+            path = self._day_dir(symbol, day)
+            target = os.path.join(path, COMPACT_FILE)
+            raw = self._read_raw(path)
+            if not len(raw['timestamp']):
+                if os.path.exists(target + '.new'):
+                    os.replace(target + '.new', target)     # finish an interrupted run
+                continue
+            cols = self.read_day(day, symbol)
+            before_size = sum(os.path.getsize(_column_file(path, name, dtype)) for name, dtype in COLUMNS)
+            if os.path.exists(target):
+                before_size += os.path.getsize(target)
+            size = encode_ticks(target + '.new', cols['timestamp'], cols['bid'], cols['ask'],
+                                cols['volume'], pip_scale=scale)
+            del raw, cols
+            # the timestamp column goes first: from then on the day reads from <file>.new
+            for name, dtype in COLUMNS:
+                os.remove(_column_file(path, name, dtype))
+            os.replace(target + '.new', target)
+            done += 1
+            raw_bytes += before_size
+            compact_bytes += size
+        return done, raw_bytes, compact_bytes
+
+    def _day_slices(self, since, until, symbol):
+        lo = int(to_epoch_ns([since])[0])
+        hi = int(to_epoch_ns([until])[0]) if until is not None else None
+        first = _day_name(lo // NS_PER_DAY)
+        last = _day_name((hi - 1) // NS_PER_DAY) if hi is not None else None
+        for day in self.days(symbol):
+            if day < first or (last is not None and day > last):
+                continue
+            cols = self.read_day(day, symbol)
+            ts = cols['timestamp']
+            a = np.searchsorted(ts, lo, side='left')
+            b = np.searchsorted(ts, hi, side='left') if hi is not None else len(ts)
+            if b > a:
+                yield {name: col[a:b] for name, col in cols.items()}
+
+    def fetch_ticks(self, since, until=None, symbol=None):
+        """
+        Ticks with since <= timestamp (< until, if given) as a dict of
+        NumPy columns. Single-day ranges are zero-copy memmap slices.
+        """
+        parts = list(self._day_slices(since, until, symbol))
+        if not parts:
+            return _empty()
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([p[name] for p in parts]) for name, _ in COLUMNS}
+
+    def fetch_ticks_iter(self, since, until=None, chunk_size=100_000, symbol=None):
+        """Like fetch_ticks(), one day at a time in memmap slices of at most chunk_size rows."""
+        for cols in self._day_slices(since, until, symbol):
+            n = len(cols['timestamp'])
+            for lo in range(0, n, chunk_size):
+                yield {name: col[lo:lo + chunk_size] for name, col in cols.items()}
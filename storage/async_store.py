@@ -0,0 +1,195 @@
+# storage/async_store.py
+
+"""
+asyncio front-end for the synchronous stores.
+
+AsyncStore wraps an IStore so that an asyncio collector can await storage
+without ever blocking the event loop:
+
+    async with AsyncStore(store) as astore:
+        await astore.write(tick)                 # returns once queued
+        await astore.insert_ticks(ticks)         # returns once committed
+        async for chunk in astore.fetch_ticks_iter(since):
+            ...
+
+All writes run on one dedicated writer thread, so SQLite sees a single
+writer and a Postgres connection is never used by two threads at once.
+write() only puts the tick on a bounded asyncio.Queue; a background task
+collects it into batches (batch_size ticks or flush_interval seconds) and
+hands each batch to the writer thread. A slow
+commit therefore delays only the next batch, never tick handling, until
+max_pending ticks are waiting and write() starts applying backpressure.
+
+Reads run on a separate thread pool against `reader` (default: the same
+store). Postgres streams through a server-side cursor that a commit would
+close, so open_async_store() gives it its own pooled reader connection.
+With close_stores=True (as open_async_store() sets it) close() also closes
+the store and the reader, returning pooled connections.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+_STOP = object()
+
+
+class AsyncStore:
+    def __init__(self, store, reader=None, batch_size=1000, flush_interval=0.25,
+                 max_pending=100_000, read_workers=2, close_stores=False):
+        self.store = store
+        self.reader = reader or store
+        self.close_stores = close_stores
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-store-writer')
+        self._readers = ThreadPoolExecutor(max_workers=read_workers,
+                                           thread_name_prefix='async-store-reader')
+        self._queue = None
+        self._drainer = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---------------------------------------------------------------- writes
+    async def start(self):
+        """Start the background batching task (needs a running loop)."""
+        if self._drainer is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._drainer = asyncio.get_running_loop().create_task(self._drain())
+
+    @property
+    def pending(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def write(self, tick):
+        """Queue a tick for batched persistence; only waits when max_pending is reached."""
+        if self._drainer is None:
+            await self.start()
+        await self._queue.put(tick)
+
+    async def insert_ticks(self, ticks):
+        """Persist `ticks` on the writer thread and wait for the commit."""
+        ticks = list(ticks)
+        if ticks:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._writer, self.store.insert_ticks, ticks)
+
+    async def insert_tick(self, tick):
+        await self.insert_ticks([tick])
+
+    async def flush(self):
+        """Wait until every tick queued with write() so far is committed."""
+        if self._drainer is None:
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put(done)
+        await done
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            item = await self._queue.get()
+            batch, waiters = [], []
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, asyncio.Future):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if batch:
+                await self._persist(batch)
+            for w in waiters:
+                if not w.done():
+                    w.set_result(None)
+
+    async def _persist(self, batch):
+        try:
+            await self.insert_ticks(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERROR] Failed to persist batch of {len(batch)} ticks: {e}")
+
+    # ---------------------------------------------------------------- reads
+    async def fetch_ticks_iter(self, since, until=None, chunk_size=10_000):
+        """Async version of IStore.fetch_ticks_iter; each chunk is fetched off the loop."""
+        loop = asyncio.get_running_loop()
+        it = await loop.run_in_executor(
+            self._readers, lambda: self.reader.fetch_ticks_iter(since, until, chunk_size)
+        )
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self._readers, next, it, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            await loop.run_in_executor(self._readers, it.close)
+
+    async def fetch_ticks(self, since):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self.reader.fetch_ticks, since)
+
+    # ---------------------------------------------------------------- shutdown
+    async def close(self):
+        """
+        Flush queued ticks, then stop the batching task and worker threads
+        (and close the stores, with close_stores).
+        """
+        if self._drainer is not None:
+            await self._queue.put(_STOP)
+            await self._drainer
+            self._drainer = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._writer.shutdown)
+        await loop.run_in_executor(None, self._readers.shutdown)
+        if self.close_stores:
+            if self.reader is not self.store:
+                self.reader.close()
+            self.store.close()
+
+
+def open_async_store(spill_dir='data/spill', **kwargs):
+    """
+    AsyncStore over get_store(), with failed batches retried and spilled to
+    `spill_dir` (storage.spill) instead of dropped. On Postgres, reads get a
+    second pooled connection so a streaming read never shares a transaction
+    with writes. Closing the AsyncStore gives both connections back.
+    """
+    from storage.spill import SpillingStore
+    from storage.store import PostgresStore, get_store
+    store = get_store()
+    reader = None
+    if isinstance(store, PostgresStore):
+        from storage.pool import get_manager
+        manager = get_manager()
+        reader = PostgresStore(None, conn=manager.acquire(), pool=manager)
+    return AsyncStore(SpillingStore(store, spill_dir), reader=reader or store,
+                      close_stores=True, **kwargs)
@@ -0,0 +1,249 @@
+# storage/candle_cache.py
+
+"""
+Read-through cache for candle tables.
+
+Candles loaded with load_candle_columns() are kept per (table, symbol) in
+memory and as .npz files on disk. A later request only queries rows from the
+newest cached bar onwards; that bar is fetched again because the
+materializer rewrites the trailing partial bar. The reply is spliced onto
+the cached columns. Requests that reach further back than the cache fetch
+only the missing head. In-memory entries are evicted least-recently-used
+once their total size exceeds memory_budget bytes; the disk copy stays, so
+an evicted table costs a file read plus a tail query, not a full reload.
+
+Writers that change bars other than the trailing one (the materializer
+re-resampling a chunk, sync-history back-filling a gap) call invalidate()
+with the earliest time they touched. That appends a line to the table's
+change log, `<table>.changes`, which every cache sharing cache_dir reads on
+its next get(): cached bars from that time on are dropped and fetched again
+by the tail query. Each entry remembers how far into the log it has read.
+The log is started afresh, under a new generation header, once it exceeds
+max_log_bytes; entries that read an older generation are reloaded in full.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from storage.indicators import CANDLE_FIELDS, load_candle_columns
+
+_COLUMNS = ('time',) + CANDLE_FIELDS
+_ALL = '*'                 # change log symbol for writes to a table without symbols
+
+
+def _nbytes(cols):
+    return sum(c.nbytes for c in cols.values())
+
+
+def _concat(a, b):
+    return {k: np.concatenate((a[k], b[k])) for k in _COLUMNS}
+
+
+def _as_time(value):
+    return np.datetime64(value, 'us') if value is not None else None
+
+
+class CandleCache:
+    def __init__(self, cache_dir='data/candle_cache', memory_budget=256 * 1024 * 1024,
+                 max_log_bytes=1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.max_log_bytes = max_log_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()     # (table, symbol) -> {'cols', 'start', 'log'}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ---------------------------------------------------------------- disk
+    def _path(self, table, symbol):
+        return os.path.join(self.cache_dir, f"{table}__{symbol or '_'}.npz")
+
+    def _load_disk(self, table, symbol):
+        path = self._path(table, symbol)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            cols = {k: data[k] for k in _COLUMNS}
+            start = data['start'][0] if data['has_start'][0] else None
+            log = (str(data['log_gen'][0]), int(data['log_size'][0])) if 'log_gen' in data else None
+        return {'cols': cols, 'start': start, 'log': log}
+
+    def _save_disk(self, table, symbol, entry):
+        path = self._path(table, symbol)
+        tmp = path + '.tmp'
+        start = entry['start']
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f, **entry['cols'],
+                start=np.array([start if start is not None else 0], dtype='datetime64[us]'),
+                has_start=np.array([start is not None]),
+                log_gen=np.array([entry['log'][0]]),
+                log_size=np.array([entry['log'][1]], dtype=np.int64),
+            )
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------------------- public
+    def get(self, conn, table, symbol=None, since=None, until=None, limit=None, refresh=True):
+        """
+        Candles for `table` as load_candle_columns() would return them,
+        served from the cache after fetching only the rows it is missing.
+        refresh=False skips the tail query (for frozen historical windows).
+        """
+        key = (table, symbol)
+        since_t = _as_time(since)
+        entry = self._entries.pop(key, None) or self._load_disk(table, symbol)
+        dropped = False
+        if entry is not None:
+            dropped = self._apply_changes(table, symbol, entry)
+            if dropped is None:
+                entry = None                 # the change log was restarted
+        changed = bool(dropped)
+
+        if entry is None:
+            self.misses += 1
+            # read the log position first: changes made during the load are applied next time
+            log = self._log_position(table)
+            entry = {'cols': load_candle_columns(conn, table, since=since, symbol=symbol),
+                     'start': since_t, 'log': log}
+            changed = True
+        else:
+            self.hits += 1
+            cols = entry['cols']
+            if entry['start'] is not None and (since_t is None or since_t < entry['start']):
+                head = load_candle_columns(conn, table, since=since, until=entry['start'].item(),
+                                           symbol=symbol)
+                entry['cols'] = cols = _concat(head, cols)
+                entry['start'] = since_t
+                changed = True
+            # bars dropped by a change log entry are refetched even with refresh=False
+            if refresh or dropped:
+                changed |= self._refresh_tail(conn, table, symbol, entry)
+
+        self._entries[key] = entry
+        if changed:
+            self._save_disk(table, symbol, entry)
+        self._evict(keep=key)
+        return self._slice(entry['cols'], since_t, _as_time(until), limit)
+
+    def invalidate(self, table, symbol=None, since=None):
+        """
+        Record that bars of `table` from `since` on (all of them if None)
+        changed, for `symbol` or, if None, every symbol. Takes effect on the
+        next get() of every cache using this cache_dir.
+        """
+        path = self._log_path(table)
+        if not os.path.exists(path):
+            self._new_log(path, replace=False)
+        elif os.path.getsize(path) > self.max_log_bytes:
+            self._new_log(path, replace=True)
+        since = '' if since is None else str(_as_time(since))
+        # one short O_APPEND write, so concurrent writers never interleave lines
+        with open(path, 'a') as f:
+            f.write(f"{symbol or _ALL}\t{since}\n")
+
+    @property
+    def memory_used(self):
+        return sum(_nbytes(e['cols']) for e in self._entries.values())
+
+    # ---------------------------------------------------------------- change log
+    def _log_path(self, table):
+        return os.path.join(self.cache_dir, f"{table}.changes")
+
+    @staticmethod
+    def _new_log(path, replace):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"{time.time_ns()}-{os.getpid()}\n")
+        if replace:
+            os.replace(tmp, path)
+            return
+        try:
+            os.link(tmp, path)           # never clobbers a log another writer just created
+        except FileExistsError:
+            pass
+        os.remove(tmp)
+
+    def _log_position(self, table):
+        """(generation, size) of the change log: where an entry built now starts reading."""
+        try:
+            with open(self._log_path(table)) as f:
+                return (f.readline().strip(), os.fstat(f.fileno()).st_size)
+        except FileNotFoundError:
+            return ('', 0)
+
+    def _apply_changes(self, table, symbol, entry):
+        """
+        Drop the cached bars that writers changed since the entry last read
+        the change log. Returns whether the entry changed, or None if it has
+        to be reloaded in full.
+        """
+        gen, size = self._log_position(table)
+        seen = entry.get('log') or ('', 0)
+        if (gen, size) == seen:
+            return False
+        if (seen[0] and gen != seen[0]) or size < seen[1]:
+            return None
+        with open(self._log_path(table), 'rb') as f:
+            f.seek(seen[1])
+            data = f.read(size - seen[1])
+        data = data[:data.rfind(b'\n') + 1]     # a line still being written is read next time
+        lines = data.decode().splitlines()
+        if not seen[0]:
+            lines = lines[1:]                # the entry predates the log: skip its header
+        entry['log'] = (gen, seen[1] + len(data))
+        cutoff = None
+        for line in lines:
+            who, _, since = line.partition('\t')
+            if symbol is not None and who not in (symbol, _ALL):
+                continue
+            if not since:
+                return None
+            t = np.datetime64(since, 'us')
+            cutoff = t if cutoff is None else min(cutoff, t)
+        if cutoff is not None:
+            keep = np.searchsorted(entry['cols']['time'], cutoff, side='left')
+            entry['cols'] = {k: v[:keep] for k, v in entry['cols'].items()}
+        return True
+
+    # ---------------------------------------------------------------- helpers
+    def _refresh_tail(self, conn, table, symbol, entry):
+        cols = entry['cols']
+        if not len(cols['time']):
+            tail = load_candle_columns(conn, table, since=entry['start'] and entry['start'].item(),
+                                       symbol=symbol)
+            if not len(tail['time']):
+                return False
+            entry['cols'] = tail
+            return True
+        last = cols['time'][-1]
+        tail = load_candle_columns(conn, table, since=last.item(), symbol=symbol)
+        # the last cached bar comes back too; unchanged means nothing new arrived
+        if len(tail['time']) == 1 and all(
+            tail[k][0] == cols[k][-1] or (np.isnan(tail[k][0]) and np.isnan(cols[k][-1]))
+            for k in CANDLE_FIELDS
+        ):
+            return False
+        keep = np.searchsorted(cols['time'], last, side='left')
+        entry['cols'] = _concat({k: v[:keep] for k, v in cols.items()}, tail)
+        return True
+
+    @staticmethod
+    def _slice(cols, since, until, limit):
+        t = cols['time']
+        lo = np.searchsorted(t, since, side='left') if since is not None else 0
+        hi = np.searchsorted(t, until, side='left') if until is not None else len(t)
+        if limit:
+            lo = max(lo, hi - int(limit))
+        return {k: v[lo:hi] for k, v in cols.items()}
+
+    def _evict(self, keep):
+        used = self.memory_used
+        for key in list(self._entries):
+            if used <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            used -= _nbytes(self._entries.pop(key)['cols'])
@@ -1,7 +1,13 @@
 import psycopg2
 import yaml
+import io
+import sqlite3
+import numpy as np
+from collections.abc import Sequence
 from datetime import datetime, timedelta
 
+from aggregator.resample import to_epoch_ns
+
 # Load configs
 #def load_yaml(path):
 #    with open(path) as f:
@@ -46,3 +52,148 @@ def load_candle_table(conn, table, limit=None):
              for row in rows
          ]
 
+
+
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# PGCOPY binary rows for (timestamp, 5 x float8): int16 field count, then
+# an int32 length + 8 bytes of big-endian data per field
+_PGCOPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+_PGCOPY_ROW = np.dtype(
+    [('nfields', '>i2'), ('len_ts', '>i4'), ('ts', '>i8')]
+    + [x for f in CANDLE_FIELDS for x in ((f'len_{f}', '>i4'), (f, '>f8'))]
+)
+# Postgres binary timestamps count microseconds from 2000-01-01
+_PG_EPOCH_US = 946_684_800 * 1_000_000
+
+
+def _candle_query(table, since, until, limit, symbol, p, float_cols):
+    where, params = [], []
+    if symbol is not None:
+        where.append(f"symbol = {p}")
+        params.append(symbol)
+    if since is not None:
+        where.append(f"timestamp >= {p}")
+        params.append(since)
+    if until is not None:
+        where.append(f"timestamp < {p}")
+        params.append(until)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    cols = ', '.join(float_cols)
+    if limit:
+        sql = f"""
+            SELECT * FROM (
+                SELECT timestamp, {cols} FROM {table} {clause}
+                 ORDER BY timestamp DESC LIMIT {int(limit)}
+            ) recent ORDER BY timestamp ASC
+        """
+    else:
+        sql = f"SELECT timestamp, {cols} FROM {table} {clause} ORDER BY timestamp ASC"
+    return sql, params
+
+
+def _empty_candle_columns():
+    cols = {'time': np.empty(0, dtype='datetime64[us]')}
+    cols.update({f: np.empty(0, dtype=np.float64) for f in CANDLE_FIELDS})
+    return cols
+
+
+def _load_pg_binary(conn, table, since, until, limit, symbol):
+    # casting in SQL keeps every field fixed-width, so the whole COPY stream
+    # can be viewed as one NumPy record array
+    float_cols = [f"COALESCE({f}::float8, 'NaN')" for f in CANDLE_FIELDS]
+    sql, params = _candle_query(table, since, until, limit, symbol, '%s', float_cols)
+    buf = io.BytesIO()
+    with conn.cursor() as cur:
+        query = cur.mogrify(sql, params).decode()
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", buf)
+    data = buf.getbuffer()
+    if bytes(data[:11]) != _PGCOPY_SIGNATURE:
+        raise ValueError("unexpected COPY BINARY header")
+    ext_len = int.from_bytes(data[15:19], 'big')
+    offset = 19 + ext_len
+    nrows = (len(data) - offset - 2) // _PGCOPY_ROW.itemsize
+    rows = np.frombuffer(data, dtype=_PGCOPY_ROW, count=nrows, offset=offset)
+    cols = {'time': (rows['ts'].astype(np.int64) + _PG_EPOCH_US).astype('datetime64[us]')}
+    cols.update({f: rows[f].astype(np.float64) for f in CANDLE_FIELDS})
+    return cols
+
+
+def _load_fetchmany(conn, table, since, until, limit, symbol, chunk_size):
+    p = '%s'
+    if isinstance(conn, sqlite3.Connection):
+        # SQLite keeps timestamps as ISO text; compare against the same format
+        p = '?'
+        since, until = (t.isoformat() if isinstance(t, datetime) else t for t in (since, until))
+    sql, params = _candle_query(table, since, until, limit, symbol, p, CANDLE_FIELDS)
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    times, values = [], []
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        ts, *rest = zip(*rows)
+        times.append(to_epoch_ns(ts) // 1000)
+        values.append(np.array(rest, dtype=np.float64))
+    if not times:
+        return _empty_candle_columns()
+    block = np.concatenate(values, axis=1)
+    cols = {'time': np.concatenate(times).astype('datetime64[us]')}
+    cols.update({f: block[i] for i, f in enumerate(CANDLE_FIELDS)})
+    return cols
+
+
+def load_candle_columns(conn, table, since=None, until=None, limit=None,
+                        symbol=None, chunk_size=100_000):
+    """
+    Load candles as NumPy columns instead of a list of dicts:
+      {'time': datetime64[us], 'open'/'high'/'low'/'close'/'volume': float64}
+    sorted ascending by time, with since <= time < until and, when `limit`
+    is set, only the most recent `limit` rows. Postgres connections stream
+    the rows with COPY ... (FORMAT binary) and decode them in one
+    np.frombuffer call; other DB-API connections are read with fetchmany.
+    """
+    if isinstance(conn, psycopg2.extensions.connection):
+        return _load_pg_binary(conn, table, since, until, limit, symbol)
+    return _load_fetchmany(conn, table, since, until, limit, symbol, chunk_size)
+
+
+class CandleColumns(Sequence):
+    """
+    Read-only list-of-dicts view over load_candle_columns() output, for code
+    that indexes candles as dicts (pattern detectors, strategies). Slicing
+    returns another view without copying; column() exposes the arrays.
+    """
+    def __init__(self, cols, start=0, stop=None):
+        self.cols = cols
+        self.start = start
+        self.stop = len(cols['close']) if stop is None else stop
+
+    def __len__(self):
+        return max(0, self.stop - self.start)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("CandleColumns only supports contiguous slices")
+            return CandleColumns(self.cols, self.start + start, self.start + max(start, stop))
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        j = self.start + i
+        c = self.cols
+        return {
+            "time":   c['time'][j].item(),
+            "open":   float(c['open'][j]),
+            "high":   float(c['high'][j]),
+            "low":    float(c['low'][j]),
+            "close":  float(c['close'][j]),
+            "volume": float(c['volume'][j]),
+        }
+
+    def column(self, name):
+        return self.cols[name][self.start:self.stop]
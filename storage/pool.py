@@ -0,0 +1,214 @@
+# storage/pool.py
+
+"""
+Shared database connection management.
+
+One ConnectionManager per database owns every connection the process uses:
+
+    with get_manager().connection() as conn:
+        ...                      # commit on success, rollback on error
+
+Postgres connections come from a bounded psycopg2 ThreadedConnectionPool.
+Checkout blocks (up to `timeout`) instead of failing when all `maxconn`
+connections are busy, so parallel sweeps queue for a slot rather than
+exhausting the server's max_connections. A connection that has been idle
+longer than `check_interval` seconds is probed with SELECT 1 before it is
+handed out, and replaced if the server dropped it.
+
+Checkout is per thread: nested connection() blocks in the same thread reuse
+the connection already checked out, and only the outermost block commits
+and returns it. The pool is also per process: after a fork the child
+discards the inherited pool without closing it (closing would terminate the
+parent's server sessions) and opens its own.
+
+SQLite has no server to protect, so a SQLite manager simply keeps one
+connection per thread.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.pool
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class ConnectionManager:
+    def __init__(self, db_config=None, database=None, minconn=1, maxconn=8,
+                 check_interval=30.0, timeout=30.0):
+        if not db_config and not database:
+            raise ValueError("ConnectionManager needs db_config (Postgres) or database (SQLite)")
+        self.db_config = dict(db_config) if db_config else None
+        self.database = database
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+        self._pool = None
+        self._slots = None
+        self._last_used = {}          # id(conn) -> time it was returned
+        self._sqlite = threading.local()
+
+    @property
+    def is_postgres(self):
+        return self.db_config is not None
+
+    # ---------------------------------------------------------------- pool
+    def _ensure_pool(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # inherited from the parent: drop the references, never close them
+            self._local = threading.local()
+            self._last_used = {}
+            self._sqlite = threading.local()
+            if self.is_postgres:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, **self.db_config
+                )
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+            self._pid = pid
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        last = self._last_used.get(id(conn))
+        if last is not None and time.monotonic() - last < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self):
+        """
+        Check out a connection for long-lived use (e.g. a store object).
+        Pair with release(); prefer connection() for scoped work.
+        """
+        self._ensure_pool()
+        if not self.is_postgres:
+            return self._sqlite_conn()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"no free connection after {self.timeout}s (maxconn={self.maxconn})")
+        try:
+            conn = self._pool.getconn()
+            if not self._healthy(conn):
+                print("[WARN] Dropping dead database connection")
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, close=False):
+        if not self.is_postgres:
+            return
+        if self._pid != os.getpid():
+            return                    # belongs to the parent's pool
+        if not conn.closed and not close:
+            self._last_used[id(conn)] = time.monotonic()
+        else:
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=close or bool(conn.closed))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Connection for the current thread. Commits when the outermost block
+        exits normally, rolls back on an exception.
+        """
+        self._ensure_pool()
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        conn = self.acquire()
+        local.conn, local.depth = conn, 1
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            local.conn, local.depth = None, 0
+            self.release(conn, close=broken)
+
+    def _sqlite_conn(self):
+        # thread-local, so a connection goes away with its thread
+        conn = getattr(self._sqlite, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.database)
+            if self.database != ':memory:':
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._sqlite.conn = conn
+        return conn
+
+    def closeall(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                if self._pool is not None:
+                    self._pool.closeall()
+                conn = getattr(self._sqlite, 'conn', None)
+                if conn is not None:
+                    conn.close()
+            self._pid = self._pool = None
+            self._sqlite = threading.local()
+            self._last_used = {}
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_config=None):
+    """
+    Process-wide ConnectionManager for a database. Without arguments the
+    database comes from config (storage.db_config, else storage.database);
+    scripts that read their own credentials pass the connect kwargs.
+    """
+    if db_config is None:
+        from config.loader import load_config
+        storage = load_config().storage
+        db_config = storage.db_config
+        database = None if db_config else storage.database
+        minconn = getattr(storage, 'pool_min', 1)
+        maxconn = getattr(storage, 'pool_max', 8)
+    else:
+        database, minconn, maxconn = None, 1, 8
+    key = tuple(sorted(db_config.items())) if db_config else ('sqlite', database)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(
+                db_config, database, minconn=minconn, maxconn=maxconn
+            )
+        return manager
@@ -0,0 +1,296 @@
+# storage/schema.py
+
+"""
+Postgres schema and migrations for tick and candle tables.
+
+All tables are range-partitioned by month on `timestamp` and carry a
+`symbol` column (default '' so existing single-symbol writers keep working):
+
+    pricesandvolume            BRIN (timestamp)
+    candles_m1 / m5 / m15 ...  BRIN (timestamp), btree (timestamp),
+                               btree (symbol, timestamp)
+
+Ticks only get a BRIN index: it is a few pages per partition and costs
+next to nothing on insert. Candle tables are small enough to also carry
+btrees: (timestamp) serves the unfiltered ORDER BY timestamp DESC LIMIT n
+of load_candle_table and the candle cache (a merge of backward index scans
+over the partitions, each stopping after n rows, instead of a full sort),
+(symbol, timestamp) the same lookup for one symbol.
+
+A time-range query (fetch_ticks, load_candle_table with a window) then only
+touches the partitions overlapping the range. Each table also has a DEFAULT
+partition so inserts never fail; create_month_partition() moves any rows
+that landed there into the proper month before attaching it, so re-running
+`forex-bot migrate` (e.g. monthly from cron) keeps partitions ahead of time.
+Re-running it also finishes a migration that was interrupted while copying.
+"""
+
+from datetime import datetime
+
+TICK_TABLE = 'pricesandvolume'
+# progress of plain -> partitioned migrations, one row per table plus one per copied month
+MIGRATION_TABLE = 'schema_migrations'
+
+TICK_COLUMNS = """
+    id        BIGSERIAL,
+    symbol    TEXT NOT NULL DEFAULT '',
+    timestamp TIMESTAMP NOT NULL,
+    bid       DOUBLE PRECISION,
+    ask       DOUBLE PRECISION,
+    mid       DOUBLE PRECISION,
+    bid_size  DOUBLE PRECISION,
+    ask_size  DOUBLE PRECISION,
+    volume    DOUBLE PRECISION
+"""
+
+CANDLE_COLUMNS = """
+    symbol    TEXT NOT NULL DEFAULT '',
+    timestamp TIMESTAMP NOT NULL,
+    open      DOUBLE PRECISION,
+    high      DOUBLE PRECISION,
+    low       DOUBLE PRECISION,
+    close     DOUBLE PRECISION,
+    volume    DOUBLE PRECISION
+"""
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1)
+
+
+def next_month(dt):
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1)
+
+
+def months_between(start, end):
+    """Month starts from the month of `start` up to and including the month of `end`."""
+    m = month_start(start)
+    while m <= end:
+        yield m
+        m = next_month(m)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def table_state(cur, table):
+    """'partitioned', 'plain' or None if the table does not exist."""
+    cur.execute(
+        """
+        SELECT c.relkind FROM pg_class c
+          JOIN pg_namespace n ON n.oid = c.relnamespace
+         WHERE c.relname = %s AND n.nspname = current_schema()
+        """,
+        (table,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return 'partitioned' if row[0] == 'p' else 'plain'
+
+
+def table_columns(cur, table):
+    cur.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = %s AND table_schema = current_schema()
+         ORDER BY ordinal_position
+        """,
+        (table,)
+    )
+    return [r[0] for r in cur.fetchall()]
+
+
+def create_partitioned_table(cur, table, kind):
+    columns = TICK_COLUMNS if kind == 'ticks' else CANDLE_COLUMNS
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}) PARTITION BY RANGE (timestamp)")
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts_brin ON {table} USING BRIN (timestamp)")
+    if kind != 'ticks':
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table} (timestamp)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_symbol_ts ON {table} (symbol, timestamp)")
+
+
+def create_month_partition(cur, table, month):
+    """Create and attach the partition for `month`, pulling matching rows out of the default partition."""
+    name = partition_name(table, month)
+    cur.execute(
+        "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE c.relname = %s",
+        (name,)
+    )
+    if cur.fetchone():
+        return False
+    lo, hi = month, next_month(month)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {table} INCLUDING DEFAULTS)")
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {table}_default WHERE timestamp >= %s AND timestamp < %s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+        """,
+        (lo, hi)
+    )
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lo, hi))
+    return True
+
+
+def ensure_partitions(cur, table, start, end):
+    """Make sure monthly partitions exist for every month in [start, end]."""
+    return sum(create_month_partition(cur, table, m) for m in months_between(start, end))
+
+
+def ensure_migration_tables(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            symbol     TEXT NOT NULL,
+            finished   BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    """)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE}_months (
+            table_name TEXT NOT NULL,
+            month      TIMESTAMP NOT NULL,
+            rows       BIGINT NOT NULL,
+            PRIMARY KEY (table_name, month)
+        )
+    """)
+
+
+def copy_month(cur, table, legacy, columns, symbol, month):
+    """Copy one month of legacy rows and record it, in the caller's transaction."""
+    col_list = ', '.join(columns)
+    cur.execute(
+        f"""
+        INSERT INTO {table} (symbol, {col_list})
+        SELECT %s, {col_list} FROM {legacy}
+         WHERE timestamp >= %s AND timestamp < %s
+        """,
+        (symbol, month, next_month(month))
+    )
+    copied = cur.rowcount
+    cur.execute(
+        f"INSERT INTO {MIGRATION_TABLE}_months (table_name, month, rows) VALUES (%s, %s, %s)",
+        (table, month, copied)
+    )
+    return copied
+
+
+def _copy_legacy(conn, cur, table, keep_legacy):
+    """
+    Copy the legacy rows of an unfinished migration, skipping the months a
+    previous (interrupted) run already committed. Returns rows copied now.
+    """
+    legacy = f"{table}_legacy"
+    cur.execute(f"SELECT symbol FROM {MIGRATION_TABLE} WHERE table_name = %s", (table,))
+    symbol = cur.fetchone()[0]
+    cur.execute(f"SELECT month FROM {MIGRATION_TABLE}_months WHERE table_name = %s", (table,))
+    done = {r[0] for r in cur.fetchall()}
+    new_cols = table_columns(cur, table)
+    shared = [c for c in table_columns(cur, legacy) if c in new_cols and c != 'symbol']
+    cur.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM {legacy}")
+    first, last = cur.fetchone()
+    copied = 0
+    if first is not None:
+        for m in months_between(first, last):
+            if m in done:
+                continue
+            try:
+                copied += copy_month(cur, table, legacy, shared, symbol, m)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    if 'id' in shared:
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 1)) FROM {table}",
+            (table,)
+        )
+    if not keep_legacy:
+        cur.execute(f"DROP TABLE {legacy}")
+    cur.execute(f"UPDATE {MIGRATION_TABLE} SET finished = TRUE WHERE table_name = %s", (table,))
+    conn.commit()
+    return copied
+
+
+def migrate_table(conn, table, kind, months_ahead=3, symbol='', keep_legacy=True, now=None):
+    """
+    Bring `table` to the partitioned layout.
+
+    - missing: created partitioned
+    - plain (legacy): renamed to <table>_legacy and recreated partitioned in
+      one transaction, then its rows are copied month by month; columns
+      missing from the legacy table take their defaults, and `symbol` is
+      set to the given value
+    - already partitioned: only missing indexes and partitions up to
+      `months_ahead` are added
+    Every copied month is committed together with a row in
+    schema_migrations_months, so a migration that was interrupted resumes
+    with the first month not yet copied when it is run again.
+    Returns a short description of what was done.
+    """
+    now = now or datetime.utcnow()
+    horizon = now
+    for _ in range(months_ahead):
+        horizon = next_month(horizon)
+
+    with conn.cursor() as cur:
+        try:
+            ensure_migration_tables(cur)
+            state = table_state(cur, table)
+            cur.execute(f"SELECT finished FROM {MIGRATION_TABLE} WHERE table_name = %s", (table,))
+            row = cur.fetchone()
+            resume = state == 'partitioned' and row is not None and not row[0]
+            if state == 'partitioned':
+                # IF NOT EXISTS throughout: picks up indexes added since it was migrated
+                create_partitioned_table(cur, table, kind)
+                added = ensure_partitions(cur, table, now, horizon)
+                conn.commit()
+                if not resume:
+                    return f"{table}: partitioned, {added} new partition(s)"
+
+            else:
+                legacy = None
+                if state == 'plain':
+                    legacy = f"{table}_legacy"
+                    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+                    # index names are schema-global; free them up for the new table
+                    cur.execute(
+                        "SELECT indexname FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()",
+                        (legacy,)
+                    )
+                    for (index,) in cur.fetchall():
+                        if index.startswith(table + '_'):
+                            cur.execute(f"ALTER INDEX {index} RENAME TO {legacy}_{index[len(table) + 1:]}")
+
+                create_partitioned_table(cur, table, kind)
+                first = last = now
+                if legacy:
+                    cur.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM {legacy}")
+                    lo, hi = cur.fetchone()
+                    first, last = lo or now, hi or now
+                ensure_partitions(cur, table, min(first, now), max(last, horizon))
+                if legacy is None:
+                    conn.commit()
+                    return f"{table}: created"
+                cur.execute(f"DELETE FROM {MIGRATION_TABLE}_months WHERE table_name = %s", (table,))
+                cur.execute(f"DELETE FROM {MIGRATION_TABLE} WHERE table_name = %s", (table,))
+                cur.execute(
+                    f"INSERT INTO {MIGRATION_TABLE} (table_name, symbol) VALUES (%s, %s)",
+                    (table, symbol)
+                )
+                # the rename, the new table and the migration record commit together
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        copied = _copy_legacy(conn, cur, table, keep_legacy)
+        cur.execute(f"SELECT SUM(rows) FROM {MIGRATION_TABLE}_months WHERE table_name = %s", (table,))
+        total = cur.fetchone()[0] or 0
+        conn.commit()
+        what = "resumed, copied" if resume else "migrated"
+        return (f"{table}: {what} {copied} rows ({total} in all)"
+                + ("" if keep_legacy else ", legacy dropped"))
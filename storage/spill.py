@@ -0,0 +1,180 @@
+# storage/spill.py
+
+"""
+Retry and spill-to-disk wrapper for the tick writer.
+
+A failed insert_ticks() used to cost the whole batch: the collect persist
+stage logged the error and moved on. SpillingStore sits in front of the
+store and, when the database connection fails (TRANSIENT_ERRORS),
+
+    retries    each batch `retries` times with exponential backoff
+               (backoff, 2 * backoff, ... capped at max_backoff seconds);
+    spills     a batch that still fails to `<spill_dir>/<time_ns>-<seq>.ticks`
+               in the capture tick format (collector.capture), written to a
+               temporary file and renamed so a crash never leaves half a batch;
+    replays    spilled batches oldest first after the next successful insert
+               (at most every replay_interval seconds), deleting each file only
+               once its ticks are committed, and then calling
+               on_replay(oldest timestamp of the batch); collect uses it to
+               rewind the candle materializer (aggregator.materialize).
+
+Any other error (a bad batch, e.g. ticks of several symbols for a legacy
+table) would fail the same way on every retry and would block the replay
+queue, so such a batch is written to `<spill_dir>/rejected/` instead, in the
+same format, for inspection; it is never replayed. A spill file that fails
+its replay that way is moved there too.
+
+Spills from a previous run are replayed by the first successful insert, or
+explicitly with replay(). Everything else is delegated to the wrapped store.
+"""
+
+import os
+import sqlite3
+import time
+
+import numpy as np
+import psycopg2
+
+from collector.capture import TICK_DTYPE, decode_ticks, encode_ticks
+
+SPILL_SUFFIX = '.ticks'
+REJECTED_DIR = 'rejected'
+# connection-level failures worth retrying and spilling; anything else is the batch's fault
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, sqlite3.OperationalError)
+
+
+class SpillingStore:
+    def __init__(self, store, spill_dir='data/spill', retries=4, backoff=0.5,
+                 max_backoff=30.0, replay_interval=30.0, sleep=time.sleep, on_replay=None):
+        self.store = store
+        self.spill_dir = spill_dir
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.replay_interval = replay_interval
+        self.sleep = sleep
+        self.on_replay = on_replay
+        self.retried = 0
+        self.spilled = 0          # ticks written to spill files
+        self.replayed = 0         # spilled ticks committed later
+        self.rejected = 0         # ticks of batches that failed for a non-transient reason
+        self._seq = 0
+        self._last_replay = None
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    # ---------------------------------------------------------------- writes
+    def insert_ticks(self, ticks):
+        ticks = list(ticks)
+        if not ticks:
+            return
+        try:
+            committed = self._insert(ticks)
+        except Exception as e:
+            print(f"[ERROR] Insert of {len(ticks)} ticks rejected: {e!r}")
+            self._reject(ticks)
+            return
+        if not committed:
+            self._spill(ticks)
+            return
+        now = time.monotonic()
+        if self._last_replay is None or now - self._last_replay >= self.replay_interval:
+            self._last_replay = now
+            self.replay()
+
+    def insert_tick(self, tick):
+        self.insert_ticks([tick])
+
+    def _insert(self, ticks):
+        """
+        insert_ticks with retries on TRANSIENT_ERRORS; True once committed,
+        False when the retries are used up. Other errors are raised.
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self.store.insert_ticks(ticks)
+                return True
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    print(f"[ERROR] Insert of {len(ticks)} ticks failed after "
+                          f"{self.retries} retries: {e}")
+                    return False
+                self.retried += 1
+                print(f"[WARN] Insert of {len(ticks)} ticks failed ({e}); "
+                      f"retrying in {delay:.1f}s")
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _spill(self, ticks):
+        path = self._write(self.spill_dir, ticks)
+        if path:
+            self.spilled += len(ticks)
+            print(f"[WARN] Spilled {len(ticks)} ticks to {path}")
+
+    def _reject(self, ticks):
+        path = self._write(os.path.join(self.spill_dir, REJECTED_DIR), ticks)
+        if path:
+            self.rejected += len(ticks)
+            print(f"[ERROR] Kept the rejected batch in {path}")
+
+    def _write(self, directory, ticks):
+        """Write ticks to a new file in `directory`; its path, or None on failure."""
+        self._seq += 1
+        path = os.path.join(directory, f"{time.time_ns()}-{self._seq:06d}{SPILL_SUFFIX}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            records = encode_ticks(ticks)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print(f"[ERROR] Could not write {len(ticks)} ticks to {path}: {e}")
+            return None
+        return path
+
+    # ---------------------------------------------------------------- replay
+    def pending(self):
+        """Spill files waiting to be replayed, oldest first."""
+        return sorted(os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir)
+                      if name.endswith(SPILL_SUFFIX))
+
+    def replay(self):
+        """
+        Insert spilled batches oldest first; stops at the first connection
+        failure. Returns ticks replayed.
+        """
+        total = 0
+        for path in self.pending():
+            ticks = decode_ticks(np.fromfile(path, dtype=TICK_DTYPE))
+            try:
+                if ticks:
+                    self.store.insert_ticks(ticks)
+            except TRANSIENT_ERRORS as e:
+                print(f"[WARN] Replay of {path} failed, keeping it: {e}")
+                break
+            except Exception as e:
+                rejected = os.path.join(self.spill_dir, REJECTED_DIR)
+                os.makedirs(rejected, exist_ok=True)
+                os.replace(path, os.path.join(rejected, os.path.basename(path)))
+                self.rejected += len(ticks)
+                print(f"[ERROR] Replay of {path} rejected, moved to {rejected}: {e!r}")
+                continue
+            os.remove(path)
+            total += len(ticks)
+            if ticks and self.on_replay is not None:
+                self._replayed(min(t.time for t in ticks))
+        if total:
+            self.replayed += total
+            print(f"[INFO] Replayed {total} spilled ticks")
+        return total
+
+    def _replayed(self, oldest):
+        try:
+            self.on_replay(oldest)
+        except Exception as e:
+            print(f"[WARN] Replayed ticks from {oldest} may not be materialized: {e}")
@@ -1,49 +1,329 @@
 # storage/store.py
 from abc import ABC, abstractmethod
+import io
+import csv
 import sqlite3
+import itertools
+import threading
+from datetime import datetime
+import numpy as np
 import psycopg2
 from config.loader import load_config
+from aggregator.resample import epoch_ns_to_iso, to_epoch_ns
+
+TICK_FIELDS = ('timestamp', 'bid', 'ask', 'volume')
+# optional per-tick columns, written when pricesandvolume has them (storage.schema does)
+SIZE_FIELDS = ('bid_size', 'ask_size')
+
+def rows_to_columns(rows):
+    """(timestamp, bid, ask, volume) rows -> dict of NumPy columns, timestamp as epoch-ns."""
+    if not rows:
+        return {name: np.empty(0, dtype=np.int64 if name == 'timestamp' else np.float64)
+                for name in TICK_FIELDS}
+    ts, bid, ask, vol = zip(*rows)
+    return {
+        'timestamp': to_epoch_ns(ts),
+        'bid': np.array(bid, dtype=np.float64),
+        'ask': np.array(ask, dtype=np.float64),
+        # NULL volume becomes NaN
+        'volume': np.array(vol, dtype=np.float64),
+    }
+
+def _or_none(value):
+    # missing sizes arrive as None or, from NumPy columns and captures, as NaN
+    return None if value is None or value != value else value
+
+def _size_column(cols, name, n):
+    if cols.get(name) is None:
+        return itertools.repeat(None, n)
+    return [_or_none(v) for v in np.asarray(cols[name], dtype=np.float64).tolist()]
+
+def _insert_sql(names, p):
+    return (f"INSERT INTO pricesandvolume({','.join(names)}) "
+            f"VALUES ({','.join([p] * len(names))})")
+
+def _tick_row(tick, names):
+    """One tick's values for the columns in `names` (see IStore._tick_layout)."""
+    row = [tick['timestamp'], tick['bid'], tick['ask'], tick['volume']]
+    row += [_or_none(tick.get(name)) for name in names[4:] if name != 'symbol']
+    if names[-1] == 'symbol':
+        row.append(tick.get('symbol') or '')
+    return row
+
+def _column_values(cols, names):
+    """insert_columns() input as one value sequence per column in `names`."""
+    n = len(cols['timestamp'])
+    values = [epoch_ns_to_iso(to_epoch_ns(cols['timestamp'])), np.asarray(cols['bid']).tolist(),
+              np.asarray(cols['ask']).tolist(), np.asarray(cols['volume']).tolist()]
+    values += [_size_column(cols, name, n) for name in names[4:] if name != 'symbol']
+    if names[-1] == 'symbol':
+        values.append(itertools.repeat(cols.get('symbol') or '', n))
+    return values
+
+def _tick_range_sql(p, until):
+    return (
+        "SELECT timestamp, bid, ask, volume FROM pricesandvolume WHERE timestamp >= " + p
+        + (" AND timestamp < " + p if until is not None else "")
+        + " ORDER BY timestamp"
+    )
 
 class IStore(ABC):
+    # DB-API paramstyle marker used when building SQL for this backend
+    placeholder = '%s'
+    # whether pricesandvolume has a symbol column (the storage.schema layout);
+    # looked up once per store by has_symbol_column()
+    _symbol_column = None
+    # the one symbol a legacy table without that column has been given
+    _legacy_symbol = None
+    # which of SIZE_FIELDS pricesandvolume has; looked up once by size_columns()
+    _size_columns = None
+
+    def to_db_time(self, dt):
+        """Convert a datetime into the form the backend stores timestamps in."""
+        return dt
+
+    def close(self):
+        """Give back the backend connection; the store is unusable afterwards."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     @abstractmethod
     def insert_tick(self, tick): ...
     @abstractmethod
     def fetch_ticks(self, since): ...
 
+    def insert_ticks(self, ticks):
+        """Insert a batch of ticks; backends override this with a single-commit bulk path."""
+        for tick in ticks:
+            self.insert_tick(tick)
+
+    def insert_columns(self, cols):
+        """
+        Insert ticks given as columns ('timestamp' as anything to_epoch_ns
+        accepts, 'bid', 'ask', 'volume' arrays, optionally 'bid_size' and
+        'ask_size' arrays and a 'symbol' string), the shape fetch_ticks_iter
+        yields. Backends override this to skip building per-tick dicts.
+        """
+        symbol = cols.get('symbol')
+        n = len(cols['timestamp'])
+        self.insert_ticks([
+            {'timestamp': t, 'symbol': symbol, 'bid': b, 'ask': a, 'volume': v,
+             'bid_size': bs, 'ask_size': asz}
+            for t, b, a, v, bs, asz in zip(epoch_ns_to_iso(to_epoch_ns(cols['timestamp'])),
+                                           np.asarray(cols['bid']).tolist(),
+                                           np.asarray(cols['ask']).tolist(),
+                                           np.asarray(cols['volume']).tolist(),
+                                           _size_column(cols, 'bid_size', n),
+                                           _size_column(cols, 'ask_size', n))
+        ])
+
+    def fetch_ticks_iter(self, since, until=None, chunk_size=10_000):
+        """
+        Yield ticks with since <= timestamp (< until, if given) in timestamp
+        order, as dicts of NumPy columns (see rows_to_columns) of at most
+        chunk_size rows. Backends override this to stream from the database
+        in constant memory; this fallback slices fetch_ticks().
+        """
+        cols = rows_to_columns(self.fetch_ticks(since))
+        n = len(cols['timestamp'])
+        if until is not None:
+            n = np.searchsorted(cols['timestamp'], to_epoch_ns([until])[0], side='left')
+        for lo in range(0, n, chunk_size):
+            yield {name: col[lo:min(lo + chunk_size, n)] for name, col in cols.items()}
+
+    def _db_param(self, value):
+        return self.to_db_time(value) if isinstance(value, datetime) else value
+
+    @abstractmethod
+    def _tick_columns(self):
+        """Column names of pricesandvolume (or what the backend stores per tick)."""
+
+    def has_symbol_column(self):
+        """True if ticks are stored with their symbol (see storage.schema)."""
+        if self._symbol_column is None:
+            self._symbol_column = 'symbol' in self._tick_columns()
+        return self._symbol_column
+
+    def size_columns(self):
+        """The SIZE_FIELDS columns pricesandvolume has, in SIZE_FIELDS order."""
+        if self._size_columns is None:
+            columns = self._tick_columns()
+            self._size_columns = tuple(c for c in SIZE_FIELDS if c in columns)
+        return self._size_columns
+
+    def _tick_layout(self, ticks=None, symbols=None):
+        """
+        Column names a batch is written to: TICK_FIELDS, the size columns the
+        table has, and symbol when the table takes it (see _tick_symbols).
+        """
+        if symbols is None:
+            symbols = {t.get('symbol') for t in ticks}
+        names = TICK_FIELDS + self.size_columns()
+        return names + ('symbol',) if self._tick_symbols(symbols) else names
+
+    def _tick_symbols(self, symbols):
+        """
+        Check the distinct symbols of a batch against the table layout and
+        return whether they are written. A legacy table without a symbol
+        column can hold a single symbol only; mixing more would make the
+        ticks of different pairs indistinguishable, so that raises.
+        """
+        if self.has_symbol_column():
+            return True
+        symbols = {s for s in symbols if s}
+        if self._legacy_symbol:
+            symbols.add(self._legacy_symbol)
+        if len(symbols) > 1:
+            raise ValueError(
+                f"pricesandvolume has no symbol column and cannot hold ticks of "
+                f"{', '.join(sorted(symbols))} together; run `forex-bot migrate` first"
+            )
+        if symbols:
+            self._legacy_symbol = symbols.pop()
+        return False
+
 class SqliteStore(IStore):
+    placeholder = '?'
+
     def __init__(self, db_path: str):
-        self.conn = sqlite3.connect(db_path)
+        # the connection is shared with the collect persist stage thread, so
+        # access is serialised with a lock instead of sqlite's thread check
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        if db_path != ':memory:':
+            # WAL lets readers (materialize, backtests) run alongside the writer
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def to_db_time(self, dt):
+        # ticks are stored as ISO strings, keep the same format so that
+        # text comparisons on timestamp stay ordered
+        return dt.isoformat()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _tick_columns(self):
+        with self.lock:
+            return [r[1] for r in self.conn.execute("PRAGMA table_info(pricesandvolume)")]
 
     def insert_tick(self, tick):
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO pricesandvolume(timestamp,bid,ask,volume) VALUES (?,?,?,?)",
-            (tick['timestamp'], tick['bid'], tick['ask'], tick['volume'])
-        )
-        self.conn.commit()
+        self.insert_ticks([tick])
+
+    def insert_ticks(self, ticks):
+        ticks = list(ticks)
+        names = self._tick_layout(ticks)
+        rows = [_tick_row(t, names) for t in ticks]
+        with self.lock:
+            self.conn.executemany(_insert_sql(names, '?'), rows)
+            self.conn.commit()
+
+    def insert_columns(self, cols):
+        names = self._tick_layout(symbols={cols.get('symbol')})
+        with self.lock:
+            self.conn.executemany(_insert_sql(names, '?'), zip(*_column_values(cols, names)))
+            self.conn.commit()
 
     def fetch_ticks(self, since):
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT timestamp, bid, ask, volume FROM pricesandvolume WHERE timestamp >= ? ORDER BY timestamp",
-            (since,)
-        )
-        return cur.fetchall()
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT timestamp, bid, ask, volume FROM pricesandvolume WHERE timestamp >= ? ORDER BY timestamp",
+                (since,)
+            )
+            return cur.fetchall()
+
+    def fetch_ticks_iter(self, since, until=None, chunk_size=10_000):
+        params = (self._db_param(since),) + ((self._db_param(until),) if until is not None else ())
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute(_tick_range_sql('?', until), params)
+        # the lock is only held per fetch so the writer thread is not starved
+        # while a consumer works through a long range
+        try:
+            while True:
+                with self.lock:
+                    rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows_to_columns(rows)
+        finally:
+            cur.close()
 
 class PostgresStore(IStore):
-    def __init__(self, cfg):
-        self.conn = psycopg2.connect(
+    _cursor_ids = itertools.count()
+
+    def __init__(self, cfg, conn=None, pool=None):
+        # get_store() passes a connection checked out of the shared pool, and
+        # the pool (storage.pool.ConnectionManager) close() returns it to
+        self.pool = pool
+        self.conn = conn or psycopg2.connect(
             dbname=cfg['dbname'], user=cfg['user'], password=cfg['password'],
             host=cfg['host'], port=cfg['port']
         )
 
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        if self.pool is None:
+            conn.close()
+            return
+        try:
+            conn.rollback()       # never hand back a connection idle in transaction
+        except psycopg2.Error:
+            self.pool.release(conn, close=True)
+            return
+        self.pool.release(conn)
+
+    def _tick_columns(self):
+        from storage.schema import TICK_TABLE, table_columns
+        try:
+            with self.conn.cursor() as cur:
+                columns = table_columns(cur, TICK_TABLE)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return columns
+
     def insert_tick(self, tick):
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO pricesandvolume(timestamp,bid,ask,volume) VALUES (%s,%s,%s,%s)",
-            (tick['timestamp'], tick['bid'], tick['ask'], tick['volume'])
-        )
-        self.conn.commit()
+        self.insert_ticks([tick])
+
+    def insert_ticks(self, ticks):
+        # COPY is several times faster than executemany for bulk rows
+        ticks = list(ticks)
+        names = self._tick_layout(ticks)
+        buf = io.StringIO()
+        csv.writer(buf).writerows(_tick_row(t, names) for t in ticks)
+        self._copy_ticks(buf, names)
+
+    def insert_columns(self, cols):
+        names = self._tick_layout(symbols={cols.get('symbol')})
+        buf = io.StringIO()
+        csv.writer(buf).writerows(zip(*_column_values(cols, names)))
+        self._copy_ticks(buf, names)
+
+    def _copy_ticks(self, buf, names):
+        buf.seek(0)
+        # an empty CSV field is NULL to COPY (missing sizes); FORCE_NOT_NULL
+        # keeps '' for the NOT NULL symbol column
+        force = ", FORCE_NOT_NULL (symbol)" if 'symbol' in names else ""
+        sql = f"COPY pricesandvolume ({', '.join(names)}) FROM STDIN WITH (FORMAT csv{force})"
+        try:
+            with self.conn.cursor() as cur:
+                cur.copy_expert(sql, buf)
+            self.conn.commit()
+        except Exception:
+            # a failed COPY aborts the transaction; without the rollback every
+            # later statement on this connection fails as well
+            self.conn.rollback()
+            raise
 
     def fetch_ticks(self, since):
         cur = self.conn.cursor()
@@ -53,10 +333,38 @@ class PostgresStore(IStore):
         )
         return cur.fetchall()
 
+    def fetch_ticks_iter(self, since, until=None, chunk_size=10_000):
+        # a named (server-side) cursor keeps the result set in Postgres;
+        # only chunk_size rows are transferred per round trip
+        cur = self.conn.cursor(name=f"ticks_iter_{next(self._cursor_ids)}")
+        cur.itersize = chunk_size
+        params = (since,) + ((until,) if until is not None else ())
+        try:
+            cur.execute(_tick_range_sql('%s', until), params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows_to_columns(rows)
+        finally:
+            cur.close()
+            # named cursors live inside a transaction; end it so the
+            # connection is not left idle in transaction
+            self.conn.commit()
+
 def get_store():
     settings = load_config()
     if settings.storage.db_config:
-        return PostgresStore(settings.storage.db_config)
+        from storage.pool import get_manager
+        manager = get_manager()
+        return PostgresStore(settings.storage.db_config, conn=manager.acquire(), pool=manager)
     else:
         return SqliteStore(settings.storage.database)
 
+def get_archive(path=None):
+    """Columnar tick archive at `path` or storage.archive_path from config."""
+    from storage.archive import TickArchiveStore
+    if path is None:
+        path = getattr(load_config().storage, 'archive_path', None) or 'data/ticks'
+    return TickArchiveStore(path)
+
@@ -0,0 +1,217 @@
+# storage/tickcodec.py
+
+"""
+Compact binary tick encoding.
+
+Prices are stored as integers in pipettes (price * pip_scale, 100000 for
+5-decimal pairs, 1000 for JPY pairs), timestamps as integers in
+time_unit_ns units (microseconds by default, Postgres' own precision) and
+volume as whole units. Each block of up to block_size ticks stores:
+
+    timestamp  first value + successive deltas
+    bid        first value + successive deltas
+    spread     ask - bid (pipettes)
+    volume     as is
+
+Every column is narrowed to the smallest signed integer type its values fit
+in, and the block payload is zlib-compressed. Blocks are followed by an
+index of (first_ts, last_ts, offset) rows so a reader can seek straight to
+the blocks overlapping a time range. Encoding and decoding are plain NumPy
+diff/cumsum, no per-tick Python.
+
+File layout:
+    header  b'FXTK' | u8 version | i64 pip_scale | i64 time_unit_ns
+    blocks  BLOCK_HEADER | zlib(payload) ...
+    index   (i64 first_ts, i64 last_ts, i64 offset) * nblocks
+    footer  i64 index_offset | i64 nblocks | b'FXTK'
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from aggregator.resample import to_epoch_ns
+
+MAGIC = b'FXTK'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBqq')
+# first_ts, first_bid, n, dtype codes (ts, bid, spread, volume), payload length
+BLOCK_HEADER = struct.Struct('<qqI4BI')
+FOOTER = struct.Struct('<qq4s')
+INDEX_DTYPE = np.dtype([('first_ts', '<i8'), ('last_ts', '<i8'), ('offset', '<i8')])
+
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _narrow(values):
+    """Smallest signed integer dtype code (index into _INT_TYPES) that holds values."""
+    if values.size == 0:
+        return 0
+    lo, hi = int(values.min()), int(values.max())
+    for code, t in enumerate(_INT_TYPES):
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            return code
+    raise OverflowError("value does not fit in int64")
+
+
+def encode_block(ts, bid, spread, volume, level=6):
+    """
+    Encode one block of integer columns (timestamp units, bid pipettes,
+    spread pipettes, volume). Returns the block as bytes.
+    """
+    n = len(ts)
+    cols = (np.diff(ts), np.diff(bid), spread, volume)
+    codes = [_narrow(c) for c in cols]
+    payload = b''.join(
+        np.ascontiguousarray(c, dtype=np.dtype(_INT_TYPES[code]).newbyteorder('<')).tobytes()
+        for c, code in zip(cols, codes)
+    )
+    body = zlib.compress(payload, level)
+    header = BLOCK_HEADER.pack(int(ts[0]), int(bid[0]), n, *codes, len(body))
+    return header + body
+
+
+def decode_block(buf, offset=0):
+    """Decode a block at `offset`; returns (ts, bid, spread, volume) int64 arrays and the end offset."""
+    first_ts, first_bid, n, c_ts, c_bid, c_spr, c_vol, length = BLOCK_HEADER.unpack_from(buf, offset)
+    start = offset + BLOCK_HEADER.size
+    payload = zlib.decompress(buf[start:start + length])
+    pos = 0
+    out = []
+    for code, count in ((c_ts, n - 1), (c_bid, n - 1), (c_spr, n), (c_vol, n)):
+        dtype = np.dtype(_INT_TYPES[code]).newbyteorder('<')
+        size = count * dtype.itemsize
+        out.append(np.frombuffer(payload, dtype=dtype, count=count, offset=pos).astype(np.int64))
+        pos += size
+    d_ts, d_bid, spread, volume = out
+    ts = np.empty(n, dtype=np.int64)
+    ts[0] = first_ts
+    np.cumsum(d_ts, out=ts[1:])
+    ts[1:] += first_ts
+    bid = np.empty(n, dtype=np.int64)
+    bid[0] = first_bid
+    np.cumsum(d_bid, out=bid[1:])
+    bid[1:] += first_bid
+    return (ts, bid, spread, volume), start + length
+
+
+class TickFileWriter:
+    """
+    Append ticks to a compact tick file. Ticks must be written in
+    timestamp order; call close() (or use as a context manager) to write
+    the block index.
+    """
+    def __init__(self, path, pip_scale=100_000, time_unit_ns=1_000, block_size=8192, level=6):
+        self.path = path
+        self.pip_scale = pip_scale
+        self.time_unit_ns = time_unit_ns
+        self.block_size = block_size
+        self.level = level
+        self.count = 0
+        self._f = open(path, 'wb')
+        self._f.write(FILE_HEADER.pack(MAGIC, VERSION, pip_scale, time_unit_ns))
+        self._index = []
+        self._pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, timestamps, bid, ask, volume):
+        """Queue columns of ticks; full blocks are encoded and written immediately."""
+        ts = to_epoch_ns(timestamps) // self.time_unit_ns
+        bid_p = np.rint(np.asarray(bid, dtype=np.float64) * self.pip_scale).astype(np.int64)
+        ask_p = np.rint(np.asarray(ask, dtype=np.float64) * self.pip_scale).astype(np.int64)
+        vol = np.rint(np.nan_to_num(np.asarray(volume, dtype=np.float64))).astype(np.int64)
+        cols = (ts, bid_p, ask_p - bid_p, vol)
+        if self._pending is not None:
+            cols = tuple(np.concatenate((p, c)) for p, c in zip(self._pending, cols))
+        n = len(cols[0])
+        full = n - n % self.block_size
+        for lo in range(0, full, self.block_size):
+            self._write_block(tuple(c[lo:lo + self.block_size] for c in cols))
+        self._pending = tuple(c[full:] for c in cols) if full < n else None
+
+    def _write_block(self, cols):
+        offset = self._f.tell()
+        self._f.write(encode_block(*cols, level=self.level))
+        self._index.append((int(cols[0][0]), int(cols[0][-1]), offset))
+        self.count += len(cols[0])
+
+    def close(self):
+        if self._f.closed:
+            return
+        if self._pending is not None:
+            self._write_block(self._pending)
+            self._pending = None
+        index_offset = self._f.tell()
+        self._f.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._f.write(FOOTER.pack(index_offset, len(self._index), MAGIC))
+        self._f.close()
+
+
+class TickFileReader:
+    """Random-access reader for files written by TickFileWriter."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.pip_scale, self.time_unit_ns = FILE_HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a tick file (magic={magic!r}, version={version})")
+        index_offset, nblocks, tail = FOOTER.unpack_from(self._buf, len(self._buf) - FOOTER.size)
+        if tail != MAGIC:
+            raise ValueError(f"{path}: missing index (file not closed?)")
+        self.index = np.frombuffer(self._buf, dtype=INDEX_DTYPE, count=nblocks, offset=index_offset)
+
+    def __len__(self):
+        return int(sum(BLOCK_HEADER.unpack_from(self._buf, int(o))[2] for o in self.index['offset']))
+
+    def read(self, since=None, until=None):
+        """
+        Ticks with since <= timestamp < until as float columns
+        (timestamp in epoch-ns int64, bid/ask/volume float64).
+        Only blocks overlapping the range are decompressed.
+        """
+        unit = self.time_unit_ns
+        # both bounds round up: u * unit >= since  <=>  u >= ceil(since / unit)
+        lo = -(-int(to_epoch_ns([since])[0]) // unit) if since is not None else None
+        hi = -(-int(to_epoch_ns([until])[0]) // unit) if until is not None else None
+        first = np.searchsorted(self.index['last_ts'], lo, side='left') if lo is not None else 0
+        last = np.searchsorted(self.index['first_ts'], hi, side='left') if hi is not None else len(self.index)
+        parts = [decode_block(self._buf, int(o))[0] for o in self.index['offset'][first:last]]
+        if parts:
+            ts, bid, spread, volume = (np.concatenate(c) for c in zip(*parts))
+        else:
+            ts = bid = spread = volume = np.empty(0, dtype=np.int64)
+        mask = np.ones(len(ts), dtype=bool)
+        if lo is not None:
+            mask &= ts >= lo
+        if hi is not None:
+            mask &= ts < hi
+        ts, bid, spread, volume = ts[mask], bid[mask], spread[mask], volume[mask]
+        scale = float(self.pip_scale)
+        return {
+            'timestamp': ts * unit,
+            'bid': bid / scale,
+            'ask': (bid + spread) / scale,
+            'volume': volume.astype(np.float64),
+        }
+
+
+def encode_ticks(path, timestamps, bid, ask, volume, **kwargs):
+    """Write a whole set of tick columns to `path`; returns the file size in bytes."""
+    with TickFileWriter(path, **kwargs) as w:
+        w.write(timestamps, bid, ask, volume)
+    return os.path.getsize(path)
+
+
+def decode_ticks(path, since=None, until=None):
+    """Read tick columns back from `path` (optionally a time range)."""
+    return TickFileReader(path).read(since, until)
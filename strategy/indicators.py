@@ -4,6 +4,7 @@ from numba import njit
 from scipy.signal import argrelextrema
 from concurrent.futures import ThreadPoolExecutor
 from config.loader import load_config
+from aggregator.records import ohlc
 
 # Load strategy parameters from config as module-level constants
 _CFG = load_config().strategy
@@ -146,10 +147,7 @@ def detect_candle_pattern(candle):
       - Bullish Marubozu (0.7)
       - Bearish Marubozu (-0.7)
     """
-    o = float(candle['open'])
-    c = float(candle['close'])
-    h = float(candle['high'])
-    l = float(candle['low'])
+    o, h, l, c = map(float, ohlc(candle))
     body = abs(c - o)
     total = h - l
     if total == 0:
@@ -189,8 +187,8 @@ def detect_multi_candle_pattern(prev, curr):
       - Tweezer Top (-0.4)
     """
     # Parse OHLC
-    o0, h0, l0, c0 = (float(prev[k]) for k in ('open', 'high', 'low', 'close'))
-    o1, h1, l1, c1 = (float(curr[k]) for k in ('open', 'high', 'low', 'close'))
+    o0, h0, l0, c0 = map(float, ohlc(prev))
+    o1, h1, l1, c1 = map(float, ohlc(curr))
     body0 = abs(c0 - o0)
     body1 = abs(c1 - o1)
     if body1 == 0 or body0 == 0:
@@ -247,8 +245,9 @@ def OLD_detect_multi_candle_pattern(prev, curr):
 def detect_five_candle_pattern(candles):
     if len(candles) != 5:
         return 0
-    o = [float(c['open']) for c in candles]
-    c = [float(c['close']) for c in candles]
+    bars = [ohlc(c) for c in candles]
+    o = [float(b[0]) for b in bars]
+    c = [float(b[3]) for b in bars]
     # Rising Three Methods: first and last bullish and middle three bearish/flat
     if c[0] > o[0] and c[4] > o[4] and c[4] > c[0] and all(c[i] <= o[i] for i in range(1,4)):
         return 0.9
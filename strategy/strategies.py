@@ -1,6 +1,8 @@
 # strategy/strategies.py
 import numpy as np
 from datetime import timedelta
+from time import perf_counter_ns
+from aggregator.records import Candle, Tick, TRACE_INDICATORS, TRACE_INDICATORS_DONE
 from .indicators import evaluate_indicators
 
 class BaseStrategy:
@@ -14,8 +16,10 @@ class ParametrizedStrategy(BaseStrategy):
         self.last_price = None
 
     def generate_signal(self, history_1m, tick, candles_5m=None, candles_15m=None):
-        now = tick['timestamp']
-        price = tick['price']
+        if type(tick) is not Tick:
+            tick = Tick.from_dict(tick)
+        now = tick.time
+        price = tick.price
 
         # Cooldown: skip if within cooldown period
         if self.last_trade_time and (now - self.last_trade_time).seconds < self.cfg.cooldown_seconds:
@@ -23,13 +27,20 @@ class ParametrizedStrategy(BaseStrategy):
 
         # Evaluate pattern & candle scores
         # evaluate_indicators returns: rsi, slope, macd, macd_signal, boll, pattern, c1, c5, c15
+        closes = (history_1m.column('close') if hasattr(history_1m, 'column')
+                  else [c.close if type(c) is Candle else c['close'] for c in history_1m])
+        trace = tick.trace
+        if trace is not None:
+            trace[TRACE_INDICATORS] = perf_counter_ns()
         scores = evaluate_indicators(
-            [c['close'] for c in history_1m],
+            closes,
             candles_1m=history_1m,
             candles_5m=candles_5m,
             candles_15m=candles_15m,
             cfg=self.cfg
         )
+        if trace is not None:
+            trace[TRACE_INDICATORS_DONE] = perf_counter_ns()
         # Extract only candle scores
         c1, c5, c15 = scores[6], scores[7], scores[8]
 
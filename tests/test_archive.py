@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from storage.archive import TickArchiveStore
+
+
+def _ticks(start, n, step_seconds=600):
+    return [
+        {
+            'timestamp': (start + timedelta(seconds=i * step_seconds)).isoformat(),
+            'bid': 1.1 + i * 1e-5,
+            'ask': 1.1002 + i * 1e-5,
+            'volume': i,
+        }
+        for i in range(n)
+    ]
+
+
+def test_roundtrip_across_days(tmp_path):
+    store = TickArchiveStore(str(tmp_path), symbol='EURUSD')
+    start = datetime(2024, 2, 1, 20, 0)
+    ticks = _ticks(start, 60)              # 10 hours, crosses midnight
+    store.insert_ticks(ticks[:25])
+    store.insert_ticks(ticks[25:])
+    assert store.days() == ['2024-02-01', '2024-02-02']
+
+    cols = store.fetch_ticks(start)
+    assert cols['timestamp'].dtype == np.int64
+    assert len(cols['bid']) == 60
+    assert cols['volume'].tolist() == list(range(60))
+    expected = np.array([t['timestamp'] for t in ticks], dtype='datetime64[ns]').astype(np.int64)
+    assert cols['timestamp'].tolist() == expected.tolist()
+
+
+def test_range_query_returns_memmap_slice(tmp_path):
+    store = TickArchiveStore(str(tmp_path))
+    start = datetime(2024, 2, 1, 0, 0)
+    store.insert_ticks(_ticks(start, 100, step_seconds=60))
+    cols = store.fetch_ticks(start + timedelta(minutes=10), start + timedelta(minutes=20))
+    assert cols['volume'].tolist() == list(range(10, 20))
+    assert isinstance(cols['bid'], np.memmap)
+
+
+def test_symbols_are_kept_apart(tmp_path):
+    store = TickArchiveStore(str(tmp_path))
+    start = datetime(2024, 2, 1)
+    a = _ticks(start, 3)
+    b = [dict(t, symbol='GBPUSD') for t in _ticks(start, 5)]
+    store.insert_ticks(a + b)
+    assert len(store.fetch_ticks(start)['bid']) == 3
+    assert len(store.fetch_ticks(start, symbol='GBPUSD')['bid']) == 5
+    assert store.has_symbol_column()
+
+
+def test_missing_range_is_empty(tmp_path):
+    store = TickArchiveStore(str(tmp_path))
+    cols = store.fetch_ticks(datetime(2030, 1, 1))
+    assert all(len(c) == 0 for c in cols.values())
+
+
+def test_compacted_days_read_back_and_take_late_ticks(tmp_path):
+    store = TickArchiveStore(str(tmp_path), symbol='EURUSD')
+    start = datetime(2024, 2, 1, 20, 0)
+    ticks = _ticks(start, 60)              # 2024-02-01 and 2024-02-02
+    store.insert_ticks(ticks)
+    raw = store.fetch_ticks(start)
+
+    days, before, after = store.compact(datetime(2024, 2, 2, 12, 0))
+    assert days == 1 and after < before
+    day = tmp_path / 'EURUSD' / '2024-02-01'
+    assert sorted(os.listdir(day)) == ['ticks.fxtk']
+    cols = store.fetch_ticks(start)
+    assert cols['timestamp'].tolist() == raw['timestamp'].tolist()
+    assert cols['volume'].tolist() == raw['volume'].tolist()
+    np.testing.assert_allclose(cols['bid'], raw['bid'], atol=1e-9)
+    np.testing.assert_allclose(cols['ask'], raw['ask'], atol=1e-9)
+
+    # a late tick for the compacted day is merged in order, then compacted too
+    late = dict(ticks[1], timestamp=(start + timedelta(minutes=5)).isoformat(), volume=99)
+    store.insert_ticks([late])
+    assert store.fetch_ticks(start)['volume'].tolist()[:3] == [0, 99, 1]
+    assert store.compact(datetime(2024, 2, 2))[0] == 1
+    assert store.fetch_ticks(start)['volume'].tolist()[:3] == [0, 99, 1]
+    assert sorted(os.listdir(day)) == ['ticks.fxtk']
+
+
+def test_interrupted_compaction_loses_and_duplicates_nothing(tmp_path, monkeypatch):
+    store = TickArchiveStore(str(tmp_path))
+    start = datetime(2024, 2, 1)
+    store.insert_ticks(_ticks(start, 10))
+
+    def crash(src, dst):
+        raise OSError("power cut")
+
+    monkeypatch.setattr(os, 'replace', crash)
+    try:
+        store.compact(datetime(2024, 2, 2))
+    except OSError:
+        pass
+    monkeypatch.undo()
+    # the raw columns are gone, the day is read from the new file
+    assert store.fetch_ticks(start)['volume'].tolist() == list(range(10))
+    assert store.compact(datetime(2024, 2, 2))[0] == 0
+    assert sorted(os.listdir(tmp_path / 'default' / '2024-02-01')) == ['ticks.fxtk']
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from storage.async_store import AsyncStore
+from storage.store import SqliteStore
+
+
+def _tick(i):
+    ts = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return {'timestamp': ts.isoformat(), 'bid': 1.1, 'ask': 1.1001, 'volume': i}
+
+
+def _sqlite():
+    store = SqliteStore(':memory:')
+    store.conn.execute("CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL)")
+    return store
+
+
+class _SlowStore:
+    """Records the thread and takes `delay` seconds per commit."""
+    def __init__(self, delay):
+        self.delay = delay
+        self.batches = []
+        self.threads = set()
+
+    def insert_ticks(self, ticks):
+        time.sleep(self.delay)
+        self.threads.add(threading.current_thread().name)
+        self.batches.append(ticks)
+
+
+def test_write_does_not_wait_for_slow_commit():
+    store = _SlowStore(delay=0.05)
+
+    async def main():
+        async with AsyncStore(store, batch_size=50, flush_interval=0.01) as astore:
+            start = time.perf_counter()
+            for i in range(500):
+                await astore.write(_tick(i))
+            queued_in = time.perf_counter() - start
+        return queued_in
+
+    queued_in = asyncio.run(main())
+    assert queued_in < 0.1
+    assert sum(len(b) for b in store.batches) == 500
+    assert all(len(b) <= 50 for b in store.batches)
+    assert all(name.startswith('async-store-writer') for name in store.threads)
+
+
+def test_loop_stays_responsive_during_commit():
+    store = _SlowStore(delay=0.3)
+
+    async def main():
+        async with AsyncStore(store) as astore:
+            commit = asyncio.ensure_future(astore.insert_ticks([_tick(0)]))
+            ticks = 0
+            while not commit.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            await commit
+        return ticks
+
+    assert asyncio.run(main()) >= 10
+
+
+def test_sqlite_roundtrip_and_stream():
+    store = _sqlite()
+
+    async def main():
+        async with AsyncStore(store, batch_size=64) as astore:
+            for i in range(300):
+                await astore.write(_tick(i))
+            await astore.flush()
+            sizes = []
+            async for chunk in astore.fetch_ticks_iter('2024-01-01', chunk_size=128):
+                sizes.append(len(chunk['timestamp']))
+            return sizes, astore.written
+
+    sizes, written = asyncio.run(main())
+    assert sizes == [128, 128, 44]
+    assert written == 300
+
+
+@pytest.mark.skipif(not os.environ.get('MYTRADER_TEST_PG'),
+                    reason="set MYTRADER_TEST_PG to a libpq DSN to run against Postgres")
+def test_postgres_roundtrip():
+    import psycopg2
+    from storage.store import PostgresStore
+
+    # everything lives in a throwaway schema, never in the real tables
+    dsn = os.environ['MYTRADER_TEST_PG']
+    schema = f"async_store_test_{os.getpid()}"
+    setup = psycopg2.connect(dsn)
+    with setup.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"CREATE TABLE {schema}.pricesandvolume "
+                    "(timestamp TIMESTAMP, bid FLOAT8, ask FLOAT8, volume FLOAT8)")
+    setup.commit()
+    options = f"-c search_path={schema}"
+    writer = PostgresStore(None, conn=psycopg2.connect(dsn, options=options))
+    reader = PostgresStore(None, conn=psycopg2.connect(dsn, options=options))
+
+    async def main():
+        async with AsyncStore(writer, reader=reader, batch_size=100) as astore:
+            for i in range(250):
+                await astore.write(_tick(i))
+            await astore.flush()
+            total = 0
+            async for chunk in astore.fetch_ticks_iter(datetime(2024, 1, 1), chunk_size=100):
+                total += len(chunk['timestamp'])
+            return total
+
+    try:
+        assert asyncio.run(main()) == 250
+    finally:
+        writer.conn.close()
+        reader.conn.close()
+        with setup.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        setup.commit()
+        setup.close()
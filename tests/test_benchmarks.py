@@ -0,0 +1,54 @@
+import json
+
+from benchmarks import runner
+from benchmarks.__main__ import main
+
+
+def _results(**medians):
+    return {'meta': {}, 'results': {k: {'name': k, 'size': 1, 'median': v, 'min': v}
+                                    for k, v in medians.items()}}
+
+
+def test_compare_flags_regressions_above_threshold():
+    base = _results(a=1.0, b=1.0, c=1.0, d=1.0)
+    new = _results(a=1.05, b=1.2, c=0.5)
+    new['results']['d'] = {'name': 'd', 'size': 1, 'error': 'ImportError'}
+    base['results']['e'] = {'name': 'e', 'size': 1, 'error': 'ImportError'}
+    rows = {r[0]: r for r in runner.compare(base, new, threshold=0.10)}
+    assert set(rows) == {'a', 'b', 'c', 'd'}     # cases that failed in base are skipped
+    assert rows['a'][4] == ''
+    assert rows['b'][4] == 'REGRESSION'
+    assert rows['c'][4] == 'faster'
+    assert rows['d'][2:] == (None, None, 'ERROR')
+    new['results'].pop('d')
+    assert runner.compare(base, new)[-1][4] == 'MISSING'
+
+
+def test_time_case_calls_enough_times():
+    calls = []
+    number, timings = runner.time_case(lambda: calls.append(1), repeat=3, min_time=0.01)
+    assert len(timings) == 3 and number > 1
+    assert len(calls) == 1 + 3 * number
+
+
+def test_run_and_compare_cli(tmp_path, capsys):
+    out = tmp_path / 'r.json'
+    assert main(['run', '-k', 'candle_builder', '--sizes', '10000', '-o', str(out)]) == 0
+    data = json.loads(out.read_text())
+    case = data['results']['suite.candle_builder[10000]']
+    assert case['median'] > 0 and case['per_item'] == case['median'] / 10000
+    assert 'multi_interval_builder[100000]' not in ''.join(data['results'])
+    assert data['meta']['python']
+
+    slower = json.loads(out.read_text())
+    for r in slower['results'].values():
+        r['median'] *= 2
+    (tmp_path / 's.json').write_text(json.dumps(slower))
+    assert main(['compare', str(out), str(tmp_path / 's.json')]) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
+
+    slower['results'] = {}
+    (tmp_path / 's.json').write_text(json.dumps(slower))
+    assert main(['compare', str(out), str(tmp_path / 's.json')]) == 1
+    assert 'MISSING' in capsys.readouterr().out
+    assert main(['compare', str(out), str(out)]) == 0
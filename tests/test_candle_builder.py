@@ -0,0 +1,62 @@
+import datetime
+import random
+
+import pytest
+
+from aggregator.candle_builder import CandleBuilder, MultiIntervalCandleBuilder
+
+
+def _ticks(n, seed=3):
+    rnd = random.Random(seed)
+    ts = datetime.datetime(2024, 3, 4, 9, 7, 23)
+    price = 1.1
+    for _ in range(n):
+        # mostly sub-second spacing with occasional multi-minute gaps
+        gap = rnd.choice([0.2, 0.5, 1.5, 4.0]) if rnd.random() > 0.002 else rnd.uniform(60, 2000)
+        ts += datetime.timedelta(seconds=gap)
+        price += rnd.gauss(0, 1e-5)
+        yield {
+            'timestamp': ts.isoformat(),
+            'bid': price,
+            'ask': price + 0.0002,
+            'volume': rnd.randint(1, 5),
+        }
+
+
+def test_single_builder_emits_on_rollover():
+    b = CandleBuilder(60)
+    assert b.add_tick({'timestamp': '2024-01-01T10:00:10', 'bid': 1.0, 'ask': 1.0, 'volume': 1}) is None
+    assert b.add_tick({'timestamp': '2024-01-01T10:00:50', 'bid': 1.2, 'ask': 1.2, 'volume': 2}) is None
+    c = b.add_tick({'timestamp': '2024-01-01T10:01:00', 'bid': 1.1, 'ask': 1.1, 'volume': 3})
+    assert c == {
+        'timestamp': '2024-01-01T10:00:00',
+        'open': 1.0, 'high': 1.2, 'low': 1.0, 'close': 1.2, 'volume': 3,
+    }
+
+
+def test_cascading_matches_independent_builders():
+    intervals = [60, 300, 900, 3600, 14400]
+    plain = MultiIntervalCandleBuilder(intervals)
+    cascade = MultiIntervalCandleBuilder(intervals, cascade=True)
+    seen = 0
+    for tick in _ticks(20000):
+        expected = plain.add_tick(tick)
+        got = cascade.add_tick(tick)
+        assert got.keys() == expected.keys()
+        for interval, candle in expected.items():
+            assert got[interval]['timestamp'] == candle['timestamp']
+            for key in ('open', 'high', 'low', 'close', 'volume'):
+                assert got[interval][key] == pytest.approx(candle[key])
+            seen += 1
+        for interval in intervals:
+            live = cascade.current(interval)
+            ref = plain.builders[interval].current_candle()
+            assert live['timestamp'] == ref['timestamp']
+            assert live['close'] == pytest.approx(ref['close'])
+            assert live['volume'] == pytest.approx(ref['volume'])
+    assert seen > 100
+
+
+def test_cascading_rejects_non_multiple_intervals():
+    with pytest.raises(ValueError):
+        MultiIntervalCandleBuilder([60, 90], cascade=True)
@@ -0,0 +1,131 @@
+import sqlite3
+
+import pytest
+
+from storage.candle_cache import CandleCache
+
+
+class _CountingCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        self.connection.queries.append(tuple(params))
+        return super().execute(sql, params)
+
+
+class _CountingConn(sqlite3.Connection):
+    """sqlite3 connection that records the parameters of every query."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = []
+        self.execute(
+            "CREATE TABLE candles_m1 (timestamp TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL)"
+        )
+
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+    def add(self, minute, close, volume=1.0):
+        self.execute(
+            "INSERT INTO candles_m1 VALUES (?,?,?,?,?,?)",
+            (f'2024-01-01T{minute // 60:02d}:{minute % 60:02d}:00', 1.0, 2.0, 0.5, close, volume)
+        )
+
+
+@pytest.fixture
+def conn():
+    c = sqlite3.connect(':memory:', factory=_CountingConn)
+    for m in range(100):
+        c.add(m, 1.0 + m)
+    return c
+
+
+def test_second_read_only_fetches_the_tail(conn, tmp_path):
+    cache = CandleCache(str(tmp_path))
+    first = cache.get(conn, 'candles_m1')
+    assert len(first['close']) == 100
+    conn.queries.clear()
+
+    conn.add(100, 101.0)
+    second = cache.get(conn, 'candles_m1')
+    assert len(second['close']) == 101
+    assert conn.queries == [('2024-01-01T01:39:00',)]
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_trailing_bar_update_replaces_cached_bar(conn, tmp_path):
+    cache = CandleCache(str(tmp_path))
+    cache.get(conn, 'candles_m1')
+    conn.execute("UPDATE candles_m1 SET close = 555 WHERE timestamp = '2024-01-01T01:39:00'")
+    cols = cache.get(conn, 'candles_m1')
+    assert len(cols['close']) == 100
+    assert cols['close'][-1] == 555
+
+
+def test_disk_copy_survives_a_new_process(conn, tmp_path):
+    CandleCache(str(tmp_path)).get(conn, 'candles_m1')
+    conn.queries.clear()
+    fresh = CandleCache(str(tmp_path))
+    cols = fresh.get(conn, 'candles_m1', limit=5)
+    assert cols['close'].tolist() == [96.0, 97.0, 98.0, 99.0, 100.0]
+    assert len(conn.queries) == 1
+
+
+def test_earlier_range_fetches_only_missing_head(conn, tmp_path):
+    cache = CandleCache(str(tmp_path))
+    cache.get(conn, 'candles_m1', since='2024-01-01T01:00:00')
+    conn.queries.clear()
+    cols = cache.get(conn, 'candles_m1', since='2024-01-01T00:30:00', until='2024-01-01T00:40:00')
+    assert cols['close'].tolist() == [31.0 + i for i in range(10)]
+    assert conn.queries[0] == ('2024-01-01T00:30:00', '2024-01-01T01:00:00')
+
+
+def test_lru_eviction_respects_budget(conn, tmp_path):
+    conn.execute("CREATE TABLE candles_m5 AS SELECT * FROM candles_m1")
+    cache = CandleCache(str(tmp_path), memory_budget=1)
+    cache.get(conn, 'candles_m1')
+    cache.get(conn, 'candles_m5')
+    assert list(cache._entries) == [('candles_m5', None)]
+    # evicted from memory, still served from disk plus a tail query
+    assert len(cache.get(conn, 'candles_m1')['close']) == 100
+
+
+def test_invalidate_refetches_changed_bars_in_every_cache(conn, tmp_path):
+    reader = CandleCache(str(tmp_path))
+    reader.get(conn, 'candles_m1')
+    conn.queries.clear()
+
+    # a back-fill in another process rewrites bars from 00:50 on
+    conn.execute("UPDATE candles_m1 SET close = 0 WHERE timestamp >= '2024-01-01T00:50:00'")
+    CandleCache(str(tmp_path)).invalidate('candles_m1', since='2024-01-01T00:50:00')
+    cols = reader.get(conn, 'candles_m1', refresh=False)
+    assert conn.queries == [('2024-01-01T00:49:00',)]
+    assert cols['close'][49] == 50.0 and not cols['close'][50:].any()
+    assert len(cols['close']) == 100
+
+    # already applied, and the disk copy remembers it as well
+    conn.queries.clear()
+    CandleCache(str(tmp_path)).get(conn, 'candles_m1', refresh=False)
+    assert conn.queries == []
+
+
+def test_invalidate_other_symbol_or_whole_table(conn, tmp_path):
+    cache = CandleCache(str(tmp_path))
+    cache.get(conn, 'candles_m1', symbol=None)
+    cache.invalidate('candles_m1', 'USDJPY', since='2024-01-01T00:10:00')
+    conn.queries.clear()
+    assert len(cache.get(conn, 'candles_m1')['close']) == 100
+    # the all-symbols view includes USDJPY: refetched from 00:09
+    assert conn.queries == [('2024-01-01T00:09:00',)]
+
+    cache.invalidate('candles_m1')
+    cache.get(conn, 'candles_m1')
+    assert cache.misses == 2
+
+
+def test_restarted_change_log_reloads_in_full(conn, tmp_path):
+    cache = CandleCache(str(tmp_path), max_log_bytes=10)
+    cache.invalidate('candles_m1', since='2024-01-01T00:10:00')
+    cache.get(conn, 'candles_m1')
+    cache.invalidate('candles_m1', since='2024-01-01T00:20:00')
+    cache.invalidate('candles_m1', since='2024-01-01T00:30:00')    # log over 10 bytes: restarted
+    cols = cache.get(conn, 'candles_m1')
+    assert cache.misses == 2 and len(cols['close']) == 100
@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from storage.indicators import CandleColumns, load_candle_columns
+
+
+@pytest.fixture
+def conn():
+    c = sqlite3.connect(':memory:')
+    c.execute(
+        "CREATE TABLE candles_m1 (timestamp TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL)"
+    )
+    c.executemany(
+        "INSERT INTO candles_m1 VALUES (?,?,?,?,?,?)",
+        [(f'2024-01-01T00:{i:02d}:00', 1.0, 1.2, 0.9, 1.0 + i / 100, i) for i in range(60)]
+    )
+    return c
+
+
+def test_columns_are_numpy_and_ordered(conn):
+    cols = load_candle_columns(conn, 'candles_m1', chunk_size=7)
+    assert cols['time'].dtype == np.dtype('datetime64[us]')
+    assert cols['close'].dtype == np.float64
+    assert len(cols['close']) == 60
+    assert np.all(np.diff(cols['time'].astype(np.int64)) > 0)
+    assert cols['volume'].tolist() == list(range(60))
+
+
+def test_limit_returns_most_recent_rows_ascending(conn):
+    cols = load_candle_columns(conn, 'candles_m1', limit=3)
+    assert cols['volume'].tolist() == [57, 58, 59]
+
+
+def test_time_range(conn):
+    cols = load_candle_columns(conn, 'candles_m1', since='2024-01-01T00:10:00',
+                               until='2024-01-01T00:13:00')
+    assert cols['volume'].tolist() == [10, 11, 12]
+
+
+def test_empty_table(conn):
+    conn.execute("DELETE FROM candles_m1")
+    cols = load_candle_columns(conn, 'candles_m1')
+    assert all(len(c) == 0 for c in cols.values())
+
+
+def test_candle_columns_view(conn):
+    view = CandleColumns(load_candle_columns(conn, 'candles_m1'))
+    assert len(view) == 60
+    assert view[-1] == {
+        'time': datetime(2024, 1, 1, 0, 59),
+        'open': 1.0, 'high': 1.2, 'low': 0.9, 'close': pytest.approx(1.59), 'volume': 59.0,
+    }
+    head = view[:10]
+    assert len(head) == 10 and head[-1]['volume'] == 9.0
+    assert head.column('volume').tolist() == list(range(10))
+    assert not view[:0]
+    with pytest.raises(IndexError):
+        head[10]
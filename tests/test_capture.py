@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from aggregator.records import Tick
+from collector.capture import TICK_DTYPE, CaptureReader, CaptureWriter, segments
+
+
+def _ticks(n):
+    start = datetime(2024, 1, 1, 10)
+    for i in range(n):
+        ts = start + timedelta(seconds=i, microseconds=i % 7)
+        yield Tick(ts.isoformat(),
+                   'EURUSD' if i % 3 else 'USDJPY', 1.1 + i * 1e-5, 1.1002 + i * 1e-5,
+                   float(i % 5), None if i % 4 == 0 else 1.0, 2.0)
+
+
+def test_ticks_and_raw_roundtrip_across_segments(tmp_path):
+    ticks = list(_ticks(3000))
+    with CaptureWriter(str(tmp_path), segment_bytes=20_000, batch_size=100) as w:
+        for i, t in enumerate(ticks):
+            w.write_raw(b'msg-%d' % i)
+            w.write_tick(t)
+    assert w.segments > 1 and w.dropped == 0
+
+    reader = CaptureReader(str(tmp_path))
+    assert len(reader.segments()) == w.segments
+    assert list(reader.ticks()) == ticks
+    assert [m for _, m in reader.raw()] == [b'msg-%d' % i for i in range(3000)]
+
+    jpy = reader.columns(since='2024-01-01T10:10:00', until='2024-01-01T10:20:00', symbol='USDJPY')
+    expected = [t for t in ticks if t.symbol == 'USDJPY' and '10:10' <= t.timestamp[11:16] < '10:20']
+    assert len(jpy) == len(expected)
+    np.testing.assert_allclose(jpy['bid'], [t.bid for t in expected])
+
+    # ticks() reads segment by segment, without concatenating the capture
+    parts = list(reader.iter_columns())
+    assert len(parts) == w.segments and all(isinstance(p, np.memmap) for p in parts)
+    reader.columns = None
+    assert list(reader.ticks(symbol='USDJPY')) == [t for t in ticks if t.symbol == 'USDJPY']
+
+
+def test_partial_records_are_ignored_and_new_writer_appends(tmp_path):
+    with CaptureWriter(str(tmp_path)) as w:
+        for t in _ticks(10):
+            w.write_tick(t)
+            w.write_raw(b'x' * 10)
+    stem = segments(str(tmp_path))[0]
+    with open(stem + '.ticks', 'ab') as f:
+        f.write(b'\0' * (TICK_DTYPE.itemsize // 2))
+    with open(stem + '.raw', 'ab') as f:
+        f.write(b'\1' * 5)
+
+    with CaptureWriter(str(tmp_path)) as w:
+        w.write_tick(next(_ticks(1)))
+    reader = CaptureReader(str(tmp_path))
+    assert len(reader.segments()) == 2
+    assert len(reader.columns()) == 11
+    assert len(list(reader.raw())) == 10
+
+
+def test_collector_replay_reproduces_live_ticks(tmp_path):
+    pytest.importorskip('websockets')
+    from collector.saxo import SaxoCollector, encode_frame
+
+    messages = [encode_frame(i, 'prices', [{
+        'Uic': 21, 'LastUpdated': f'2024-01-01T10:00:{i % 60:02d}.000000Z',
+        'Quote': {'Bid': 1.1 + i * 1e-5, 'Ask': 1.1001 + i * 1e-5, 'BidSize': 1e6},
+    }]) for i in range(1, 200)]
+    messages.insert(50, encode_frame(500, '_heartbeat', []))
+    config = SimpleNamespace(endpoint='ws://unused', symbols=['EURUSD'], uics={'EURUSD': 21})
+
+    live, replayed = [], []
+    with CaptureWriter(str(tmp_path)) as w:
+        first = SaxoCollector(config, capture=w)
+        first.on_tick(live.append)
+        asyncio.run(first.replay_async(messages))
+
+    second = SaxoCollector(config)
+    second.on_tick(replayed.append)
+    asyncio.run(second.replay_async(CaptureReader(str(tmp_path)).raw()))
+    assert len(live) == 199
+    assert replayed == live == list(CaptureReader(str(tmp_path)).ticks())
@@ -0,0 +1,103 @@
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip('requests')
+from collector.chart_downloader import PAGE_SIZE, ChartDownloader, parse_time
+
+
+class _ChartStandIn(BaseHTTPRequestHandler):
+    """Serves 1-minute bars for every weekday minute; fails the first call with a 503."""
+    calls = []
+    fail_next = True
+
+    def do_GET(self):
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        type(self).calls.append(q)
+        if type(self).fail_next:
+            type(self).fail_next = False
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        t = parse_time(q['Time'])
+        step = timedelta(minutes=int(q['Horizon']))
+        bars = []
+        while len(bars) < int(q['Count']):
+            if t.weekday() < 5:
+                price = 1.1 + (t.timestamp() % 3600) * 1e-6
+                bars.append({'Time': t.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                             'OpenBid': price, 'HighBid': price + 1e-4,
+                             'LowBid': price - 1e-4, 'CloseBid': price})
+            t += step
+        body = json.dumps({'Data': bars}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    _ChartStandIn.calls = []
+    _ChartStandIn.fail_next = True
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ChartStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/chart/v3/charts"
+    server.shutdown()
+
+
+def _downloader(api, tmp_path):
+    return ChartDownloader('token', 21, api_url=api, cache_dir=str(tmp_path), rate=1000)
+
+
+def test_pages_are_grid_aligned():
+    d = ChartDownloader('t', 21, session=object())
+    a = d.pages(datetime(2024, 1, 3, 5, 17), datetime(2024, 1, 3, 9), 1)
+    b = d.pages(datetime(2024, 1, 3, 2), datetime(2024, 1, 3, 9), 1)
+    assert a[0] in b and all((p - a[0]) % timedelta(minutes=PAGE_SIZE) == timedelta(0) for p in b)
+
+
+def test_concurrent_fetch_then_served_from_cache(api, tmp_path):
+    start = datetime(2024, 1, 4, 12, 0)          # Thursday, across a weekend
+    end = start + timedelta(days=5)
+    first = _downloader(api, tmp_path)
+    bars = first.candles(start, end)
+    times = [b['timestamp'] for b in bars]
+    assert times == sorted(times) and len(set(times)) == len(times)
+    assert times[0] == start.replace(tzinfo=timezone.utc)
+    assert all(t.weekday() < 5 for t in times)
+    assert len(bars) == 3 * 24 * 60               # Thu 12:00 .. Tue 12:00, weekdays only
+    assert first.requests == len(first.pages(start, end, 1))
+    assert len(_ChartStandIn.calls) == first.requests + 1     # one 503 retried
+
+    _ChartStandIn.calls = []
+    again = _downloader(api, tmp_path)
+    assert again.candles(start, end) == bars
+    assert _ChartStandIn.calls == [] and again.requests == 0
+    # a narrower window inside the cached one is also served from disk
+    assert len(again.fetch(start + timedelta(hours=1), start + timedelta(hours=2))) == 60
+    assert _ChartStandIn.calls == []
+
+    # other sample fields are cached apart, not served from the LastTraded pages
+    plain = ChartDownloader('token', 21, api_url=api, cache_dir=str(tmp_path), rate=1000,
+                            field_set=None)
+    plain.fetch(start, start + timedelta(hours=1))
+    assert plain.requests == 1 and plain.cache_hits == 0
+
+
+def test_unfinished_page_is_not_cached(api, tmp_path):
+    now = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    d = _downloader(api, tmp_path)
+    d.fetch(now - timedelta(hours=1), now)
+    d.fetch(now - timedelta(hours=1), now)
+    # the page holding `now` is still filling, so it is downloaded both times
+    assert d.requests - d.cache_hits >= 2
@@ -0,0 +1,134 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from collector.history_sync import HistorySync, find_gaps, fx_closed
+from aggregator.resample import to_epoch_ns
+
+UTC = timezone.utc
+
+
+def test_weekend_close_follows_new_york_time():
+    winter = to_epoch_ns([datetime(2024, 1, 5, 21, 59), datetime(2024, 1, 5, 22, 0),
+                          datetime(2024, 1, 7, 21, 59), datetime(2024, 1, 7, 22, 0)])
+    summer = to_epoch_ns([datetime(2024, 7, 5, 20, 59), datetime(2024, 7, 5, 21, 0),
+                          datetime(2024, 7, 7, 20, 59), datetime(2024, 7, 7, 21, 0)])
+    assert fx_closed(winter).tolist() == [False, True, True, False]
+    assert fx_closed(summer).tolist() == [False, True, True, False]
+
+
+def test_gaps_skip_weekends_and_merge():
+    start, end = datetime(2024, 7, 5, 20, 0), datetime(2024, 7, 7, 23, 0)   # Fri .. Sun, summer time
+    have = [start + timedelta(minutes=m) for m in range(60)]                # Fri 20:00-20:59
+    assert find_gaps(have, start, end, 1) == [
+        (datetime(2024, 7, 7, 21, 0, tzinfo=UTC), datetime(2024, 7, 7, 23, 0, tzinfo=UTC)),
+    ]
+    holes = [t for t in have if t.minute not in (10, 11, 30)]
+    assert find_gaps(holes, start, start + timedelta(hours=1), 1) == [
+        (datetime(2024, 7, 5, 20, 10, tzinfo=UTC), datetime(2024, 7, 5, 20, 12, tzinfo=UTC)),
+        (datetime(2024, 7, 5, 20, 30, tzinfo=UTC), datetime(2024, 7, 5, 20, 31, tzinfo=UTC)),
+    ]
+    merged = find_gaps(holes, start, start + timedelta(hours=1), 1, merge_within=timedelta(hours=1))
+    assert merged == [(datetime(2024, 7, 5, 20, 10, tzinfo=UTC), datetime(2024, 7, 5, 20, 31, tzinfo=UTC))]
+
+
+class _Store:
+    placeholder = '?'
+
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute("CREATE TABLE candles_m1 (timestamp TEXT, open REAL, high REAL, "
+                          "low REAL, close REAL, volume REAL)")
+
+    def to_db_time(self, dt):
+        return dt.isoformat()
+
+
+class _Downloader:
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, start, end, horizon):
+        self.calls.append((start, end))
+        bars, t = [], start
+        while t < end:
+            bars.append({'Time': t.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+                         'OpenBid': 1.0, 'OpenAsk': 1.2, 'HighBid': 1.1, 'HighAsk': 1.3,
+                         'LowBid': 0.9, 'LowAsk': 1.1, 'CloseBid': 1.0, 'CloseAsk': 1.2})
+            t += timedelta(minutes=horizon)
+        return bars
+
+
+def test_sync_fetches_only_missing_and_keeps_existing_rows():
+    store = _Store()
+    start = datetime(2024, 1, 3, 10, 0)
+    for m in list(range(0, 30)) + list(range(45, 50)):
+        store.conn.execute("INSERT INTO candles_m1 VALUES (?,?,?,?,?,?)",
+                           ((start + timedelta(minutes=m)).isoformat(), 5, 5, 5, 5, 7))
+    dl = _Downloader()
+    job = HistorySync(store, {'EURUSD': dl})
+    report = job.sync('EURUSD', 1, start, start + timedelta(hours=1))
+    assert report['latest'] == datetime(2024, 1, 3, 10, 49, tzinfo=UTC)
+    # 30..44 and 50..59 are within one page of each other: one request
+    assert dl.calls == [(datetime(2024, 1, 3, 10, 30, tzinfo=UTC), datetime(2024, 1, 3, 11, 0, tzinfo=UTC))]
+    assert report['inserted'] == 25
+    rows = store.conn.execute("SELECT timestamp, open, close, volume FROM candles_m1 ORDER BY timestamp").fetchall()
+    assert len(rows) == 60
+    assert rows[29] == ('2024-01-03T10:29:00', 5, 5, 7)
+    assert rows[30] == ('2024-01-03T10:30:00', pytest.approx(1.1), pytest.approx(1.1), 0.0)
+
+    again = job.sync('EURUSD', 1, start, start + timedelta(hours=1))
+    assert again['gaps'] == [] and len(dl.calls) == 1
+
+
+def test_sync_refuses_several_symbols_without_symbol_column():
+    store = _Store()
+    dl = _Downloader()
+    job = HistorySync(store, {'EURUSD': dl, 'USDJPY': _Downloader()})
+    start = datetime(2024, 1, 3, 10, 0)
+    with pytest.raises(ValueError, match='no symbol column'):
+        job.sync('EURUSD', 1, start, start + timedelta(hours=1))
+    assert dl.calls == []
+
+    store.conn.execute("ALTER TABLE candles_m1 ADD COLUMN symbol TEXT NOT NULL DEFAULT ''")
+    job.sync('EURUSD', 1, start, start + timedelta(minutes=10))
+    job.sync('USDJPY', 1, start, start + timedelta(minutes=10))
+    counts = store.conn.execute("SELECT symbol, COUNT(*) FROM candles_m1 GROUP BY symbol ORDER BY symbol").fetchall()
+    assert counts == [('EURUSD', 10), ('USDJPY', 10)]
+
+
+def test_sync_reports_the_first_inserted_bar_to_the_cache():
+    class _Cache:
+        def __init__(self):
+            self.calls = []
+
+        def invalidate(self, table, symbol=None, since=None):
+            self.calls.append((table, symbol, since))
+
+    store, cache = _Store(), _Cache()
+    start = datetime(2024, 1, 3, 10, 0)
+    job = HistorySync(store, {'EURUSD': _Downloader()}, cache=cache)
+    job.sync('EURUSD', 1, start, start + timedelta(minutes=10))
+    job.sync('EURUSD', 1, start, start + timedelta(minutes=10))
+    assert cache.calls == [('candles_m1', None, start)]
+
+
+def test_bars_written_meanwhile_are_skipped_not_duplicated():
+    store = _Store()
+    store.conn.execute("CREATE UNIQUE INDEX candles_m1_ts ON candles_m1 (timestamp)")
+    start = datetime(2024, 1, 3, 10, 0)
+    job = HistorySync(store, {'EURUSD': _Downloader()})
+    existing = job._existing
+
+    def racing(cur, *args):
+        # the materializer commits a bar after the sync has read the table
+        rows = existing(cur, *args)
+        store.conn.execute("INSERT INTO candles_m1 VALUES (?,?,?,?,?,?)",
+                           (start.isoformat(), 5, 5, 5, 5, 7))
+        return rows
+
+    job._existing = racing
+    assert job.sync('EURUSD', 1, start, start + timedelta(minutes=10))['inserted'] == 9
+    rows = store.conn.execute("SELECT timestamp, open FROM candles_m1 ORDER BY timestamp").fetchall()
+    assert len(rows) == 10 and rows[0] == (start.isoformat(), 5)
@@ -0,0 +1,80 @@
+import json
+import random
+import timeit
+
+import pytest
+
+from aggregator.records import Tick
+from app.latency import LatencyHistogram, LatencyRecorder, format_stats, write_stats
+from app.pipeline import collect_pipeline
+from collector.router import SymbolRouter
+
+
+class NullStore:
+    def insert_ticks(self, ticks):
+        pass
+
+
+class EveryTickState:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def aggregate(self, tick):
+        return tick.bid
+
+    def evaluate(self, tick, bar):
+        return 'Hold'
+
+
+def test_histogram_percentiles_are_within_bucket_precision():
+    rnd = random.Random(5)
+    values = sorted(int(rnd.lognormvariate(10, 1.5)) for _ in range(50_000))
+    h = LatencyHistogram()
+    for v in values:
+        h.record(v)
+    assert h.count == len(values)
+    for p in (50, 90, 99, 99.9):
+        exact = values[int(len(values) * p / 100) - 1]
+        assert h.percentile(p) == pytest.approx(exact, rel=0.02)
+    assert h.max() == pytest.approx(values[-1], rel=0.02)
+    h.record(-5)
+    h.record(10 ** 18)                 # clamped, not an IndexError
+    assert h.count == len(values) + 2
+
+
+def test_record_is_sub_microsecond():
+    h = LatencyHistogram()
+    per_call = min(timeit.repeat('r(123456)', globals={'r': h.record}, number=100_000, repeat=5))
+    assert per_call / 100_000 < 1e-6
+
+
+def test_pipeline_records_stage_latencies(tmp_path):
+    latency = LatencyRecorder()
+    pipeline = collect_pipeline(NullStore(), SymbolRouter(EveryTickState), lambda *a: None,
+                                latency=latency, stats_file=str(tmp_path / 'stats.json'))
+    ticks = [Tick(f'2024-01-01T10:00:{i % 60:02d}', 'EURUSD', 1.1, 1.1, 1.0) for i in range(500)]
+    with pipeline:
+        for t in ticks:
+            pipeline.submit(t)
+    assert all(t.trace is not None and t.trace[-1] >= t.trace[0] for t in ticks)
+    snap = latency.snapshot()
+    for stage in ('queue', 'aggregate', 'strategy', 'order', 'tick_to_signal', 'tick_to_order'):
+        assert snap[stage]['count'] == 500
+    assert snap['persist']['count'] >= 1
+    assert 'indicators' not in snap          # the stand-in strategy has none
+
+    pipeline.report()
+    data = json.loads((tmp_path / 'stats.json').read_text())
+    assert {s['stage'] for s in data['stages']} >= {'ingest', 'persist', 'execute'}
+    text = format_stats(data)
+    assert 'tick_to_signal' in text and 'aggregate' in text
+
+
+def test_tracing_off_leaves_ticks_untouched(tmp_path):
+    pipeline = collect_pipeline(NullStore(), SymbolRouter(EveryTickState), lambda *a: None)
+    tick = Tick('2024-01-01T10:00:00', 'EURUSD', 1.1, 1.1, 1.0)
+    with pipeline:
+        pipeline.submit(tick)
+    assert tick.trace is None
+    write_stats(str(tmp_path / 's.json'), pipeline.stats())
+    assert 'latency' not in format_stats(json.loads((tmp_path / 's.json').read_text()))
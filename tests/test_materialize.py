@@ -0,0 +1,187 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from aggregator.materialize import CandleMaterializer, candle_table, floor_time
+
+
+class _SqliteTicks:
+    """Just enough of SqliteStore for the materializer, without config loading."""
+    placeholder = '?'
+
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute(
+            "CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL)"
+        )
+
+    def to_db_time(self, dt):
+        return dt.isoformat()
+
+    def add(self, ts, price, volume=1.0):
+        self.conn.execute(
+            "INSERT INTO pricesandvolume VALUES (?,?,?,?)",
+            (ts.isoformat(), price, price, volume)
+        )
+        self.conn.commit()
+
+
+def _candles(store, table):
+    return store.conn.execute(
+        f"SELECT timestamp, open, high, low, close, volume FROM {table} ORDER BY timestamp"
+    ).fetchall()
+
+
+def test_names_and_flooring():
+    assert [candle_table(i) for i in (30, 60, 900, 3600)] == \
+        ['candles_s30', 'candles_m1', 'candles_m15', 'candles_h1']
+    assert floor_time(datetime(2024, 1, 1, 10, 7, 59), 300) == datetime(2024, 1, 1, 10, 5)
+
+
+def test_incremental_runs_match_full_rebuild():
+    t0 = datetime(2024, 1, 1, 10, 0, 0)
+    incremental = _SqliteTicks()
+    full = _SqliteTicks()
+    job = CandleMaterializer(incremental, chunk=timedelta(minutes=20))
+    job.ensure_tables()
+
+    for step in range(240):
+        ts = t0 + timedelta(seconds=17 * step)
+        if step >= 120:
+            ts += timedelta(days=2)          # weekend-sized gap
+        price = 1.1 + (step % 11) * 1e-4
+        for store in (incremental, full):
+            store.add(ts, price, volume=step % 3 + 1)
+        if step % 37 == 0:
+            job.run_once()
+    job.run_once()
+    assert job.high_water_mark() is not None
+
+    rebuild = CandleMaterializer(full)
+    rebuild.ensure_tables()
+    assert rebuild.run_once() == 240
+    for table in ('candles_m1', 'candles_m5', 'candles_m15'):
+        got, want = _candles(incremental, table), _candles(full, table)
+        assert len(got) == len(want) > 0
+        for a, b in zip(got, want):
+            assert a[0] == b[0]
+            assert a[1:] == pytest.approx(b[1:])
+
+
+def test_trailing_bar_is_replaced_not_duplicated():
+    store = _SqliteTicks()
+    job = CandleMaterializer(store, intervals=[60])
+    job.ensure_tables()
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    store.add(t0, 1.0)
+    job.run_once()
+    store.add(t0 + timedelta(seconds=20), 1.2, volume=2.0)
+    job.run_once()
+    assert _candles(store, 'candles_m1') == [
+        ('2024-01-01T10:00:00', 1.0, 1.2, 1.0, 1.2, 3.0),
+    ]
+
+
+def test_coarsest_covers_every_interval():
+    assert CandleMaterializer(_SqliteTicks(), intervals=[300, 420]).coarsest == 2100
+    assert CandleMaterializer(_SqliteTicks(), intervals=[60, 420], rollups=True).coarsest == 25200
+
+
+def test_candles_are_built_and_replaced_per_symbol():
+    store = _SqliteTicks()
+    store.conn.execute("ALTER TABLE pricesandvolume ADD COLUMN symbol TEXT NOT NULL DEFAULT ''")
+    job = CandleMaterializer(store, intervals=[60])
+    job.ensure_tables()
+    # a back-filled bar of another symbol in the same minute must survive
+    store.conn.execute("INSERT INTO candles_m1 (symbol, timestamp, open, high, low, close, volume) "
+                       "VALUES ('GBPUSD', '2024-01-01T10:00:00', 2, 2, 2, 2, 9)")
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    for i, (symbol, price) in enumerate([('EURUSD', 1.1), ('USDJPY', 150.0), ('EURUSD', 1.2)]):
+        store.conn.execute("INSERT INTO pricesandvolume VALUES (?,?,?,?,?)",
+                           ((t0 + timedelta(seconds=i)).isoformat(), price, price, 1.0, symbol))
+    job.run_once()
+    job.run_once()
+    rows = store.conn.execute("SELECT symbol, open, close, volume FROM candles_m1 ORDER BY symbol").fetchall()
+    assert rows == [('EURUSD', 1.1, 1.2, 2.0), ('GBPUSD', 2, 2, 9), ('USDJPY', 150.0, 150.0, 1.0)]
+
+
+def test_several_symbols_need_a_symbol_column():
+    store = _SqliteTicks()
+    store.conn.execute("ALTER TABLE pricesandvolume ADD COLUMN symbol TEXT NOT NULL DEFAULT ''")
+    store.conn.execute("CREATE TABLE candles_m1 (timestamp TEXT, open REAL, high REAL, "
+                       "low REAL, close REAL, volume REAL)")
+    job = CandleMaterializer(store, intervals=[60])
+    job.ensure_tables()
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    for i, symbol in enumerate(['EURUSD', 'USDJPY']):
+        store.conn.execute("INSERT INTO pricesandvolume VALUES (?,?,?,?,?)",
+                           ((t0 + timedelta(seconds=i)).isoformat(), 1.0, 1.0, 1.0, symbol))
+    with pytest.raises(ValueError, match='no symbol column'):
+        job.run_once()
+
+
+def test_rewritten_chunks_are_reported_to_the_cache(tmp_path):
+    from storage.candle_cache import CandleCache
+    store = _SqliteTicks()
+    cache = CandleCache(str(tmp_path))
+    job = CandleMaterializer(store, intervals=[60, 300], cache=cache)
+    job.ensure_tables()
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    store.add(t0, 1.0)
+    store.add(t0 + timedelta(minutes=2), 1.5)
+    job.run_once()
+    assert cache.get(store.conn, 'candles_m1')['close'].tolist() == [1.0, 1.5]
+
+    # a late tick lands in an earlier, already cached minute of the open m5 bar
+    store.add(t0 + timedelta(seconds=30), 1.2)
+    job.run_once()
+    assert cache.get(store.conn, 'candles_m1', refresh=False)['close'].tolist() == [1.2, 1.5]
+
+
+def test_late_commits_are_picked_up():
+    from aggregator.materialize import rewind_high_water_marks
+    store = _SqliteTicks()
+    job = CandleMaterializer(store, intervals=[60], lateness=timedelta(minutes=5))
+    job.ensure_tables()
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    store.add(t0, 1.0)
+    store.add(t0 + timedelta(hours=1), 1.1)
+    job.run_once()
+
+    # a slow symbol commits a few minutes behind: inside the lateness window
+    store.add(t0 + timedelta(minutes=57), 1.3)
+    job.run_once()
+    assert ('2024-01-01T10:57:00', 1.3, 1.3, 1.3, 1.3, 1.0) in _candles(store, 'candles_m1')
+
+    # a replayed spill an hour behind needs the rewind
+    store.add(t0 + timedelta(minutes=2), 1.2)
+    job.run_once()
+    assert len(_candles(store, 'candles_m1')) == 3
+    assert rewind_high_water_marks(store, t0 + timedelta(minutes=2)) == 1
+    job.run_once()
+    assert len(_candles(store, 'candles_m1')) == 4
+    assert job.high_water_mark() == t0 + timedelta(hours=1)
+
+
+def test_rewind_during_a_run_is_kept():
+    from aggregator.materialize import rewind_high_water_marks
+    store = _SqliteTicks()
+    job = CandleMaterializer(store, intervals=[60], chunk=timedelta(minutes=1), lateness=timedelta(0))
+    job.ensure_tables()
+    t0 = datetime(2024, 1, 1, 10, 0, 5)
+    store.add(t0, 1.0)
+    job.run_once()
+    for i in range(1, 4):
+        store.add(t0 + timedelta(minutes=i), 1.0)
+
+    process_chunk = job.process_chunk
+
+    def rewound(*args):
+        rewind_high_water_marks(store, t0)
+        return process_chunk(*args)
+
+    job.process_chunk = rewound
+    # the third chunk finds the mark rewound: it keeps the rewind and stops there
+    assert job.run_once() == 3
+    assert job.high_water_mark() == t0
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+from aggregator.records import Tick
+from app.pipeline import Pipeline, collect_pipeline
+from collector.router import SymbolRouter
+
+
+class SlowStore:
+    def __init__(self, delay):
+        self.delay = delay
+        self.rows = []
+        self.calls = 0
+
+    def insert_ticks(self, ticks):
+        time.sleep(self.delay)
+        self.calls += 1
+        self.rows.extend(ticks)
+
+
+class EveryTickState:
+    """Closes a 'bar' on every tick and signals its price."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def aggregate(self, tick):
+        return tick.bid
+
+    def evaluate(self, tick, bar):
+        return bar
+
+
+def _tick(i, symbol='EURUSD'):
+    return Tick(f'2024-01-01T10:00:{i % 60:02d}', symbol, float(i), float(i), 1.0)
+
+
+def test_signals_do_not_wait_for_the_database():
+    store = SlowStore(delay=0.5)
+    signals = []
+    first_signal = threading.Event()
+
+    def on_signal(symbol, tick, signal):
+        signals.append((symbol, signal))
+        first_signal.set()
+
+    pipeline = collect_pipeline(store, SymbolRouter(EveryTickState), on_signal).start()
+    t0 = time.monotonic()
+    for i in range(100):
+        pipeline.submit(_tick(i, 'EURUSD' if i % 2 else 'GBPUSD'))
+    assert first_signal.wait(2.0)
+    assert time.monotonic() - t0 < 0.4          # well before the first commit returns
+    pipeline.close()
+
+    assert len(store.rows) == 100 and store.calls < 100      # group commits
+    assert [s for sym, s in signals if sym == 'EURUSD'] == [float(i) for i in range(1, 100, 2)]
+    stats = {s['stage']: s for s in pipeline.stats()}
+    assert stats['ingest']['processed'] == 100
+    assert stats['persist']['processed'] == 100
+    assert stats['execute']['processed'] == 100
+    assert all(s['dropped'] == 0 and s['errors'] == 0 for s in stats.values())
+
+
+def test_stage_errors_and_drop_policy():
+    pipeline = Pipeline()
+    gate = threading.Event()
+    out = []
+
+    def slow(item):
+        gate.wait()
+        if item == 3:
+            raise ValueError('bad item')
+        return item
+
+    first = pipeline.stage('first', slow, maxsize=2, policy='drop_newest')
+    pipeline.stage('sink', out.append, after=first)
+    pipeline.start()
+    for i in range(10):
+        pipeline.submit(i)
+    gate.set()
+    pipeline.close()
+    assert first.dropped > 0
+    assert first.processed + first.dropped == 10
+    assert 3 not in out and out == sorted(out)
+
+
+def test_close_waits_for_persist_past_the_timeout():
+    store = SlowStore(delay=0.05)
+    pipeline = collect_pipeline(store, SymbolRouter(EveryTickState), lambda *a: None,
+                                persist_batch=2).start()
+    for i in range(20):
+        pipeline.submit(_tick(i))
+    pipeline.close(timeout=0.0)
+    assert len(store.rows) == 20
+
+
+def test_submit_async_does_not_block_the_event_loop():
+    pipeline = Pipeline()
+    gate = threading.Event()
+    out = []
+
+    def slow(item):
+        gate.wait()
+        out.append(item)
+
+    stage = pipeline.stage('slow', slow, maxsize=1)
+    pipeline.start()
+
+    async def feed():
+        loop_ran = []
+        ticker = asyncio.get_running_loop().call_later(0.05, loop_ran.append, True)
+        timer = threading.Timer(0.2, gate.set)
+        timer.start()
+        for i in range(5):
+            await pipeline.submit_async(i)
+        ticker.cancel()
+        return loop_ran
+
+    assert asyncio.run(feed()) == [True]       # the loop kept running while the queue was full
+    pipeline.close()
+    assert out == list(range(5)) and stage.stalls > 0
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from storage.pool import ConnectionManager, get_manager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    m = ConnectionManager(database=str(tmp_path / 'pool.db'))
+    with m.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    yield m
+    m.closeall()
+
+
+def test_nested_blocks_share_the_thread_connection(manager):
+    with manager.connection() as outer:
+        with manager.connection() as inner:
+            assert inner is outer
+            inner.execute("INSERT INTO t VALUES (1)")
+    with manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+
+def test_error_rolls_back(manager):
+    with pytest.raises(RuntimeError):
+        with manager.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("boom")
+    with manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_threads_get_their_own_connection(manager):
+    seen = []
+
+    def work():
+        with manager.connection() as conn:
+            seen.append(conn)
+            conn.execute("INSERT INTO t VALUES (2)")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in seen}) == 4
+    with manager.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 4
+
+
+def test_new_process_discards_inherited_connections(manager):
+    with manager.connection() as before:
+        pass
+    manager._pid = -1                    # as seen from a forked child
+    with manager.connection() as after:
+        assert after is not before
+
+
+def test_get_manager_is_shared_per_database():
+    cfg = {'dbname': 'fx', 'user': 'u', 'password': 'p', 'host': 'h', 'port': 5432}
+    assert get_manager(cfg) is get_manager(dict(cfg))
+    assert get_manager(cfg).is_postgres
+    with pytest.raises(ValueError):
+        ConnectionManager()
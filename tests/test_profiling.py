@@ -0,0 +1,104 @@
+import sqlite3
+import sys
+import time
+
+import pytest
+
+from backtest.profiling import NumbaTimer, profile_call
+
+
+class FakeDispatcher:
+    """Quacks like a numba CPUDispatcher: py_func, signatures, compiles on first call."""
+
+    def __init__(self, py_func):
+        self.py_func = py_func
+        self.signatures = []
+
+    def __call__(self, *args):
+        if not self.signatures:
+            time.sleep(0.01)              # "JIT compile"
+            self.signatures.append(object())
+        return self.py_func(*args)
+
+
+FakeDispatcher.__module__ = 'numba.core.registry'
+
+
+def _square(x):
+    return x * x
+
+
+fast_square = FakeDispatcher(_square)
+
+
+def _job(n=300):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (x REAL)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(float(i),) for i in range(20_000)])
+    total = 0.0
+    for _ in range(n):
+        total += sum(r[0] for r in conn.execute("SELECT x FROM t WHERE x < 2000").fetchall())
+        total += sys.modules[__name__].fast_square(3)
+    return total
+
+
+def test_numba_timer_times_and_restores():
+    module = sys.modules[__name__]
+    original = module.fast_square
+    with NumbaTimer(packages=(__name__.split('.')[0],)) as timer:
+        assert module.fast_square is original  # module attributes are not rebound
+        assert fast_square(4) == 16
+        fast_square(5)
+    assert type(fast_square) is FakeDispatcher
+    assert not hasattr(fast_square, '_profile_timer')
+    name = f"{__name__}._square"
+    assert timer.calls[name] == 2
+    assert timer.compile_seconds[name] >= 0.01
+    assert timer.seconds[name] < timer.compile_seconds[name]
+
+
+def test_cprofile_mode_writes_folded_summary_and_db_time(tmp_path, capsys):
+    out = str(tmp_path / 'job')
+    assert profile_call(_job, 50, mode='cprofile', output=out, top=5) == _job(50)
+    text = (tmp_path / 'job.txt').read_text()
+    assert 'top 5 by tottime' in text and 'database' in text
+    db_line = next(l for l in text.splitlines() if l.startswith('database'))
+    assert float(db_line.split()[1].rstrip('s')) > 0
+    folded = (tmp_path / 'job.folded').read_text().splitlines()
+    assert folded and all(int(l.rsplit(' ', 1)[1]) > 0 for l in folded)
+    assert any('_job' in l for l in folded)
+    assert (tmp_path / 'job.prof').exists()
+
+
+def test_sample_mode_captures_real_stacks(tmp_path):
+    out = str(tmp_path / 'sampled')
+    profile_call(_job, 300, mode='sample', output=out, interval=0.0005)
+    folded = (tmp_path / 'sampled.folded').read_text().splitlines()
+    assert any(l.startswith('MainThread;') and '_job (test_profiling.py' in l for l in folded)
+    assert 'self %' in (tmp_path / 'sampled.txt').read_text()
+
+
+def test_cold_numba_function_compiles_under_profile_call(tmp_path):
+    # a jitted function compiled while profiling resolves its jitted callees
+    # (fast_macd -> fast_ema) from the module globals, which must still hold
+    # the dispatchers
+    numba = pytest.importorskip('numba')
+    np = pytest.importorskip('numpy')
+    indicators = pytest.importorskip('strategy.indicators')
+    cold_macd = numba.njit(indicators.fast_macd.py_func)      # nothing compiled yet
+    prices = np.linspace(1.0, 2.0, 200)
+
+    def job():
+        return cold_macd(prices), indicators.fast_macd(prices)
+
+    cold, warm = profile_call(job, mode='sample', output=str(tmp_path / 'macd'), top=5)
+    assert cold == warm
+    assert 'strategy.indicators.fast_macd' in (tmp_path / 'macd.txt').read_text()
+    assert type(indicators.fast_ema).__name__ == 'CPUDispatcher'
+
+
+def test_frames_without_line_numbers_are_not_db_calls():
+    from types import SimpleNamespace
+    from backtest.profiling import _is_db_line
+    code = SimpleNamespace(co_filename='numba/core/ir.py')
+    assert _is_db_line(SimpleNamespace(f_code=code, f_lineno=None)) is False
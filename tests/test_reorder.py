@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+
+from aggregator.candle_builder import MultiIntervalCandleBuilder
+from aggregator.reorder import ReorderBuffer, ReorderingCandleBuilder
+
+T0 = datetime.datetime(2024, 5, 6, 10, 0, 0)
+
+
+def tick(seconds, price=1.0, volume=1):
+    ts = T0 + datetime.timedelta(seconds=seconds)
+    return {'timestamp': ts.isoformat(), 'bid': price, 'ask': price, 'volume': volume}
+
+
+def test_buffer_releases_in_order_after_watermark():
+    buf = ReorderBuffer(max_lateness=2.0)
+    assert buf.push(tick(0)) == ([], [])
+    assert buf.push(tick(1.5)) == ([], [])
+    ready, late = buf.push(tick(1.0))
+    assert ready == [] and late == []
+    ready, _ = buf.push(tick(3.2))
+    assert [t['timestamp'] for t in ready] == [tick(0)['timestamp'], tick(1.0)['timestamp']]
+    ready, _ = buf.push(tick(10))
+    assert [t['timestamp'] for t in ready] == [tick(1.5)['timestamp'], tick(3.2)['timestamp']]
+    assert [t['timestamp'] for t in buf.flush()] == [tick(10)['timestamp']]
+
+
+def test_buffer_flags_ticks_behind_watermark_as_late():
+    buf = ReorderBuffer(max_lateness=1.0)
+    buf.push(tick(0))
+    buf.push(tick(5))
+    ready, late = buf.push(tick(-1))
+    assert ready == [] and len(late) == 1
+    assert buf.late == 1
+
+
+def test_buffer_bound_forces_release():
+    buf = ReorderBuffer(max_lateness=1000, max_buffered=3)
+    released = []
+    for s in range(6):
+        released += buf.push(tick(s))[0]
+    assert len(buf) == 3
+    assert buf.forced == 3
+    assert [t['timestamp'] for t in released] == [tick(s)['timestamp'] for s in range(3)]
+
+
+def test_reordered_stream_matches_sorted_stream():
+    ordered = [tick(s * 7.0, price=1.0 + (s % 13) * 1e-4, volume=s % 4 + 1) for s in range(400)]
+    shuffled = list(ordered)
+    # swap neighbours to simulate a reconnect burst arriving out of order
+    for i in range(0, len(shuffled) - 1, 3):
+        shuffled[i], shuffled[i + 1] = shuffled[i + 1], shuffled[i]
+
+    reference = MultiIntervalCandleBuilder([60, 300])
+    expected = []
+    for t in ordered:
+        expected.extend(sorted(reference.add_tick(t).items()))
+
+    rb = ReorderingCandleBuilder([60, 300], max_lateness=10)
+    got = []
+    for t in shuffled:
+        events = rb.add_tick(t)
+        assert events['corrections'] == []
+        got.extend(events['candles'])
+    got.extend(rb.flush()['candles'])
+    assert sorted(got, key=lambda e: (e[1]['timestamp'], e[0])) == \
+        sorted(expected, key=lambda e: (e[1]['timestamp'], e[0]))
+
+
+def test_late_tick_emits_correction_for_finalized_bar():
+    rb = ReorderingCandleBuilder([60], max_lateness=1)
+    rb.add_tick(tick(0, price=1.0))
+    rb.add_tick(tick(30, price=1.1))
+    rb.add_tick(tick(61, price=1.2))
+    events = rb.add_tick(tick(70, price=1.2))
+    assert [c['high'] for _, c in events['candles']] == [pytest.approx(1.1)]
+
+    events = rb.add_tick(tick(45, price=1.5, volume=3))
+    assert events['candles'] == []
+    (interval, corrected), = events['corrections']
+    assert interval == 60
+    assert corrected['timestamp'] == T0.isoformat()
+    assert corrected['high'] == pytest.approx(1.5)
+    assert corrected['close'] == pytest.approx(1.5)
+    assert corrected['open'] == pytest.approx(1.0)
+    assert corrected['volume'] == 5
+
+
+def test_late_tick_into_empty_cascaded_coarse_bar():
+    rb = ReorderingCandleBuilder([60, 300], max_lateness=1, cascade=True)
+    rb.add_tick(tick(0, price=1.0))
+    rb.add_tick(tick(420, price=1.2))        # 10:07: the 10:05 coarse bar opens empty
+    rb.add_tick(tick(425, price=1.3))
+    events = rb.add_tick(tick(330, price=1.5, volume=3))
+    assert events == {'candles': [], 'corrections': []}
+    assert rb.dropped == 1                   # no 10:05 fine bar to correct
+
+    rb.add_tick(tick(480, price=1.1))
+    rb.add_tick(tick(600, price=1.0))
+    candles = [c for i, c in rb.add_tick(tick(605))['candles'] if i == 300]
+    assert candles == [{'timestamp': (T0 + datetime.timedelta(minutes=5)).isoformat(),
+                        'open': 1.5, 'high': 1.5, 'low': 1.1, 'close': 1.1, 'volume': 6}]
+
+
+class _History:
+    def generate_signal(self, history, tick):
+        return [c['close'] for c in history]
+
+
+def test_symbol_state_corrects_history_and_signals_on_close():
+    from collector.router import SymbolState
+    state = SymbolState('EURUSD', ReorderingCandleBuilder([60], max_lateness=1), _History())
+    signals = [state.on_tick(tick(s, price=p))
+               for s, p in [(0, 1.0), (30, 1.1), (61, 1.2), (70, 1.2)]]
+    assert signals == [None, None, None, [pytest.approx(1.1)]]
+
+    assert state.on_tick(tick(45, price=1.5)) is None     # correction only
+    assert state.history[0]['close'] == pytest.approx(1.5) and state.corrections == 1
+    assert state.on_tick(tick(125)) is None
+    assert state.on_tick(tick(127))[0] == pytest.approx(1.5)
+    assert len(state.history) == 2
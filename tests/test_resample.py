@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from aggregator.resample import parse_interval, resample_ticks, to_epoch_ns
+
+
+def _ts(*isos):
+    return np.array(isos, dtype='datetime64[ns]')
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (60, 60), ('30s', 30), ('5m', 300), ('1h', 3600), ('1d', 86400), ('15', 15),
+])
+def test_parse_interval(value, seconds):
+    assert parse_interval(value) == seconds
+
+
+def test_parse_interval_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_interval('5 minutes')
+    with pytest.raises(ValueError):
+        parse_interval(0)
+
+
+def test_buckets_are_epoch_aligned():
+    ts = _ts('2024-01-02T12:07:10', '2024-01-02T12:09:59', '2024-01-02T12:10:00')
+    bid = np.array([1.0, 1.2, 1.1])
+    ask = bid + 0.0002
+    out = resample_ticks(ts, bid, ask, '5m', volume=[1, 2, 3])
+    assert out['timestamp'].tolist() == _ts('2024-01-02T12:05', '2024-01-02T12:10').tolist()
+    assert out['open'] == pytest.approx([1.0001, 1.1001])
+    assert out['high'] == pytest.approx([1.2001, 1.1001])
+    assert out['low'] == pytest.approx([1.0001, 1.1001])
+    assert out['close'] == pytest.approx([1.2001, 1.1001])
+    assert out['volume'] == pytest.approx([3.0, 3.0])
+    assert out['ticks'].tolist() == [2, 1]
+    assert out['spread_mean'] == pytest.approx([0.0002, 0.0002])
+
+
+def test_matches_naive_groupby():
+    rng = np.random.default_rng(7)
+    n = 5000
+    ts = np.cumsum(rng.integers(1, 3_000_000_000, n)) + 1_700_000_000 * 10**9
+    bid = 1.1 + np.cumsum(rng.normal(0, 1e-5, n))
+    ask = bid + rng.uniform(1e-5, 3e-5, n)
+    sizes = rng.integers(1, 10, n).astype(float)
+    out = resample_ticks(ts, bid, ask, 60, bid_size=sizes, ask_size=sizes)
+
+    mid = (bid + ask) / 2
+    keys = ts // (60 * 10**9)
+    for i, key in enumerate(np.unique(keys)):
+        sel = keys == key
+        assert out['timestamp'][i].astype(np.int64) == key * 60 * 10**9
+        assert out['open'][i] == mid[sel][0]
+        assert out['close'][i] == mid[sel][-1]
+        assert out['high'][i] == mid[sel].max()
+        assert out['low'][i] == mid[sel].min()
+        assert out['volume'][i] == pytest.approx(2 * sizes[sel].sum())
+
+
+def test_unsorted_input_is_rejected():
+    ts = _ts('2024-01-02T12:10:00', '2024-01-02T12:00:00')
+    with pytest.raises(ValueError):
+        resample_ticks(ts, [1.0, 1.0], [1.0, 1.0], 60)
+
+
+def test_empty_input():
+    out = resample_ticks([], [], [], 60)
+    assert len(out['timestamp']) == 0
+
+
+def test_to_epoch_ns_accepts_iso_strings_and_datetimes():
+    from datetime import datetime, timezone
+    expected = _ts('2024-01-02T12:00:00').astype(np.int64)
+    assert to_epoch_ns(['2024-01-02T12:00:00']).tolist() == expected.tolist()
+    aware = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+    assert to_epoch_ns([aware]).tolist() == expected.tolist()
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from aggregator.materialize import CandleMaterializer
+from aggregator.rollups import Rollups, candle_pattern_scores
+from test_materialize import _SqliteTicks
+
+
+def test_vectorized_patterns():
+    #            doji  bull maru  bear maru  hammer  shooting star  flat  none
+    o = np.array([1.00, 1.00,     1.10,      1.08,   1.02,          1.0,  1.00])
+    h = np.array([1.10, 1.10,     1.10,      1.10,   1.10,          1.0,  1.10])
+    l = np.array([0.90, 1.00,     1.00,      1.00,   1.00,          1.0,  1.00])
+    c = np.array([1.01, 1.10,     1.00,      1.10,   1.00,          1.0,  1.05])
+    assert candle_pattern_scores(o, h, l, c).tolist() == \
+        pytest.approx([0.5, 0.7, -0.7, 0.4, -0.4, 0.0, 0.0])
+
+
+def _fill(store, start, hours, step_seconds=45):
+    rng = np.random.default_rng(7)
+    price = 1.1
+    t = start
+    while t < start + timedelta(hours=hours):
+        price += rng.normal(0, 2e-4)
+        store.add(t, price, volume=1.0)
+        t += timedelta(seconds=step_seconds)
+
+
+def _brute_force(store, since, until):
+    rows = store.conn.execute(
+        "SELECT bid, ask, volume FROM pricesandvolume WHERE timestamp >= ? AND timestamp < ? "
+        "ORDER BY timestamp", (since.isoformat(), until.isoformat())
+    ).fetchall()
+    mid = np.array([(b + a) / 2 for b, a, _ in rows])
+    return {'open': mid[0], 'close': mid[-1], 'high': mid.max(), 'low': mid.min(),
+            'ticks': len(rows), 'volume': sum(v for *_, v in rows)}
+
+
+def test_incremental_rollups_and_range_stats():
+    store = _SqliteTicks()
+    t0 = datetime(2024, 1, 1, 18, 0)
+    job = CandleMaterializer(store, chunk=timedelta(hours=2), rollups=True)
+    job.ensure_tables()
+    # three days, materialized while ticks keep arriving
+    for day in range(3):
+        _fill(store, t0 + timedelta(days=day), 20)
+        job.run_once()
+    job.run_once()
+
+    rollups = Rollups(store)
+    hours = store.conn.execute("SELECT COUNT(*), SUM(ticks) FROM rollup_h1").fetchone()
+    total = store.conn.execute("SELECT COUNT(*) FROM pricesandvolume").fetchone()[0]
+    assert hours == (60, total)
+    days = store.conn.execute("SELECT SUM(ticks), SUM(pattern_bull + pattern_bear) FROM rollup_d1").fetchone()
+    assert days[0] == total and days[1] > 0
+
+    for since, until in [
+        (datetime(2024, 1, 1, 20), datetime(2024, 1, 3, 9)),     # partial + whole + partial day
+        (datetime(2024, 1, 2, 3), datetime(2024, 1, 2, 7)),      # inside one day
+        (datetime(2024, 1, 1), datetime(2024, 1, 5)),            # everything
+    ]:
+        got = rollups.range_stats(since, until)
+        want = _brute_force(store, since, until)
+        for key, value in want.items():
+            assert got[key] == pytest.approx(value), key
+        assert got['range'] == pytest.approx(want['high'] - want['low'])
+        assert got['spread_avg'] == pytest.approx(0.0)
+
+    assert rollups.range_stats(datetime(2023, 1, 1), datetime(2023, 1, 2)) is None
@@ -0,0 +1,64 @@
+import functools
+import multiprocessing as mp
+
+from aggregator.records import Tick
+from collector.router import ShardedRouter, SymbolRouter, shard_of
+
+SYMBOLS = ['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCHF', 'EURGBP']
+
+
+class CountingState:
+    """Stand-in SymbolState: signals the running tick count of its own symbol."""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.n = 0
+
+    def on_tick(self, tick):
+        self.n += 1
+        return self.n
+
+
+def _tick(symbol, i):
+    return Tick(f'2024-01-01T10:00:{i % 60:02d}', symbol, 1.1, 1.1002, 1.0)
+
+
+def _report(results, symbol, tick, signal):
+    results.put((symbol, signal))
+
+
+def test_shard_of_is_stable_and_in_range():
+    assert [shard_of(s, 4) for s in SYMBOLS] == [shard_of(s, 4) for s in SYMBOLS]
+    assert all(0 <= shard_of(s, 3) < 3 for s in SYMBOLS)
+    assert len({shard_of(s, 3) for s in SYMBOLS}) > 1
+
+
+def test_symbol_router_keeps_state_per_symbol():
+    seen = []
+    router = SymbolRouter(CountingState, lambda sym, tick, sig: seen.append((sym, sig)))
+    for i in range(3):
+        for s in SYMBOLS[:2]:
+            router.route(_tick(s, i))
+    router.route({'timestamp': '2024-01-01T10:01:00', 'symbol': 'EURUSD',
+                  'bid': 1.1, 'ask': 1.1, 'volume': 1})
+    assert set(router.states) == set(SYMBOLS[:2])
+    assert [sig for sym, sig in seen if sym == 'EURUSD'] == [1, 2, 3, 4]
+    assert [sig for sym, sig in seen if sym == 'GBPUSD'] == [1, 2, 3]
+
+
+def test_sharded_router_processes_every_tick_in_order():
+    ctx = mp.get_context()
+    results = ctx.Queue()
+    n = 200
+    with ShardedRouter(3, CountingState, functools.partial(_report, results),
+                       maxsize=50, mp_context=ctx) as router:
+        for i in range(n):
+            for s in SYMBOLS:
+                router.route(_tick(s, i))
+    got = {}
+    for _ in range(n * len(SYMBOLS)):
+        symbol, signal = results.get(timeout=10)
+        got.setdefault(symbol, []).append(signal)
+    # each symbol lives on exactly one shard, so its state saw every tick in order
+    assert got == {s: list(range(1, n + 1)) for s in SYMBOLS}
+    assert sum(router.routed) == n * len(SYMBOLS) and not any(router.dropped)
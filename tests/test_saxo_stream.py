@@ -0,0 +1,195 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+websockets = pytest.importorskip('websockets')
+from websockets.asyncio.server import serve
+
+from collector.saxo import SaxoCollector, encode_frame, parse_frames
+from collector.tick_queue import TickQueue
+
+
+def _price(i, uic=21):
+    return {'Uic': uic, 'LastUpdated': f'2024-01-01T10:00:{i % 60:02d}.000000Z',
+            'Quote': {'Bid': 1.1 + i * 1e-5, 'Ask': 1.1001 + i * 1e-5}}
+
+
+def _config(url):
+    return SimpleNamespace(endpoint=url, symbols=['EURUSD'], uics={'EURUSD': 21},
+                           heartbeat_timeout=2.0, max_backoff=0.05)
+
+
+def test_frame_roundtrip():
+    data = encode_frame(7, 'prices', [_price(1)]) + encode_frame(8, '_heartbeat', [])
+    assert parse_frames(data) == [(7, 'prices', [_price(1)]), (8, '_heartbeat', [])]
+
+
+def test_queue_policies():
+    async def main():
+        out = {}
+        for policy in ('drop_oldest', 'drop_newest'):
+            q = TickQueue(maxsize=3, policy=policy)
+            for i in range(5):
+                await q.put(i)
+            out[policy] = ([q.get_nowait() for _ in range(3)], q.dropped)
+        return out
+
+    out = asyncio.run(main())
+    assert out['drop_oldest'] == ([2, 3, 4], 2)
+    assert out['drop_newest'] == ([0, 1, 2], 2)
+    with pytest.raises(ValueError):
+        TickQueue(policy='spill')
+
+
+def test_replay_with_reconnect_reset_and_deltas():
+    """A stand-in server replays 2000 recorded messages, drops the socket once and resets subscriptions."""
+    connections = []
+
+    async def handler(ws):
+        connections.append(ws.request.path)
+        if len(connections) == 1:
+            frames = [encode_frame(i, 'prices', [_price(i)]) for i in range(1, 1001)]
+            frames.insert(500, encode_frame(10_000, '_heartbeat', [
+                {'OriginatingReferenceId': 'prices', 'Heartbeats': [{'Reason': 'NoNewData'}]}]))
+            for f in frames:
+                await ws.send(f)
+            return                               # connection lost
+        await ws.send(encode_frame(1001, '_resetsubscriptions', {'TargetReferenceIds': ['prices']}))
+        # bid-only delta: the ask must come from the merged quote
+        await ws.send(encode_frame(1002, 'prices', [{'Uic': 21, 'Quote': {'Bid': 1.2}}]))
+        await ws.send(b''.join(encode_frame(1003 + i, 'prices', [_price(i)]) for i in range(1000)))
+        await ws.wait_closed()
+
+    subscribed = []
+    ticks = []
+
+    async def main():
+        async with serve(handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            collector = SaxoCollector(
+                _config(f'ws://127.0.0.1:{port}/streaming'), token='t',
+                subscribe=lambda ctx, ref: subscribed.append((ctx, ref)),
+            )
+            collector.on_tick(ticks.append)
+            task = asyncio.create_task(collector.run_async())
+            for _ in range(200):
+                await asyncio.sleep(0.02)
+                if len(ticks) >= 2001:
+                    break
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return collector
+
+    collector = asyncio.run(main())
+    assert len(ticks) == 2001
+    assert ticks[0] == {
+        'timestamp': '2024-01-01T10:00:01', 'symbol': 'EURUSD', 'bid': pytest.approx(1.10001),
+        'ask': pytest.approx(1.10011), 'bid_size': None, 'ask_size': None, 'volume': 0,
+    }
+    assert ticks[1000]['bid'] == 1.2 and ticks[1000]['ask'] == pytest.approx(1.1001 + 1000e-5)
+    # resumed the same context from the last message id, then resubscribed twice
+    assert 'messageid=1000' in connections[1]
+    assert connections[0].split('&')[0] == connections[1].split('&')[0]
+    assert len(subscribed) == 3
+    assert collector.stats['heartbeats'] == 1 and collector.stats['resets'] == 1
+
+
+def test_slow_consumer_with_drop_policy_never_blocks_reader():
+    async def handler(ws):
+        await ws.send(b''.join(encode_frame(i, 'prices', [_price(i)]) for i in range(1, 5001)))
+        await ws.wait_closed()
+
+    seen = []
+
+    async def slow(tick):
+        seen.append(tick)
+        await asyncio.sleep(0.01)
+
+    async def main():
+        async with serve(handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            cfg = _config(f'ws://127.0.0.1:{port}/')
+            cfg.queue_size, cfg.queue_policy = 100, 'drop_oldest'
+            collector = SaxoCollector(cfg, token='t', subscribe=lambda *a: None)
+            collector.on_tick(slow)
+            task = asyncio.create_task(collector.run_async())
+            while collector.stats['messages'] < 5000:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return collector
+
+    collector = asyncio.run(main())
+    assert collector.stats['ticks'] == 5000
+    assert collector.queue.dropped > 0
+    assert collector.queue.high_water == 100
+
+
+def test_bad_updates_and_failing_callback_do_not_stop_the_stream():
+    frames = [encode_frame(i, 'prices', [_price(i)]) for i in range(1, 11)]
+    frames.insert(3, encode_frame(100, 'prices', [{'Uic': 21, 'LastUpdated': 'garbage',
+                                                   'Quote': {'Bid': 1.0, 'Ask': 1.1}}]))
+    frames.insert(6, encode_frame(101, 'prices', ['not an update']))
+    seen = []
+
+    def on_tick(tick):
+        if len(seen) == 4:
+            seen.append(None)
+            raise ValueError("strategy blew up")
+        seen.append(tick)
+
+    collector = SaxoCollector(_config('ws://unused'))
+    collector.on_tick(on_tick)
+    asyncio.run(collector.replay_async(frames))
+    assert len(seen) == 10 and seen.count(None) == 1
+    assert collector.stats['ticks'] == 10
+    assert collector.stats['errors'] == 3
+
+
+def test_malformed_messages_are_skipped():
+    good = encode_frame(1, 'prices', [_price(1)])
+    messages = [
+        good[:-5],                                             # truncated payload
+        encode_frame(2, 'prices', [_price(2)]) + b'\x00\x01',  # good frame, then a partial header
+        b'\x03' + b'\x00' * 9 + b'\x01\xff' + encode_frame(3, 'prices', [])[12:],   # bad ref id
+        encode_frame(4, 'prices', [_price(4)])[:-2] + b'{]',  # broken JSON
+        encode_frame(5, 'prices', [_price(5)]),
+    ]
+    seen = []
+    collector = SaxoCollector(_config('ws://unused'))
+    collector.on_tick(seen.append)
+    asyncio.run(collector.replay_async(messages))
+    assert [t.bid for t in seen] == [pytest.approx(1.1 + 2e-5), pytest.approx(1.1 + 5e-5)]
+    assert collector.stats['bad_messages'] == 4
+
+
+def test_failing_resubscribe_reconnects_instead_of_stopping():
+    async def handler(ws):
+        await ws.send(encode_frame(1, 'prices', [_price(1)]))
+        await ws.wait_closed()
+
+    calls = []
+
+    def subscribe(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("subscription endpoint returned garbage")
+
+    seen = []
+
+    async def main():
+        async with serve(handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            collector = SaxoCollector(_config(f'ws://127.0.0.1:{port}/'), token='t', subscribe=subscribe)
+            collector.on_tick(seen.append)
+            task = asyncio.create_task(collector.run_async())
+            while not seen and not task.done():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return collector
+
+    collector = asyncio.run(main())
+    assert len(seen) == 1 and len(calls) == 2
+    assert collector.stats['errors'] == 1 and collector.stats['reconnects'] == 1
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime
+
+import pytest
+
+from storage import schema
+from storage.schema import MIGRATION_TABLE, migrate_table, months_between, next_month
+
+
+def test_months_between():
+    assert list(months_between(datetime(2023, 11, 15), datetime(2024, 2, 1))) == [
+        datetime(2023, 11, 1), datetime(2023, 12, 1), datetime(2024, 1, 1), datetime(2024, 2, 1),
+    ]
+    assert next_month(datetime(2023, 12, 1)) == datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def pg():
+    """
+    Connection to a scratch schema on the Postgres in FOREX_TEST_PG_DSN
+    (e.g. "dbname=forex_test user=postgres"); skipped without one.
+    """
+    dsn = os.environ.get('FOREX_TEST_PG_DSN')
+    if not dsn:
+        pytest.skip("set FOREX_TEST_PG_DSN to run the Postgres migration tests")
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(dsn)
+    name = f"test_migrate_{os.getpid()}"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {name}")
+        cur.execute(f"SET search_path TO {name}")
+    conn.commit()
+    yield conn
+    conn.rollback()
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {name} CASCADE")
+    conn.commit()
+    conn.close()
+
+
+def _legacy_ticks(conn):
+    with conn.cursor() as cur:
+        cur.execute("CREATE TABLE pricesandvolume (id SERIAL, timestamp TIMESTAMP, "
+                    "bid DOUBLE PRECISION, ask DOUBLE PRECISION, volume DOUBLE PRECISION)")
+        cur.execute("CREATE INDEX pricesandvolume_ts ON pricesandvolume (timestamp)")
+        for month in (1, 2, 3):
+            for day in (1, 15):
+                cur.execute("INSERT INTO pricesandvolume (timestamp, bid, ask, volume) "
+                            "VALUES (%s, 1.1, 1.2, 1)", (datetime(2024, month, day),))
+    conn.commit()
+
+
+def _count(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchone()[0]
+
+
+def test_migrate_copies_legacy_rows_once(pg):
+    _legacy_ticks(pg)
+    now = datetime(2024, 3, 20)
+    assert migrate_table(pg, 'pricesandvolume', 'ticks', symbol='EURUSD', now=now) == \
+        "pricesandvolume: migrated 6 rows (6 in all)"
+    assert _count(pg, "SELECT COUNT(*) FROM pricesandvolume WHERE symbol = 'EURUSD'") == 6
+    assert _count(pg, "SELECT COUNT(*) FROM pricesandvolume_default") == 0
+    # re-running only keeps partitions ahead
+    assert migrate_table(pg, 'pricesandvolume', 'ticks', now=now).startswith("pricesandvolume: partitioned")
+    assert _count(pg, "SELECT COUNT(*) FROM pricesandvolume") == 6
+
+
+def test_interrupted_migration_resumes(pg, monkeypatch):
+    _legacy_ticks(pg)
+    copy_month = schema.copy_month
+    calls = []
+
+    def failing(cur, table, legacy, columns, symbol, month):
+        calls.append(month)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return copy_month(cur, table, legacy, columns, symbol, month)
+
+    monkeypatch.setattr(schema, 'copy_month', failing)
+    with pytest.raises(RuntimeError):
+        migrate_table(pg, 'pricesandvolume', 'ticks', symbol='EURUSD', keep_legacy=False,
+                      now=datetime(2024, 3, 20))
+    # January is committed, February rolled back
+    assert _count(pg, "SELECT COUNT(*) FROM pricesandvolume") == 2
+    assert _count(pg, f"SELECT COUNT(*) FROM {MIGRATION_TABLE}_months") == 1
+
+    monkeypatch.setattr(schema, 'copy_month', copy_month)
+    assert migrate_table(pg, 'pricesandvolume', 'ticks', keep_legacy=False,
+                         now=datetime(2024, 3, 20)) == \
+        "pricesandvolume: resumed, copied 4 rows (6 in all), legacy dropped"
+    assert _count(pg, "SELECT COUNT(*) FROM pricesandvolume WHERE symbol = 'EURUSD'") == 6
+    assert _count(pg, "SELECT COUNT(DISTINCT id) FROM pricesandvolume") == 6
+    assert _count(pg, f"SELECT finished::int FROM {MIGRATION_TABLE}") == 1
+    assert _count(pg, "SELECT to_regclass('pricesandvolume_legacy') IS NULL") is True
+
+
+def test_unfiltered_latest_candles_use_a_timestamp_btree(pg):
+    assert migrate_table(pg, 'candles_m1', 'candles', now=datetime(2024, 3, 20)) == "candles_m1: created"
+    with pg.cursor() as cur:
+        cur.execute("SELECT indexdef FROM pg_indexes WHERE tablename = %s",
+                    (schema.partition_name('candles_m1', datetime(2024, 3, 1)),))
+        assert any(d.endswith('btree ("timestamp")') for (d,) in cur.fetchall())
+        cur.execute("SET enable_seqscan = off")
+        cur.execute("EXPLAIN SELECT * FROM candles_m1 ORDER BY timestamp DESC LIMIT 10")
+        plan = '\n'.join(r[0] for r in cur.fetchall())
+    assert 'Index Scan Backward' in plan and 'Sort  (' not in plan     # no full sort node
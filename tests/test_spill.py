@@ -0,0 +1,110 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from storage.spill import REJECTED_DIR, SpillingStore
+from storage.store import SqliteStore
+
+
+def _tick(i, symbol='EURUSD'):
+    ts = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return {'timestamp': ts.isoformat(), 'symbol': symbol, 'bid': 1.1, 'ask': 1.1001, 'volume': i}
+
+
+class _FlakyStore:
+    """Fails the next `failures` inserts, then commits."""
+    def __init__(self, failures):
+        self.failures = failures
+        self.ticks = []
+        self.calls = 0
+
+    def insert_ticks(self, ticks):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('connection lost')
+        self.ticks.extend(ticks)
+
+
+def _spilling(store, tmp_path, **kwargs):
+    sleeps = []
+    return SpillingStore(store, str(tmp_path / 'spill'), sleep=sleeps.append, **kwargs), sleeps
+
+
+def test_retries_with_backoff_then_commits(tmp_path):
+    store = _FlakyStore(failures=3)
+    spill, sleeps = _spilling(store, tmp_path, retries=4, backoff=0.5, max_backoff=1.5)
+    spill.insert_ticks([_tick(i) for i in range(10)])
+    assert len(store.ticks) == 10
+    assert sleeps == [0.5, 1.0, 1.5]
+    assert spill.retried == 3
+    assert spill.pending() == []
+
+
+def test_failed_batch_is_spilled_and_replayed(tmp_path):
+    store = _FlakyStore(failures=3)
+    spill, _ = _spilling(store, tmp_path, retries=2)
+    batch = [_tick(i) for i in range(5)]
+    batch[1]['bid_size'] = 200_000.0
+    batch[2]['volume'] = None
+    spill.insert_ticks(batch)
+    assert store.ticks == []
+    assert len(spill.pending()) == 1 and spill.spilled == 5
+
+    # the next good insert commits its own batch, then the spilled one
+    spill.insert_ticks([_tick(100)])
+    assert spill.pending() == []
+    assert spill.replayed == 5
+    replayed = store.ticks[1:]
+    assert [t['timestamp'] for t in replayed] == [t['timestamp'] for t in batch]
+    assert [t['volume'] for t in replayed] == [t['volume'] for t in batch]
+    assert replayed[0]['symbol'] == 'EURUSD'
+    assert replayed[1]['bid_size'] == 200_000.0 and replayed[0]['bid_size'] is None
+    assert replayed[2]['volume'] is None
+
+
+def test_replay_keeps_files_until_they_commit(tmp_path):
+    store = _FlakyStore(failures=2)
+    spill, _ = _spilling(store, tmp_path, retries=0)
+    spill.insert_ticks([_tick(0)])
+    spill.insert_ticks([_tick(1)])
+    assert len(spill.pending()) == 2
+
+    store.failures = 1
+    assert spill.replay() == 0
+    assert len(spill.pending()) == 2
+    assert spill.replay() == 2
+    assert [t['volume'] for t in store.ticks] == [0, 1]      # oldest spill first
+    assert not os.listdir(tmp_path / 'spill')
+
+
+def test_spills_from_a_previous_run_are_replayed(tmp_path):
+    SpillingStore(_FlakyStore(failures=1), str(tmp_path / 'spill'), retries=0).insert_ticks([_tick(7)])
+
+    store = SqliteStore(':memory:')
+    store.conn.execute("CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL)")
+    spill, _ = _spilling(store, tmp_path)
+    spill.insert_ticks([_tick(8)])
+    rows = store.conn.execute("SELECT timestamp, volume FROM pricesandvolume ORDER BY timestamp").fetchall()
+    assert rows == [(_tick(7)['timestamp'], 7.0), (_tick(8)['timestamp'], 8.0)]
+    assert spill.conn is store.conn                   # everything else is delegated
+
+
+def test_replay_reports_the_oldest_replayed_tick(tmp_path):
+    store = _FlakyStore(failures=1)
+    replayed = []
+    spill, _ = _spilling(store, tmp_path, retries=0, on_replay=replayed.append)
+    spill.insert_ticks([_tick(5), _tick(3)])
+    spill.insert_ticks([_tick(9)])
+    assert replayed == [datetime(2024, 1, 1, 0, 0, 3)]
+
+
+def test_bad_batches_are_rejected_not_retried(tmp_path):
+    store = SqliteStore(':memory:')
+    store.conn.execute("CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL)")
+    spill, sleeps = _spilling(store, tmp_path)
+    spill.insert_ticks([_tick(0, 'EURUSD'), _tick(1, 'USDJPY')])     # legacy table: ValueError
+    assert sleeps == [] and spill.pending() == []
+    assert spill.rejected == 2 and len(os.listdir(tmp_path / 'spill' / REJECTED_DIR)) == 1
+    spill.insert_ticks([_tick(2, 'EURUSD')])
+    assert store.conn.execute("SELECT COUNT(*) FROM pricesandvolume").fetchone()[0] == 1
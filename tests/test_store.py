@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from aggregator.records import Tick
+from storage.store import PostgresStore, SqliteStore
+
+
+def _tick(i, symbol):
+    ts = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return Tick(ts.isoformat(), symbol, 1.1, 1.1001, float(i))
+
+
+def _sqlite(symbol_column):
+    store = SqliteStore(':memory:')
+    extra = ", symbol TEXT NOT NULL DEFAULT ''" if symbol_column else ""
+    store.conn.execute(f"CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL{extra})")
+    return store
+
+
+def test_symbol_is_stored_when_the_table_has_the_column():
+    store = _sqlite(symbol_column=True)
+    store.insert_ticks([_tick(0, 'EURUSD'), _tick(1, 'USDJPY')])
+    store.insert_tick(_tick(2, 'GBPUSD'))
+    store.insert_columns({'timestamp': np.array(['2024-01-01T00:00:03'], dtype='datetime64[ns]'),
+                          'bid': [1.2], 'ask': [1.3], 'volume': [4.0], 'symbol': 'AUDUSD'})
+    rows = store.conn.execute("SELECT symbol, volume FROM pricesandvolume ORDER BY timestamp").fetchall()
+    assert rows == [('EURUSD', 0.0), ('USDJPY', 1.0), ('GBPUSD', 2.0), ('AUDUSD', 4.0)]
+
+
+def test_legacy_table_refuses_a_second_symbol():
+    store = _sqlite(symbol_column=False)
+    store.insert_ticks([_tick(0, 'EURUSD'), _tick(1, None)])
+    with pytest.raises(ValueError, match='EURUSD, USDJPY'):
+        store.insert_ticks([_tick(2, 'USDJPY')])
+    with pytest.raises(ValueError):
+        store.insert_ticks([_tick(3, 'GBPUSD'), _tick(4, 'AUDUSD')])
+    store.insert_tick(_tick(5, 'EURUSD'))
+    assert store.conn.execute("SELECT COUNT(*) FROM pricesandvolume").fetchone()[0] == 3
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return [(c,) for c in self.conn.columns]
+
+    def copy_expert(self, sql, buf):
+        self.conn.copies.append((sql, buf.getvalue()))
+
+
+class _Conn:
+    def __init__(self, columns):
+        self.columns = columns
+        self.copies = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_postgres_copy_includes_symbol():
+    conn = _Conn(['id', 'symbol', 'timestamp', 'bid', 'ask', 'volume'])
+    store = PostgresStore(None, conn=conn)
+    store.insert_ticks([_tick(0, 'EURUSD'), _tick(1, None)])
+    sql, data = conn.copies[0]
+    assert '(timestamp, bid, ask, volume, symbol)' in sql and 'FORCE_NOT_NULL (symbol)' in sql
+    assert data.splitlines() == ['2024-01-01T00:00:00,1.1,1.1001,0.0,EURUSD',
+                                 '2024-01-01T00:00:01,1.1,1.1001,1.0,']
+
+
+def test_postgres_legacy_table_refuses_a_second_symbol():
+    conn = _Conn(['timestamp', 'bid', 'ask', 'volume'])
+    store = PostgresStore(None, conn=conn)
+    store.insert_ticks([_tick(0, 'EURUSD')])
+    assert '(timestamp, bid, ask, volume)' in conn.copies[0][0]
+    with pytest.raises(ValueError):
+        store.insert_ticks([_tick(1, 'USDJPY')])
+    assert len(conn.copies) == 1
+
+
+class _Pool:
+    def __init__(self):
+        self.released = []
+
+    def release(self, conn, close=False):
+        self.released.append((conn, close))
+
+
+def test_postgres_close_returns_the_connection_to_the_pool():
+    conn, pool = _Conn(['timestamp', 'bid', 'ask', 'volume']), _Pool()
+    with PostgresStore(None, conn=conn, pool=pool) as store:
+        store.insert_ticks([_tick(0, 'EURUSD')])
+    assert pool.released == [(conn, False)] and store.conn is None
+    store.close()
+    assert len(pool.released) == 1
+
+
+def test_sqlite_store_closes_as_a_context_manager():
+    with _sqlite(symbol_column=True) as store:
+        store.insert_ticks([_tick(0, 'EURUSD')])
+    with pytest.raises(Exception):
+        store.conn.execute("SELECT 1")
+
+
+def test_sizes_are_stored_when_the_table_has_the_columns():
+    store = _sqlite(symbol_column=True)
+    store.conn.execute("ALTER TABLE pricesandvolume ADD COLUMN bid_size REAL")
+    store.conn.execute("ALTER TABLE pricesandvolume ADD COLUMN ask_size REAL")
+    tick = _tick(0, 'EURUSD')
+    tick.bid_size = 1e6
+    store.insert_ticks([tick])
+    store.insert_columns({'timestamp': np.array(['2024-01-01T00:00:01'], dtype='datetime64[ns]'),
+                          'bid': [1.2], 'ask': [1.3], 'volume': [4.0], 'symbol': 'EURUSD',
+                          'bid_size': np.array([2e6]), 'ask_size': np.array([np.nan])})
+    rows = store.conn.execute("SELECT bid_size, ask_size FROM pricesandvolume ORDER BY timestamp").fetchall()
+    assert rows == [(1e6, None), (2e6, None)]
+
+
+def test_postgres_copy_includes_sizes():
+    conn = _Conn(['id', 'symbol', 'timestamp', 'bid', 'ask', 'mid', 'bid_size', 'ask_size', 'volume'])
+    store = PostgresStore(None, conn=conn)
+    store.insert_columns({'timestamp': np.array(['2024-01-01T00:00:03'], dtype='datetime64[ns]'),
+                          'bid': [1.2], 'ask': [1.3], 'volume': [4.0], 'symbol': 'EURUSD',
+                          'bid_size': [1e6], 'ask_size': [np.nan]})
+    sql, data = conn.copies[0]
+    assert '(timestamp, bid, ask, volume, bid_size, ask_size, symbol)' in sql
+    assert data.splitlines() == ['2024-01-01T00:00:03.000000,1.2,1.3,4.0,1000000.0,,EURUSD']
@@ -0,0 +1,70 @@
+import csv
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from collector.capture import CaptureReader
+from collector.synthetic import SyntheticTicks, write_ticks
+from storage.archive import TickArchiveStore
+from storage.store import SqliteStore
+
+
+def _stream(chunk_size, n=20_000, **kw):
+    # ~20 jumps over the stream, so chunking is exercised on the jump path too
+    chunks = list(SyntheticTicks(seed=7, jump_intensity=900.0, **kw).chunks(n, chunk_size))
+    return {k: np.concatenate([c[k] for c in chunks]) for k in ('timestamp', 'bid', 'ask', 'volume')}
+
+
+def test_stream_is_seedable_and_independent_of_chunking():
+    a, b = _stream(20_000), _stream(3_000)
+    for k in ('bid', 'ask', 'volume'):
+        assert np.array_equal(a[k], b[k])
+    assert np.abs(a['timestamp'] - b['timestamp']).max() < 1000      # ns rounding per chunk
+    assert not np.array_equal(a['bid'], SyntheticTicks(seed=8).chunk(20_000)['bid'])
+
+
+def test_ticks_are_ordered_quoted_and_seasonal():
+    # Friday 2024-01-05 12:00 UTC: runs into the weekend close
+    c = SyntheticTicks(start=datetime(2024, 1, 5, 12), rate=5.0, seed=1).chunk(500_000)
+    ts = c['timestamp']
+    assert np.all(np.diff(ts) >= 0)
+    assert np.all(c['ask'] > c['bid'])
+    assert np.all(c['volume'] == c['bid_size'] + c['ask_size'])
+    times = ts.view('datetime64[ns]')
+    closed = (times >= np.datetime64('2024-01-05T22:00')) & (times < np.datetime64('2024-01-07T22:00'))
+    assert not closed.any()
+    assert times[-1] > np.datetime64('2024-01-07T22:00')
+    hours = (ts // 3_600_000_000_000) % 24
+    counts = np.bincount(hours, minlength=24)
+    assert counts[14] > 2 * counts[23]                     # London/NY overlap vs late Asia
+
+
+def test_writers_round_trip(tmp_path):
+    gen = lambda: SyntheticTicks(symbol='GBPUSD', seed=3).chunks(5_000, 2_000)
+    expected = next(SyntheticTicks(symbol='GBPUSD', seed=3).chunks(5_000, 5_000))
+
+    assert write_ticks(gen(), 'capture', str(tmp_path / 'cap')) == 5_000
+    cap = CaptureReader(str(tmp_path / 'cap')).columns()
+    assert np.array_equal(cap['bid'], expected['bid'])
+    assert set(cap['symbol'].tolist()) == {b'GBPUSD'}
+
+    write_ticks(gen(), 'archive', str(tmp_path / 'arc'))
+    arc = TickArchiveStore(str(tmp_path / 'arc')).fetch_ticks(datetime(2024, 1, 1), symbol='GBPUSD')
+    assert np.array_equal(arc['ask'], expected['ask'])
+
+    write_ticks(gen(), 'csv', str(tmp_path / 'ticks.csv'))
+    with open(tmp_path / 'ticks.csv') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 5_000 and rows[0]['symbol'] == 'GBPUSD'
+
+    progress = []
+    write_ticks(gen(), 'sqlite', str(tmp_path / 'ticks.db'), progress=lambda n, t: progress.append(n))
+    assert progress == [2_000, 4_000, 5_000]
+    rows = SqliteStore(str(tmp_path / 'ticks.db')).fetch_ticks('2024-01-01')
+    assert len(rows) == 5_000
+    assert datetime.fromisoformat(rows[0][0]) == expected['timestamp'][:1].view(
+        'datetime64[ns]').astype('datetime64[us]').astype(object)[0]
+
+    with pytest.raises(ValueError):
+        write_ticks(gen(), 'parquet', str(tmp_path / 'x'))
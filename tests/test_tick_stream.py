@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from storage.archive import TickArchiveStore
+from storage.store import SqliteStore
+
+
+def _ticks(n, start=datetime(2024, 1, 1, 22, 0)):
+    return [
+        {'timestamp': (start + timedelta(seconds=60 * i)).isoformat(),
+         'bid': 1.1 + i * 1e-5, 'ask': 1.1001 + i * 1e-5, 'volume': i}
+        for i in range(n)
+    ]
+
+
+def _sqlite(ticks):
+    store = SqliteStore(':memory:')
+    store.conn.execute("CREATE TABLE pricesandvolume (timestamp TEXT, bid REAL, ask REAL, volume REAL)")
+    store.insert_ticks(ticks)
+    return store
+
+
+def _concat(chunks):
+    return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+
+
+def test_sqlite_stream_matches_fetch_ticks():
+    store = _sqlite(_ticks(250))
+    chunks = list(store.fetch_ticks_iter('2024-01-01T22:00:00', chunk_size=100))
+    assert [len(c['timestamp']) for c in chunks] == [100, 100, 50]
+    cols = _concat(chunks)
+    rows = store.fetch_ticks('2024-01-01T22:00:00')
+    assert cols['volume'].tolist() == [r[3] for r in rows]
+    assert cols['timestamp'].dtype == np.int64
+    assert np.all(np.diff(cols['timestamp']) > 0)
+
+
+def test_sqlite_stream_range_with_datetimes():
+    store = _sqlite(_ticks(250))
+    since = datetime(2024, 1, 1, 23, 0)
+    chunks = list(store.fetch_ticks_iter(since, since + timedelta(minutes=10), chunk_size=4))
+    assert _concat(chunks)['volume'].tolist() == list(range(60, 70))
+
+
+def test_stream_is_lazy_and_can_be_abandoned():
+    store = _sqlite(_ticks(50))
+    it = store.fetch_ticks_iter('2024-01-01', chunk_size=10)
+    assert len(next(it)['bid']) == 10
+    it.close()
+    # the lock is free again for writers
+    store.insert_ticks(_ticks(1, start=datetime(2024, 1, 2, 12)))
+
+
+def test_archive_stream_chunks_per_day(tmp_path):
+    archive = TickArchiveStore(str(tmp_path))
+    archive.insert_ticks(_ticks(250))            # 22:00 .. next day 02:09
+    chunks = list(archive.fetch_ticks_iter('2024-01-01', chunk_size=100))
+    assert [len(c['timestamp']) for c in chunks] == [100, 20, 100, 30]
+    full = archive.fetch_ticks('2024-01-01')
+    np.testing.assert_array_equal(_concat(chunks)['timestamp'], full['timestamp'])
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from storage.tickcodec import (
+    TickFileReader, TickFileWriter, decode_block, decode_ticks, encode_block, encode_ticks,
+)
+
+
+def _ticks(n, seed=11):
+    rng = np.random.default_rng(seed)
+    ts = 1_700_000_000_000_000_000 + np.cumsum(rng.integers(1, 500, n)) * 1_000_000
+    bid = np.round(1.08 + np.cumsum(rng.integers(-3, 4, n)) * 1e-5, 5)
+    ask = np.round(bid + rng.integers(5, 20, n) * 1e-5, 5)
+    volume = rng.integers(1, 5_000_000, n).astype(np.float64)
+    return ts, bid, ask, volume
+
+
+def test_block_roundtrip_narrows_types():
+    ts = np.array([100, 101, 103, 103], dtype=np.int64)
+    bid = np.array([108000, 108001, 107999, 108000], dtype=np.int64)
+    spread = np.array([12, 11, 12, 13], dtype=np.int64)
+    volume = np.array([1, 2, 3, 70000], dtype=np.int64)
+    buf = encode_block(ts, bid, spread, volume)
+    (d_ts, d_bid, d_spread, d_vol), end = decode_block(buf)
+    assert end == len(buf)
+    assert d_ts.tolist() == ts.tolist()
+    assert d_bid.tolist() == bid.tolist()
+    assert d_spread.tolist() == spread.tolist()
+    assert d_vol.tolist() == volume.tolist()
+
+
+def test_file_roundtrip_is_exact_at_pipette_resolution(tmp_path):
+    ts, bid, ask, volume = _ticks(20_000)
+    path = str(tmp_path / 'ticks.ftk')
+    size = encode_ticks(path, ts, bid, ask, volume, block_size=4096)
+    out = decode_ticks(path)
+    assert out['timestamp'].tolist() == ts.tolist()
+    assert out['bid'] == pytest.approx(bid, abs=1e-9)
+    assert out['ask'] == pytest.approx(ask, abs=1e-9)
+    assert out['volume'].tolist() == volume.tolist()
+    # 4 x 8-byte columns raw vs. the encoded file
+    assert size * 3 < ts.size * 32
+
+
+def test_incremental_writes_and_range_reads(tmp_path):
+    ts, bid, ask, volume = _ticks(10_000)
+    path = str(tmp_path / 'ticks.ftk')
+    with TickFileWriter(path, block_size=1000) as w:
+        for lo in range(0, 10_000, 1234):
+            w.write(ts[lo:lo + 1234], bid[lo:lo + 1234], ask[lo:lo + 1234], volume[lo:lo + 1234])
+    reader = TickFileReader(path)
+    assert len(reader) == 10_000
+    assert len(reader.index) == 10
+
+    lo, hi = ts[2500], ts[7300]
+    out = reader.read(lo, hi)
+    assert out['timestamp'].tolist() == ts[2500:7300].tolist()
+    assert out['volume'].tolist() == volume[2500:7300].tolist()
+    assert len(reader.read(ts[-1] + 1)['bid']) == 0
+
+
+def test_rejects_foreign_files(tmp_path):
+    path = tmp_path / 'junk.bin'
+    path.write_bytes(b'not a tick file at all' * 4)
+    with pytest.raises(ValueError):
+        TickFileReader(str(path))